@@ -0,0 +1,296 @@
+#
+# Logic depth benchmark. This elaborates lpc2wb, LPC_Ctrl and the whole
+# LPCPeripheral in a few configurations, flattens them with yosys and
+# reports the longest combinatorial path between registers and ports,
+# counted in yosys cells (gates, muxes, adders etc.) before tech
+# mapping. It's a rough stand in for a timing report, good enough to
+# compare configurations. For real Fmax numbers run the generated
+# Verilog through the FPGA flow for your part.
+#
+# As well as the longest path overall (in LPC_Ctrl that's the CSR read
+# mux) it reports the longest from the wishbone inputs, and from the
+# inputs of the FW to DMA path alone.
+#
+# Only needs the yosys that comes with amaranth (amaranth-yosys).
+#
+# Run with:
+#   python -m benchmarks.logic_depth
+#
+
+import os
+import re
+import sys
+import tempfile
+
+from nmigen.back import rtlil
+
+from lpcperipheral.lpc2wb import lpc2wb
+from lpcperipheral.lpc_ctrl import LPC_Ctrl
+from lpcperipheral.lpcperipheral import LPCPeripheral
+
+# Name, top level, and the ports the FW to DMA path starts from
+CONFIGS = [
+    ("lpc2wb", lambda: lpc2wb(), ("fw_wb__",)),
+    ("lpc2wb registered", lambda: lpc2wb(registered_wb=True), ("fw_wb__",)),
+    ("LPC_Ctrl", lambda: LPC_Ctrl(), ("lpc_wb__", "dma_wb__")),
+    ("LPC_Ctrl registered", lambda: LPC_Ctrl(registered=True), ("lpc_wb__", "dma_wb__")),
+    ("LPC_Ctrl windows", lambda: LPC_Ctrl(windows=4, pages=256), ("lpc_wb__", "dma_wb__")),
+    ("LPC_Ctrl windows registered", lambda: LPC_Ctrl(registered=True, windows=4, pages=256),
+     ("lpc_wb__", "dma_wb__")),
+    ("LPCPeripheral", lambda: LPCPeripheral(), ("dma_",)),
+    ("LPCPeripheral registered", lambda: LPCPeripheral(registered_wb=True), ("dma_",)),
+]
+
+# Cells that hold state. Their outputs start paths and their inputs end
+# them.
+REGISTER_CELLS = {"$dff", "$adff", "$dffe", "$adffe", "$sdff", "$sdffe", "$sdffce",
+                  "$dffsr", "$dffsre", "$aldff", "$aldffe", "$dlatch", "$memwr"}
+# Output bit i only depends on input bit i
+BITWISE_CELLS = {"$and", "$or", "$xor", "$xnor", "$not", "$pos", "$mux"}
+# Output bit i depends on input bits upto i
+CARRY_CELLS = {"$add", "$sub", "$neg"}
+# Wires, not logic
+BUFFER_CELLS = {"$pos"}
+
+
+def tokenize(line):
+    return re.findall(r'"(?:[^"\\]|\\.)*"|\{|\}|\[[^\]]*\]|[^\s{}\[]+', line)
+
+
+class Netlist:
+    def __init__(self, text):
+        self.widths = {}
+        self.ports = {}
+        self.cells = []
+        self.aliases = []
+        cell = None
+        for line in text.splitlines():
+            tokens = tokenize(line)
+            if not tokens:
+                continue
+            if tokens[0] == "wire":
+                name = tokens[-1]
+                width = 1
+                if "width" in tokens:
+                    width = int(tokens[tokens.index("width") + 1])
+                self.widths[name] = width
+                for direction in ("input", "output", "inout"):
+                    if direction in tokens:
+                        self.ports[name] = direction
+            elif tokens[0] == "cell":
+                cell = {"type": tokens[1], "name": tokens[2], "params": {}, "conns": {}}
+            elif tokens[0] == "parameter" and cell is not None:
+                cell["params"][tokens[1]] = tokens[2]
+            elif tokens[0] == "connect":
+                if cell is not None:
+                    cell["conns"][tokens[1]] = tokens[2:]
+                else:
+                    lhs, rhs = self.split_connect(tokens[1:])
+                    self.aliases.append((lhs, rhs))
+            elif tokens[0] == "end" and cell is not None:
+                self.cells.append(cell)
+                cell = None
+
+    def split_connect(self, tokens):
+        # Two sigspecs next to each other, find where the first ends
+        depth = 0
+        for i, token in enumerate(tokens):
+            if token == "{":
+                depth += 1
+            elif token == "}":
+                depth -= 1
+            if depth == 0 and i + 1 < len(tokens) and not tokens[i + 1].startswith("["):
+                return tokens[:i + 1], tokens[i + 1:]
+        raise ValueError(tokens)
+
+    def bits(self, tokens):
+        # LSB first list of (wire, bit), None for constant bits
+        result = []
+        chunks = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in ("{", "}"):
+                i += 1
+                continue
+            if re.match(r"^\d+'", token):
+                width = int(token.split("'")[0])
+                chunks.append([None] * width)
+                i += 1
+                continue
+            if re.match(r"^-?\d+$", token):
+                chunks.append([None] * 32)
+                i += 1
+                continue
+            name = token
+            lsb, msb = 0, self.widths.get(name, 1) - 1
+            if i + 1 < len(tokens) and tokens[i + 1].startswith("["):
+                sel = tokens[i + 1][1:-1]
+                if ":" in sel:
+                    msb, lsb = (int(x) for x in sel.split(":"))
+                else:
+                    msb = lsb = int(sel)
+                i += 1
+            chunks.append([(name, b) for b in range(lsb, msb + 1)])
+            i += 1
+        # Concatenations are written MSB first
+        for chunk in reversed(chunks):
+            result.extend(chunk)
+        return result
+
+
+def signed(params, port):
+    return params.get("\\" + port + "_SIGNED", "0") not in ("0", "1'0", "0'")
+
+
+def extend(bits, width, sign):
+    if len(bits) >= width:
+        return bits[:width]
+    pad = bits[-1] if (sign and bits) else None
+    return bits + [pad] * (width - len(bits))
+
+
+def build_graph(netlist):
+    # driven bit -> list of (driver bit, levels)
+    drivers = {}
+    sinks = []
+
+    def add(y, a, weight):
+        if y is not None and a is not None:
+            drivers.setdefault(y, []).append((a, weight))
+
+    for lhs, rhs in netlist.aliases:
+        for y, a in zip(netlist.bits(lhs), netlist.bits(rhs)):
+            add(y, a, 0)
+
+    for cell in netlist.cells:
+        kind = cell["type"]
+        conns = {port: netlist.bits(sig) for port, sig in cell["conns"].items()}
+        if kind in REGISTER_CELLS:
+            for port, bits in conns.items():
+                if port not in ("\\Q", "\\CLK"):
+                    sinks.extend(b for b in bits if b is not None)
+            continue
+        if kind == "$memrd":
+            if cell["params"].get("\\CLK_ENABLE", "0").endswith("1"):
+                sinks.extend(b for b in conns.get("\\ADDR", []) if b is not None)
+                sinks.extend(b for b in conns.get("\\EN", []) if b is not None)
+            else:
+                for y in conns.get("\\DATA", []):
+                    for a in conns.get("\\ADDR", []):
+                        add(y, a, 1)
+            continue
+        if kind.startswith("$mem") or kind in ("$meminit",):
+            continue
+
+        outputs = [port for port in ("\\Y", "\\Q") if port in conns]
+        if not outputs:
+            continue
+        y_bits = conns[outputs[0]]
+        weight = 0 if kind in BUFFER_CELLS else 1
+        inputs = {port: bits for port, bits in conns.items() if port not in outputs}
+
+        if kind in BITWISE_CELLS:
+            for port, bits in inputs.items():
+                if port == "\\S":
+                    for y in y_bits:
+                        for s in bits:
+                            add(y, s, weight)
+                    continue
+                bits = extend(bits, len(y_bits), signed(cell["params"], port[1:]))
+                for y, a in zip(y_bits, bits):
+                    add(y, a, weight)
+        elif kind == "$pmux":
+            width = len(y_bits)
+            for port, bits in inputs.items():
+                for i, a in enumerate(bits):
+                    if port == "\\S":
+                        for y in y_bits:
+                            add(y, a, weight)
+                    else:
+                        add(y_bits[i % width], a, weight)
+        elif kind in CARRY_CELLS:
+            for port, bits in inputs.items():
+                bits = extend(bits, len(y_bits), signed(cell["params"], port[1:]))
+                for i, y in enumerate(y_bits):
+                    for a in bits[:i + 1]:
+                        add(y, a, weight)
+        else:
+            # Compares, reductions, shifts etc, everything depends on
+            # everything
+            for port, bits in inputs.items():
+                for y in y_bits:
+                    for a in bits:
+                        add(y, a, weight)
+
+    for name, direction in netlist.ports.items():
+        if direction == "output":
+            sinks.extend((name, b) for b in range(netlist.widths[name]))
+
+    return drivers, sinks
+
+
+def longest_path(drivers, sinks, sources=None):
+    # Only count paths starting at sources if given, otherwise from any
+    # register or input
+    sys.setrecursionlimit(100000)
+    depth = {}
+    visiting = set()
+
+    def visit(bit):
+        if bit in depth:
+            return depth[bit]
+        if bit in visiting:
+            return None  # combinatorial loop, shouldn't happen
+        visiting.add(bit)
+        best = None
+        if bit not in drivers and (sources is None or bit[0] in sources):
+            best = 0
+        for driver, weight in drivers.get(bit, []):
+            levels = visit(driver)
+            if levels is not None and (best is None or levels + weight > best):
+                best = levels + weight
+        visiting.discard(bit)
+        depth[bit] = best
+        return best
+
+    worst = 0
+    for sink in sinks:
+        levels = visit(sink)
+        if levels is not None and levels > worst:
+            worst = levels
+    return worst
+
+
+def measure(yosys, top, fw_ports):
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as tmp:
+        name = os.path.relpath(tmp)
+        with open(os.path.join(tmp, "in.il"), "w") as f:
+            f.write(rtlil.convert(top))
+        yosys.run(["-q", "-p", "read_rtlil {0}/in.il; hierarchy -top top; proc; flatten; "
+                               "opt_expr; write_rtlil {0}/out.il".format(name)],
+                  ignore_warnings=True)
+        with open(os.path.join(tmp, "out.il")) as f:
+            netlist = Netlist(f.read())
+    drivers, sinks = build_graph(netlist)
+    inputs = [name for name, direction in netlist.ports.items() if direction == "input"]
+    # Paths from the wishbone inputs, and from those of the FW path
+    fw_inputs = {name for name in inputs if any(port in name for port in fw_ports)}
+    wb_inputs = fw_inputs | {name for name in inputs if "wb__" in name}
+    return (longest_path(drivers, sinks), longest_path(drivers, sinks, wb_inputs),
+            longest_path(drivers, sinks, fw_inputs))
+
+
+def main():
+    from amaranth._toolchain.yosys import find_yosys
+    yosys = find_yosys(lambda ver: ver >= (0, 10))
+
+    print("Longest combinatorial path in yosys cells")
+    print("%-28s%8s%8s%8s" % ("", "all", "wb in", "fw in"))
+    for name, make, fw_ports in CONFIGS:
+        levels, wb_levels, fw_levels = measure(yosys, make(), fw_ports)
+        print("%-28s%8d%8d%8d" % (name, levels, wb_levels, fw_levels))
+
+
+if __name__ == "__main__":
+    main()
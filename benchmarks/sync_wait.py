@@ -0,0 +1,107 @@
+#
+# Simulation benchmark for the LPC SYNC wait. For each kind of LPC
+# transaction this counts the number of wait (SHORT_WAIT or LONG_WAIT)
+# SYNC cycles the host sees while lpc2wb gets the answer from the back
+# end, for a set of lpc2wb configurations.
+#
+# The wishbone slaves answer one cycle after stb, so this is measuring
+# the overhead of the LPC front end and the clock crossing rather than
+# the devices behind it. In single clock mode the system clock runs at
+# the LPC clock.
+#
+# Run with:
+#   python -m benchmarks.sync_wait
+#
+
+import unittest
+
+from nmigen.sim import Simulator, Passive
+
+from lpcperipheral.lpc2wb import lpc2wb
+
+from tests.helpers import Helpers
+
+TRANSACTIONS = 16
+
+SYS_CLK_PERIOD = 1e-8   # 100 MHz system clock
+LPC_CLK_PERIOD = 3e-8   # 33 MHz LPC clock
+
+CONFIGS = [
+    ("baseline", {}),
+    ("early dispatch", {"early_dispatch": True}),
+    ("posted writes", {"posted_writes": True}),
+    ("single clock", {"single_clock": True}),
+]
+
+
+class SyncWait(unittest.TestCase, Helpers):
+    def runTest(self):
+        pass
+
+    def wishbone_slave(self, wb):
+        yield Passive()
+        while True:
+            yield wb.ack.eq((yield wb.cyc) & (yield wb.stb) & ~(yield wb.ack))
+            yield
+
+    def measure(self, **kwargs):
+        dut = lpc2wb(**kwargs)
+        results = {}
+
+        transactions = [
+            ("IO read",       lambda i: self.lpc_io_read(dut, i, 0)),
+            ("IO write",      lambda i: self.lpc_io_write(dut, i, i & 0xff)),
+            ("FW read 4B",    lambda i: self.lpc_fw_read(dut, i * 4, 0, 4)),
+            ("FW write 4B",   lambda i: self.lpc_fw_write(dut, i * 4, i, 4)),
+            ("FW read 128B",  lambda i: self.lpc_fw_read(dut, i * 128, 0, 128)),
+            ("FW write 128B", lambda i: self.lpc_fw_write(dut, i * 128, i, 128)),
+        ]
+
+        def lpc_bench():
+            yield dut.lframe.eq(1)
+            yield dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            for name, transaction in transactions:
+                waits = 0
+                for i in range(TRANSACTIONS):
+                    waits += yield from transaction(i)
+                    yield
+                results[name] = waits / TRANSACTIONS
+
+        def io_bench():
+            yield from self.wishbone_slave(dut.io_wb)
+
+        def fw_bench():
+            yield from self.wishbone_slave(dut.fw_wb)
+
+        sim = Simulator(dut)
+        if dut.single_clock:
+            sim.add_clock(LPC_CLK_PERIOD)
+            sim.add_sync_process(lpc_bench, domain="sync")
+        else:
+            sim.add_clock(SYS_CLK_PERIOD)
+            sim.add_clock(LPC_CLK_PERIOD, domain="lclk")
+            sim.add_clock(LPC_CLK_PERIOD, domain="lclkrst")
+            sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        sim.add_sync_process(fw_bench, domain="sync")
+        sim.run()
+
+        return results
+
+
+def main():
+    bench = SyncWait()
+    results = [(name, bench.measure(**kwargs)) for name, kwargs in CONFIGS]
+
+    print("Average wait SYNC cycles per transaction")
+    print("%-16s" % "" + "".join("%16s" % name for name, _ in results))
+    for transaction in results[0][1]:
+        print("%-16s" % transaction +
+              "".join("%16.2f" % r[transaction] for _, r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,30 +4,66 @@ from nmigen_soc.wishbone import Decoder as WishboneDecoder
 from nmigen_soc.wishbone import Interface as WishboneInterface
 from nmigen_soc.memory import MemoryMap
 
-from .ipmi_bt import IPMI_BT
+from .ipmi_bt import IPMI_BT, RegEnum as IPMIRegEnum
+from .lpc_trace import trace_wb_addr_width
+from .postcode import PostCode
+from .vuart import RegEnum as VUartRegEnum
 from .vuart_joined import VUartJoined
+from .wb_decoder import WishbonePipelinedDecoder
 
 
 class IOSpace(Elaboratable):
+    # With pipelined the BMC and target wishbones are pipelined (with
+    # stall), as are the VUART and IPMI BT slaves, so the BMC can run
+    # an access every cycle. The BMC decoder takes care of the slaves
+    # that are still classic. The target wishbone master must only run
+    # one access at a time, as lpc2wb does.
     def __init__(self, vuart_depth=2048, bmc_vuart_addr=0x0, bmc_ipmi_addr=0x1000,
-                 bmc_lpc_ctrl_addr=0x2000,
-                 target_vuart_addr=0x3f8, target_ipmi_addr=0xe4):
+                 bmc_lpc_ctrl_addr=0x2000, bmc_lpc_stats_addr=0x3000,
+                 bmc_postcode_addr=0x4000, bmc_lpc_trace_addr=0x8000,
+                 target_vuart_addr=0x3f8, target_ipmi_addr=0xe4,
+                 target_postcode_addr=0x80, postcode_depth=256,
+                 lpc_stats=False, lpc_trace_depth=0, pipelined=False):
         self.vuart_depth = vuart_depth
         self.bmc_vuart_addr = bmc_vuart_addr
         self.bmc_ipmi_addr = bmc_ipmi_addr
         self.bmc_lpc_ctrl_addr = bmc_lpc_ctrl_addr
+        self.bmc_lpc_stats_addr = bmc_lpc_stats_addr
+        self.bmc_postcode_addr = bmc_postcode_addr
+        self.bmc_lpc_trace_addr = bmc_lpc_trace_addr
         self.target_vuart_addr = target_vuart_addr
         self.target_ipmi_addr = target_ipmi_addr
+        self.target_postcode_addr = target_postcode_addr
+        self.postcode_depth = postcode_depth
+        self.lpc_stats = lpc_stats
+        self.lpc_trace_depth = lpc_trace_depth
+        self.pipelined = pipelined
+        stall = ["stall"] if pipelined else []
 
         self.bmc_vuart_irq = Signal()
         self.bmc_ipmi_irq = Signal()
-        self.bmc_wb = WishboneInterface(addr_width=14, data_width=32, granularity=8)
+        self.bmc_postcode_irq = Signal()
+        self.bmc_wb = WishboneInterface(addr_width=14, data_width=32, granularity=8,
+                                        features=stall)
 
-        self.lpc_ctrl_wb = WishboneInterface(addr_width=3, data_width=32, granularity=8)
+        self.lpc_ctrl_wb = WishboneInterface(addr_width=6, data_width=32, granularity=8)
+        # Only decoded if lpc_stats is set
+        self.lpc_stats_wb = WishboneInterface(addr_width=7, data_width=32, granularity=8)
+        # Only decoded if lpc_trace_depth is set
+        self.lpc_trace_wb = WishboneInterface(addr_width=trace_wb_addr_width(max(lpc_trace_depth, 1)),
+                                              data_width=32, granularity=8)
 
         self.target_vuart_irq = Signal()
         self.target_ipmi_irq = Signal()
-        self.target_wb = WishboneInterface(addr_width=16, data_width=8, features=["err"])
+        self.target_wb = WishboneInterface(addr_width=16, data_width=8,
+                                           features=["err"] + stall)
+
+        # Status registers the host polls. These have no side effects
+        # on read, so they can be shadowed closer to the LPC bus.
+        self.target_vuart_lsr_addr = target_vuart_addr + VUartRegEnum.LSR.value
+        self.target_vuart_lsr = Signal(8)
+        self.target_ipmi_bt_ctrl_addr = target_ipmi_addr + IPMIRegEnum.BT_CTRL
+        self.target_ipmi_bt_ctrl = Signal(8)
 
         self.error_wb = WishboneInterface(addr_width=2, data_width=8,
                                           features=["err"])
@@ -35,11 +71,18 @@ class IOSpace(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.vuart_joined = vuart_joined = VUartJoined(depth=self.vuart_depth)
-        m.submodules.ipmi_bt = ipmi_bt = IPMI_BT()
+        m.submodules.vuart_joined = vuart_joined = VUartJoined(depth=self.vuart_depth,
+                                                               pipelined=self.pipelined)
+        m.submodules.ipmi_bt = ipmi_bt = IPMI_BT(pipelined=self.pipelined)
+        m.submodules.postcode = postcode = PostCode(depth=self.postcode_depth)
 
         # BMC address decode
-        m.submodules.bmc_decode = bmc_decode = WishboneDecoder(addr_width=14, data_width=32, granularity=8)
+        if self.pipelined:
+            bmc_decode = WishbonePipelinedDecoder(addr_width=14, data_width=32, granularity=8,
+                                                  features=["stall"])
+        else:
+            bmc_decode = WishboneDecoder(addr_width=14, data_width=32, granularity=8)
+        m.submodules.bmc_decode = bmc_decode
 
         bmc_ipmi_bus = ipmi_bt.bmc_wb
         bmc_ipmi_bus.memory_map = MemoryMap(addr_width=5, data_width=8)
@@ -49,18 +92,39 @@ class IOSpace(Elaboratable):
         bmc_vuart_bus.memory_map = MemoryMap(addr_width=5, data_width=8)
         bmc_decode.add(bmc_vuart_bus, addr=self.bmc_vuart_addr)
 
+        bmc_postcode_bus = postcode.bmc_wb
+        bmc_postcode_bus.memory_map = MemoryMap(addr_width=5, data_width=8)
+        bmc_decode.add(bmc_postcode_bus, addr=self.bmc_postcode_addr)
+
         lpc_ctrl_bus = self.lpc_ctrl_wb
-        lpc_ctrl_bus.memory_map = MemoryMap(addr_width=5, data_width=8)
+        lpc_ctrl_bus.memory_map = MemoryMap(addr_width=8, data_width=8)
         bmc_decode.add(lpc_ctrl_bus, addr=self.bmc_lpc_ctrl_addr)
 
+        if self.lpc_stats:
+            lpc_stats_bus = self.lpc_stats_wb
+            lpc_stats_bus.memory_map = MemoryMap(addr_width=9, data_width=8)
+            bmc_decode.add(lpc_stats_bus, addr=self.bmc_lpc_stats_addr)
+
+        if self.lpc_trace_depth:
+            lpc_trace_bus = self.lpc_trace_wb
+            lpc_trace_bus.memory_map = MemoryMap(addr_width=lpc_trace_bus.addr_width + 2,
+                                                 data_width=8)
+            bmc_decode.add(lpc_trace_bus, addr=self.bmc_lpc_trace_addr)
+
         m.d.comb += [
             self.bmc_ipmi_irq.eq(ipmi_bt.bmc_irq),
             self.bmc_vuart_irq.eq(vuart_joined.irq_a),
+            self.bmc_postcode_irq.eq(postcode.bmc_irq),
             self.bmc_wb.connect(bmc_decode.bus)
         ]
 
         # Target address decode
-        m.submodules.target_decode = target_decode = WishboneDecoder(addr_width=16, data_width=8, granularity=8, features=["err"])
+        # One access at a time, so the address is held until the
+        # response even when pipelined
+        stall = ["stall"] if self.pipelined else []
+        m.submodules.target_decode = target_decode = WishboneDecoder(addr_width=16, data_width=8,
+                                                                     granularity=8,
+                                                                     features=["err"] + stall)
 
         target_ipmi_bus = ipmi_bt.target_wb
         target_ipmi_bus.memory_map = MemoryMap(addr_width=2, data_width=8)
@@ -70,22 +134,29 @@ class IOSpace(Elaboratable):
         target_vuart_bus.memory_map = MemoryMap(addr_width=3, data_width=8)
         target_decode.add(target_vuart_bus, addr=self.target_vuart_addr)
 
+        target_postcode_bus = postcode.target_wb
+        target_postcode_bus.memory_map = MemoryMap(addr_width=1, data_width=8)
+        target_decode.add(target_postcode_bus, addr=self.target_postcode_addr)
+
         target_error_bus = self.error_wb
         target_error_bus.memory_map = MemoryMap(addr_width=2, data_width=8)
         # Generate a signal when we'd expect an ACK on the target bus
         ack_expected = Signal()
         m.d.sync += ack_expected.eq(self.target_wb.sel & self.target_wb.cyc &
                                    ~ack_expected)
-        # Generate an error if no ack from ipmi_bt or vuart
+        # Generate an error if no ack from ipmi_bt, vuart or postcode
         m.d.comb += self.error_wb.err.eq(0)
         with m.If (ack_expected):
             m.d.comb += self.error_wb.err.eq(~ipmi_bt.target_wb.ack &
-                                             ~vuart_joined.wb_b.ack)
+                                             ~vuart_joined.wb_b.ack &
+                                             ~postcode.target_wb.ack)
         target_decode.add(target_error_bus, addr=0x0)
 
         m.d.comb += [
             self.target_ipmi_irq.eq(ipmi_bt.target_irq),
             self.target_vuart_irq.eq(vuart_joined.irq_b),
+            self.target_vuart_lsr.eq(vuart_joined.lsr_b),
+            self.target_ipmi_bt_ctrl.eq(ipmi_bt.target_bt_ctrl),
             self.target_wb.connect(target_decode.bus)
         ]
 
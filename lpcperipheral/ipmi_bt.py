@@ -35,22 +35,35 @@ class BMCIRQEnum(IntEnum):
 
 
 class IPMI_BT(Elaboratable):
-    def __init__(self, depth=64):
+    # With pipelined both wishbone slaves are pipelined, with a stall
+    # signal (always 0). Every access is acked in the next cycle and a
+    # new one can be started in each cycle.
+    def __init__(self, depth=64, pipelined=False):
         self.depth = depth
+        self.pipelined = pipelined
+        features = ["stall"] if pipelined else []
 
-        self.bmc_wb = WishboneInterface(data_width=32, addr_width=3, granularity=8)
+        self.bmc_wb = WishboneInterface(data_width=32, addr_width=3, granularity=8,
+                                        features=features)
         self.bmc_irq = Signal()
 
-        self.target_wb = WishboneInterface(data_width=8, addr_width=2)
+        self.target_wb = WishboneInterface(data_width=8, addr_width=2,
+                                           features=features)
         self.target_irq = Signal()
+        # Current value of BT_CTRL
+        self.target_bt_ctrl = Signal(8)
 
     def elaborate(self, platform):
         m = Module()
 
+        # Back to back pipelined accesses have to see the FIFOs
+        # updated by the previous one, so drive them straight away
+        fifo = m.d.comb if self.pipelined else m.d.sync
+
         # Reset signals for the FIFOs, since BT_CTRL needs to be able to clear them
         reset_from_bmc_fifo = Signal()
         reset_from_target_fifo = Signal()
-        m.d.sync += [
+        fifo += [
             reset_from_bmc_fifo.eq(0),
             reset_from_target_fifo.eq(0)
         ]
@@ -87,7 +100,7 @@ class IPMI_BT(Elaboratable):
         bmc_state = Signal(StateEnum, reset=StateEnum.IDLE)
         target_state = Signal(StateEnum, reset=StateEnum.IDLE)
 
-        m.d.sync += [
+        fifo += [
             from_bmc_fifo.w_en.eq(0),
             from_bmc_fifo.r_en.eq(0),
             from_target_fifo.w_en.eq(0),
@@ -98,6 +111,11 @@ class IPMI_BT(Elaboratable):
             self.bmc_wb.ack.eq(0),
             self.target_wb.ack.eq(0)
         ]
+        if self.pipelined:
+            m.d.comb += [
+                self.bmc_wb.stall.eq(0),
+                self.target_wb.stall.eq(0)
+            ]
 
         # Don't read from empty FIFOs
         from_bmc_fifo_read_data = Signal(8)
@@ -122,6 +140,7 @@ class IPMI_BT(Elaboratable):
         m.d.comb += bt_ctrl.eq(Cat(0, 0, target_to_bmc_attn, bmc_to_target_attn,
                                    sms_attn, platform_reserved, target_busy,
                                    bmc_busy))
+        m.d.comb += self.target_bt_ctrl.eq(bt_ctrl)
 
         # BT_INTMASK (target interrupt mask) bits
         bmc_to_target_irq_en = Signal()
@@ -148,7 +167,7 @@ class IPMI_BT(Elaboratable):
                         with m.Case(RegEnum.BT_CTRL):
                             # Bit 0, write 1 to clear the write fifo (ie from_target_fifo)
                             with m.If(self.target_wb.dat_w[0]):
-                                m.d.sync += reset_from_target_fifo.eq(1)
+                                fifo += reset_from_target_fifo.eq(1)
 
                             # Bit 1 is meant to set the read FIFO to the next valid
                             # position, but since we only have a single buffer this
@@ -183,7 +202,7 @@ class IPMI_BT(Elaboratable):
 
                         with m.Case(RegEnum.BMC2HOST_HOST2BMC):
                             # Only assert write if there is space
-                            m.d.sync += from_target_fifo.w_en.eq(from_target_fifo.w_rdy)
+                            fifo += from_target_fifo.w_en.eq(from_target_fifo.w_rdy)
 
                         with m.Case(RegEnum.BT_INTMASK):
                             # Bit 0, 0/1 write
@@ -193,10 +212,9 @@ class IPMI_BT(Elaboratable):
                             with m.If(self.target_wb.dat_w[1]):
                                 m.d.sync += bmc_to_target_irq.eq(0)
 
-                    m.d.sync += [
-                        self.target_wb.ack.eq(1),
-                        target_state.eq(StateEnum.ACK)
-                    ]
+                    m.d.sync += self.target_wb.ack.eq(1)
+                    if not self.pipelined:
+                        m.d.sync += target_state.eq(StateEnum.ACK)
 
                 with m.If(is_target_read):
                     with m.Switch(self.target_wb.adr):
@@ -204,18 +222,15 @@ class IPMI_BT(Elaboratable):
                             m.d.sync += self.target_wb.dat_r.eq(bt_ctrl)
 
                         with m.Case(RegEnum.BMC2HOST_HOST2BMC):
-                            m.d.sync += [
-                                self.target_wb.dat_r.eq(from_bmc_fifo_read_data),
-                                from_bmc_fifo.r_en.eq(from_bmc_fifo.r_rdy),
-                            ]
+                            m.d.sync += self.target_wb.dat_r.eq(from_bmc_fifo_read_data)
+                            fifo += from_bmc_fifo.r_en.eq(from_bmc_fifo.r_rdy)
 
                         with m.Case(RegEnum.BT_INTMASK):
                             m.d.sync += self.target_wb.dat_r.eq(Cat(bmc_to_target_irq_en, bmc_to_target_irq))
 
-                    m.d.sync += [
-                        self.target_wb.ack.eq(1),
-                        target_state.eq(StateEnum.ACK)
-                    ]
+                    m.d.sync += self.target_wb.ack.eq(1)
+                    if not self.pipelined:
+                        m.d.sync += target_state.eq(StateEnum.ACK)
 
             with m.Case(StateEnum.ACK):
                 m.d.sync += [
@@ -231,7 +246,7 @@ class IPMI_BT(Elaboratable):
                         with m.Case(BMCRegEnum.BT_CTRL):
                             # Bit 0, write 1 to clear the write fifo (ie from_bmc_fifo)
                             with m.If(self.bmc_wb.dat_w[0]):
-                                m.d.sync += reset_from_bmc_fifo.eq(1)
+                                fifo += reset_from_bmc_fifo.eq(1)
 
                             # Bit 1 is meant to set the read FIFO to the next valid
                             # position, but since we only have a single buffer this
@@ -267,7 +282,7 @@ class IPMI_BT(Elaboratable):
 
                         with m.Case(BMCRegEnum.BMC2HOST_HOST2BMC):
                             # Only assert write if there is space
-                            m.d.sync += from_bmc_fifo.w_en.eq(from_bmc_fifo.w_rdy)
+                            fifo += from_bmc_fifo.w_en.eq(from_bmc_fifo.w_rdy)
 
                         with m.Case(BMCRegEnum.IRQ_MASK):
                             m.d.sync += bmc_irq_en.eq(self.bmc_wb.dat_w)
@@ -275,10 +290,9 @@ class IPMI_BT(Elaboratable):
                         with m.Case(BMCRegEnum.IRQ_STATUS):
                             m.d.sync += bmc_irq.eq(self.bmc_wb.dat_w)
 
-                    m.d.sync += [
-                        self.bmc_wb.ack.eq(1),
-                        bmc_state.eq(StateEnum.ACK)
-                    ]
+                    m.d.sync += self.bmc_wb.ack.eq(1)
+                    if not self.pipelined:
+                        m.d.sync += bmc_state.eq(StateEnum.ACK)
 
                 with m.If(is_bmc_read):
                     with m.Switch(self.bmc_wb.adr):
@@ -286,10 +300,8 @@ class IPMI_BT(Elaboratable):
                             m.d.sync += self.bmc_wb.dat_r.eq(bt_ctrl)
 
                         with m.Case(BMCRegEnum.BMC2HOST_HOST2BMC):
-                            m.d.sync += [
-                                self.bmc_wb.dat_r.eq(from_target_fifo_read_data),
-                                from_target_fifo.r_en.eq(from_target_fifo.r_rdy),
-                            ]
+                            m.d.sync += self.bmc_wb.dat_r.eq(from_target_fifo_read_data)
+                            fifo += from_target_fifo.r_en.eq(from_target_fifo.r_rdy)
 
                         with m.Case(BMCRegEnum.IRQ_MASK):
                             m.d.sync += self.bmc_wb.dat_r.eq(bmc_irq_en)
@@ -297,10 +309,9 @@ class IPMI_BT(Elaboratable):
                         with m.Case(BMCRegEnum.IRQ_STATUS):
                             m.d.sync += self.bmc_wb.dat_r.eq(bmc_irq)
 
-                    m.d.sync += [
-                        self.bmc_wb.ack.eq(1),
-                        bmc_state.eq(StateEnum.ACK)
-                    ]
+                    m.d.sync += self.bmc_wb.ack.eq(1)
+                    if not self.pipelined:
+                        m.d.sync += bmc_state.eq(StateEnum.ACK)
 
             with m.Case(StateEnum.ACK):
                 m.d.sync += [
@@ -19,32 +19,105 @@
 # interfaces. The lpcfront operates on the lpc clock domain and the
 # wishbone interfaces operate on the standard "sync" domain.
 #
+# LPC MEM cycles are sent to the FW wishbone too, so they get the same
+# address translation (and DMA path) as FW cycles.
+#
 # To cross the clock domains async fifos are used. The write fifo
 # takes write commands from the lpc interface. The read fifo gets
 # information back to respond to these write commands.
 #
 # The write fifo turns the write commands into either an IO or FW
 # wishbone transaction. The read fifo takes the wishbone transaction
-# reponses and sends them back to the LPC.
+# reponses and sends them back to the LPC. Commands are run one at a
+# time in order, so responses come back in order too.
+#
+# Both fifos are fifo_depth entries. Deeper fifos let posted writes
+# queue up behind a slow wishbone, and let multi word FW cycles stream
+# through without waiting for each word to make the round trip across
+# the clock domains.
 #
 # If an address doesn't exist on the wishbone interfaces (common on
 # the IO bus), the wishbone interface asserts the err signal (rather
 # than the ack). When this occurs the read fifo send an error back to
 # the LPC.
 #
+# A FW read stops at the first word that errors, and the error goes
+# back in place of its data. Any words issued after it are dropped by
+# taking cyc down for a cycle. The rest of a FW write still has to be
+# taken out of fifowr, so the words after an error are thrown away
+# without going to the wishbone, and the error goes back on the last
+# one.
+#
+# With posted writes, writes don't send anything back through the read
+# fifo. Instead an IO write error pulses posted_err (with the address
+# in posted_err_addr) so it can be latched for the BMC.
+#
+# The SYNC timeout is set from the system clock side and pulses
+# sync_timeout_err when a cycle times out.
+#
+# If the LPC side aborts a cycle it resets the fifos. The write fifo
+# reset reaches this side as fifowr.r_rst, which drops the wishbone
+# cycle for the dead command straight away rather than waiting for its
+# ack, so the next command isn't held up behind it. Acks that race with
+# the reset are still sent back, but carry the tag of the dead command
+# so the lpcfront throws them away.
+#
+# If the system clock is the LPC clock (or phase locked to it), the
+# clock crossing is just latency. With single_clock the lpcfront runs
+# in the sync domain, the async fifos are replaced with first word fall
+# through sync fifos and the synchronisers with wires. The lclk pin is
+# not used and everything documented as lclk domain below is sync.
+#
+# The wishbone outputs come straight from the fifo through the byte
+# lane muxes. With registered_wb they go through a register stage
+# first, for a couple of cycles more latency, so that path doesn't
+# limit the system clock.
+#
+# With pipelined the IO and FW wishbones are pipelined (with stall).
+# Requests are only held until they are accepted. The words of a multi
+# word FW read are issued back to back, as far ahead of the acks as
+# there is space in the read fifo for their data. IO cycles and FW
+# writes still run one word at a time, as each needs its own fifowr
+# entry.
+#
+# With burst the FW wishbone has CTI and BTE. The words of a multi
+# word FW cycle go out as a linear incrementing burst, tagged
+# END_OF_BURST on the last word, and cyc is held from the first word
+# to the last. Single word cycles are CLASSIC.
+#
+# IO reads of shadow_addrs are answered by the lpcfront from
+# shadow_data, which is continuously synchronised over from the system
+# clock side, and never make it to the IO wishbone.
+#
 
 from nmigen import Signal, Elaboratable, Module
 from nmigen import ClockSignal, Cat, DomainRenamer, ResetSignal, ResetInserter
-from nmigen.lib.fifo import AsyncFIFO
-from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen.lib.fifo import AsyncFIFO, SyncFIFO
+from nmigen.lib.cdc import FFSynchronizer, PulseSynchronizer
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType, BurstTypeExt
 from nmigen.back import verilog
 
-from .lpcfront import lpcfront, LPCCycletype, LPC_FW_DATA_WIDTH, LPC_FW_ADDR_WIDTH, LPC_IO_DATA_WIDTH, LPC_IO_ADDR_WIDTH
+from .wb_slice import WishboneRegSlice
+from .lpcfront import (lpcfront, LPCStates, LPCCycletype, LPC_FW_DATA_WIDTH, LPC_MEM_ADDR_WIDTH,
+                       LPC_IO_DATA_WIDTH, LPC_IO_ADDR_WIDTH, LPC_FW_MAX_BYTES,
+                       LPC_SYNC_TIMEOUT_WIDTH)
 
 
 class lpc2wb(Elaboratable):
 
-    def __init__(self):
+    def __init__(self, early_dispatch=False, posted_writes=False, short_waits=0,
+                 shadow_addrs=(), fifo_depth=2, single_clock=False,
+                 registered_wb=False, pipelined=False, burst=False):
+        assert fifo_depth >= 2 and (fifo_depth & (fifo_depth - 1)) == 0
+        self.fifo_depth = fifo_depth
+        self.single_clock = single_clock
+        self.registered_wb = registered_wb
+        self.pipelined = pipelined
+        self.burst = burst
+        self.early_dispatch = early_dispatch
+        self.posted_writes = posted_writes
+        self.short_waits = short_waits
+        self.shadow_addrs = shadow_addrs
 
         # LPC clock pin
         self.lclk  = Signal()
@@ -54,37 +127,95 @@ class lpc2wb(Elaboratable):
         self.lad_en = Signal()
         self.lreset = Signal()
 
+        stall = ["stall"] if pipelined else []
+        cti = ["cti", "bte"] if burst else []
         self.io_wb = WishboneInterface(data_width=LPC_IO_DATA_WIDTH,
                                        addr_width=LPC_IO_ADDR_WIDTH,
                                        granularity=8,
-                                       features = ["err"])
-        # 32 bit bus, so address only need to address words
+                                       features = ["err"] + stall)
+        # 32 bit bus, so address only need to address words. Wide
+        # enough for the 32 bit MEM address, FW addresses are 28 bits.
         self.fw_wb = WishboneInterface(data_width=LPC_FW_DATA_WIDTH,
-                                       addr_width=LPC_FW_ADDR_WIDTH - 2,
-                                       granularity=8)
+                                       addr_width=LPC_MEM_ADDR_WIDTH - 2,
+                                       granularity=8,
+                                       features = ["err"] + stall + cti)
+
+        # Error on a posted write, system clock domain
+        self.posted_err = Signal()
+        self.posted_err_addr = Signal(LPC_MEM_ADDR_WIDTH)
+
+        # SYNC timeout in lclk cycles (0 to disable), system clock domain
+        self.sync_timeout = Signal(LPC_SYNC_TIMEOUT_WIDTH)
+        self.sync_timeout_err = Signal()
+
+        # Values for reads of shadow_addrs, system clock domain
+        self.shadow_data = [Signal(LPC_IO_DATA_WIDTH, name="shadow_data%d" % i)
+                            for i in range(len(shadow_addrs))]
+
+        # LPC front end state for statistics and tracing, lclk domain
+        self.state = Signal(LPCStates)
+        self.cycletype = Signal(LPCCycletype)
+        self.addr = Signal(LPC_MEM_ADDR_WIDTH)
+        self.size = Signal(range(LPC_FW_MAX_BYTES))
+        self.data = Signal(LPC_FW_DATA_WIDTH)
+        self.synccount = Signal(LPC_SYNC_TIMEOUT_WIDTH)
 
     def elaborate(self, platform):
         m = Module()
 
-        # hook up lclk port to lclk domain
-        m.d.comb += ClockSignal("lclk").eq(self.lclk)
+        if self.single_clock:
+            lclk = "sync"
+        else:
+            lclk = "lclk"
+            # hook up lclk port to lclk domain
+            m.d.comb += ClockSignal("lclk").eq(self.lclk)
 
-        # Use main reset to reset lclk domain
-        m.d.comb += ResetSignal("lclk").eq(ResetSignal())
+            # Use main reset to reset lclk domain
+            m.d.comb += ResetSignal("lclk").eq(ResetSignal())
 
         # create lpc front end wth right clock domain
-        m.submodules.lpc = lpc = DomainRenamer("lclk")(lpcfront())
+        front = lpcfront(early_dispatch=self.early_dispatch,
+                         posted_writes=self.posted_writes,
+                         short_waits=self.short_waits,
+                         shadow_addrs=self.shadow_addrs)
+        m.submodules.lpc = lpc = DomainRenamer(lclk)(front)
 
         wr_data = Signal(lpc.wrcmd.data.width)
         wr_addr = Signal(lpc.wrcmd.addr.width)
         wr_cmd = Signal(lpc.wrcmd.cmd.width)
         wr_size = Signal(lpc.wrcmd.size.width)
+        wr_tag = Signal(lpc.wrcmd.tag.width)
         wr_rdy = Signal()
+        wr_io = Signal()
+        wr_fw = Signal()
+        wr_we = Signal()
+
+        if self.registered_wb:
+            stall = ["stall"] if self.pipelined else []
+            cti = ["cti", "bte"] if self.burst else []
+            m.submodules.io_slice = io_slice = WishboneRegSlice(
+                addr_width=self.io_wb.addr_width, data_width=self.io_wb.data_width,
+                granularity=self.io_wb.granularity, features=["err"] + stall)
+            m.submodules.fw_slice = fw_slice = WishboneRegSlice(
+                addr_width=self.fw_wb.addr_width, data_width=self.fw_wb.data_width,
+                granularity=self.fw_wb.granularity, features=["err"] + stall + cti)
+            m.d.comb += io_slice.sub.connect(self.io_wb)
+            m.d.comb += fw_slice.sub.connect(self.fw_wb)
+            io_wb = io_slice.bus
+            fw_wb = fw_slice.bus
+        else:
+            io_wb = self.io_wb
+            fw_wb = self.fw_wb
+
+        wr_rst = Signal()  # LPC side reset the fifos
+        wr_idle = Signal()
+        rd_free = Signal(range(self.fifo_depth + 1))  # Space in fiford
 
-        # hook up lclk port to lclk domain
-        m.d.comb += ClockSignal("lclkrst").eq(self.lclk)
-        # Use main reset to reset lclk domain
-        m.d.comb += ResetSignal("lclkrst").eq(lpc.wrcmd.rst)
+        if not self.single_clock:
+            # hook up lclk port to lclk domain
+            m.d.comb += ClockSignal("lclkrst").eq(self.lclk)
+            # Use main reset to reset lclk domain
+            m.d.comb += ResetSignal("lclkrst").eq(lpc.wrcmd.rst)
 
         # hook up external lpc interface
         m.d.comb += lpc.lframe.eq(self.lframe)
@@ -92,102 +223,238 @@ class lpc2wb(Elaboratable):
         m.d.comb += lpc.lad_in.eq(self.lad_in)
         m.d.comb += self.lad_en.eq(lpc.lad_en)
         m.d.comb += self.lad_out.eq(lpc.lad_out)
+        m.d.comb += self.state.eq(lpc.state)
+        m.d.comb += self.cycletype.eq(lpc.cycletype)
+        m.d.comb += self.addr.eq(lpc.addr)
+        m.d.comb += self.size.eq(lpc.size)
+        m.d.comb += self.data.eq(lpc.data)
+        m.d.comb += self.synccount.eq(lpc.synccount)
+
+        if self.single_clock:
+            m.d.comb += lpc.sync_timeout.eq(self.sync_timeout)
+            m.d.comb += self.sync_timeout_err.eq(lpc.timeout)
+            for shadow_data, lpc_shadow_data in zip(self.shadow_data, lpc.shadow_data):
+                m.d.comb += lpc_shadow_data.eq(shadow_data)
+        else:
+            # The timeout is a config register that is set rarely, so we
+            # can get away with synchronising it bitwise
+            m.submodules += FFSynchronizer(self.sync_timeout, lpc.sync_timeout,
+                                           o_domain="lclk")
+            m.submodules.timeout_sync = timeout_sync = PulseSynchronizer(i_domain="lclk",
+                                                                         o_domain="sync")
+            m.d.comb += timeout_sync.i.eq(lpc.timeout)
+            m.d.comb += self.sync_timeout_err.eq(timeout_sync.o)
+
+            # These are status bits that can change at any time anyway, so
+            # each bit is synchronised on its own
+            for shadow_data, lpc_shadow_data in zip(self.shadow_data, lpc.shadow_data):
+                m.submodules += FFSynchronizer(shadow_data, lpc_shadow_data,
+                                               o_domain="lclk")
 
         # We have two fifo
         # 1) fifowr for getting commands from the LPC and transferring them
         #     to the wishbone. This has address for writes and reads, data
         #     for writes and cmd (IO read/write)
         # 2) fiford for getting read data from the wishbone back to the LPC.
-        fifowr = AsyncFIFO(width=lpc.wrcmd.width(), depth=2,
-                      r_domain="sync",
-                      w_domain="lclkrst")
+        if self.single_clock:
+            # Both fifos are reset by the LPC side, stale responses are
+            # thrown away anyway
+            fifowr = ResetInserter(lpc.wrcmd.rst)(
+                SyncFIFO(width=lpc.wrcmd.width(), depth=self.fifo_depth))
+            fiford = ResetInserter(lpc.wrcmd.rst)(
+                SyncFIFO(width=lpc.rdcmd.width(), depth=self.fifo_depth))
+            m.d.comb += wr_rst.eq(lpc.wrcmd.rst)
+            m.d.comb += wr_idle.eq(fifowr.level == 0)
+            m.d.comb += rd_free.eq(self.fifo_depth - fiford.level)
+        else:
+            fifowr = AsyncFIFO(width=lpc.wrcmd.width(), depth=self.fifo_depth,
+                          r_domain="sync",
+                          w_domain="lclkrst")
+            fiford = AsyncFIFO(width=lpc.rdcmd.width(), depth=self.fifo_depth,
+                          r_domain="lclkrst",
+                          w_domain="sync")
+            m.d.comb += wr_rst.eq(fifowr.r_rst)
+            m.d.comb += wr_idle.eq(fifowr.w_level == 0)
+            # w_level is a cycle behind, count the last write too
+            rd_wrote = Signal()
+            m.d.sync += rd_wrote.eq(fiford.w_en & fiford.w_rdy)
+            m.d.comb += rd_free.eq(self.fifo_depth - fiford.w_level - rd_wrote)
         m.submodules += fifowr
-        fiford = AsyncFIFO(width=lpc.rdcmd.width(), depth=2,
-                      r_domain="lclkrst",
-                      w_domain="sync")
         m.submodules += fiford
         # lpc clock side
-        m.d.comb += fifowr.w_data[ 0:32].eq(lpc.wrcmd.data)
-        m.d.comb += fifowr.w_data[32:60].eq(lpc.wrcmd.addr)
-        m.d.comb += fifowr.w_data[60:62].eq(lpc.wrcmd.cmd)
-        m.d.comb += fifowr.w_data[62:64].eq(lpc.wrcmd.size)
+        m.d.comb += fifowr.w_data.eq(Cat(lpc.wrcmd.data, lpc.wrcmd.addr,
+                                         lpc.wrcmd.cmd, lpc.wrcmd.size, lpc.wrcmd.tag))
         m.d.comb += lpc.wrcmd.rdy.eq(fifowr.w_rdy)
         m.d.comb += fifowr.w_en.eq(lpc.wrcmd.en)
+        m.d.comb += lpc.wrcmd.idle.eq(wr_idle)
         # system clock side
-        m.d.comb += wr_data.eq(fifowr.r_data[ 0:32])  # sliced as above
-        m.d.comb += wr_addr.eq(fifowr.r_data[32:60])  # sliced as above
-        m.d.comb += wr_cmd.eq (fifowr.r_data[60:62])  # sliced as above
-        m.d.comb += wr_size.eq(fifowr.r_data[62:64])  # sliced as above
+        m.d.comb += Cat(wr_data, wr_addr, wr_cmd, wr_size, wr_tag).eq(fifowr.r_data)  # packed as above
         m.d.comb += wr_rdy.eq(fifowr.r_rdy)
         m.d.comb += fifowr.r_en.eq(0) # See below for wishbone acks
+        m.d.comb += wr_io.eq((wr_cmd == LPCCycletype.IORD) | (wr_cmd == LPCCycletype.IOWR))
+        m.d.comb += wr_fw.eq((wr_cmd == LPCCycletype.FWRD) | (wr_cmd == LPCCycletype.FWWR) |
+                             (wr_cmd == LPCCycletype.MEMRD) | (wr_cmd == LPCCycletype.MEMWR))
+        m.d.comb += wr_we.eq((wr_cmd == LPCCycletype.IOWR) | (wr_cmd == LPCCycletype.FWWR) |
+                             (wr_cmd == LPCCycletype.MEMWR))
 
         # turn fifowr into IO wishbone master
-        m.d.comb += self.io_wb.adr.eq(wr_addr[0:16])
-        m.d.comb += self.io_wb.dat_w.eq(wr_data[0:8])
-        m.d.comb += self.io_wb.sel.eq(1)
-        m.d.comb += self.io_wb.we.eq(wr_cmd == LPCCycletype.IOWR)
-        with m.If ((wr_cmd == LPCCycletype.IORD) | (wr_cmd == LPCCycletype.IOWR)):
+        m.d.comb += io_wb.adr.eq(wr_addr[0:16])
+        m.d.comb += io_wb.dat_w.eq(wr_data[0:8])
+        m.d.comb += io_wb.sel.eq(1)
+        m.d.comb += io_wb.we.eq(wr_we)
+        # Pipelined, the IO request has been accepted and we are
+        # waiting for the response
+        io_issued = Signal()
+        with m.If (wr_io):
             # The fiford should always be ready here but check anyway
-            m.d.comb += self.io_wb.cyc.eq(wr_rdy & fiford.w_rdy)
-            m.d.comb += self.io_wb.stb.eq(wr_rdy & fiford.w_rdy)
-        # turn fifowr into FW wishbone master
-        m.d.comb += self.fw_wb.adr.eq(wr_addr[2:28])
+            m.d.comb += io_wb.cyc.eq(wr_rdy & fiford.w_rdy)
+            m.d.comb += io_wb.stb.eq(wr_rdy & fiford.w_rdy & ~io_issued)
+        if self.pipelined:
+            with m.If (io_wb.stb & ~io_wb.stall):
+                m.d.sync += io_issued.eq(1)
+            with m.If (io_wb.ack | io_wb.err | wr_rst):
+                m.d.sync += io_issued.eq(0)
+        # turn fifowr into FW wishbone master. 16 and 128 byte FW
+        # cycles are split into one wishbone cycle per word, wr_beat
+        # counts which word we are on. Pipelined, wr_issue counts the
+        # words sent and can run ahead of wr_beat on reads.
+        wr_beat = Signal(range(LPC_FW_MAX_BYTES // 4))
+        wr_issue = Signal(range(LPC_FW_MAX_BYTES // 4 + 1))
+        wr_last = Signal()
+        fw_issue = Signal()  # OK to send the next word
+        wr_err = Signal()  # An earlier word of this write failed
+        fw_drop = Signal()  # Drop words in flight after an error
+        fw_done = Signal()  # Word finished, on the wishbone or skipped
+        fw_fail = Signal()  # and it failed
+        fw_end = Signal()  # Command finished
+        m.d.comb += wr_last.eq(wr_beat == (wr_size >> 2))
+        if self.pipelined:
+            wr_word = wr_issue
+            with m.If (wr_we):
+                m.d.comb += fw_issue.eq(wr_issue == wr_beat)
+            with m.Else():
+                m.d.comb += fw_issue.eq((wr_issue <= (wr_size >> 2)) &
+                                        ((wr_issue - wr_beat) < rd_free))
+        else:
+            wr_word = wr_beat
+            m.d.comb += fw_issue.eq(1)
+        m.d.comb += fw_wb.adr.eq(wr_addr[2:32] + wr_word)
+        if self.burst:
+            m.d.comb += fw_wb.bte.eq(BurstTypeExt.LINEAR)
+            with m.If ((wr_size >> 2) == 0):
+                m.d.comb += fw_wb.cti.eq(CycleType.CLASSIC)
+            with m.Elif (wr_word == (wr_size >> 2)):
+                m.d.comb += fw_wb.cti.eq(CycleType.END_OF_BURST)
+            with m.Else():
+                m.d.comb += fw_wb.cti.eq(CycleType.INCR_BURST)
         # data comes in the MSB so we need to shift it down for smaller sizes
-        m.d.comb += self.fw_wb.dat_w.eq(wr_data)
-        with m.If (wr_size == 3):
-            m.d.comb += self.fw_wb.sel.eq(0b1111)
+        m.d.comb += fw_wb.dat_w.eq(wr_data)
+        with m.If (wr_size >= 3):
+            m.d.comb += fw_wb.sel.eq(0b1111)
         with m.If (wr_size == 1):
             with m.If (wr_addr[1] == 0b0):
-                m.d.comb += self.fw_wb.sel.eq(0b0011)
+                m.d.comb += fw_wb.sel.eq(0b0011)
             with m.If (wr_addr[1] == 0b1):
-                m.d.comb += self.fw_wb.sel.eq(0b1100)
-                m.d.comb += self.fw_wb.dat_w.eq(wr_data << 16)
+                m.d.comb += fw_wb.sel.eq(0b1100)
+                m.d.comb += fw_wb.dat_w.eq(wr_data << 16)
         with m.If (wr_size == 0):
             with m.If (wr_addr[0:2] == 0b00):
-                m.d.comb += self.fw_wb.sel.eq(0b0001)
+                m.d.comb += fw_wb.sel.eq(0b0001)
             with m.If (wr_addr[0:2] == 0b01):
-                m.d.comb += self.fw_wb.sel.eq(0b0010)
-                m.d.comb += self.fw_wb.dat_w.eq(wr_data << 8)
+                m.d.comb += fw_wb.sel.eq(0b0010)
+                m.d.comb += fw_wb.dat_w.eq(wr_data << 8)
             with m.If (wr_addr[0:2] == 0b10):
-                m.d.comb += self.fw_wb.sel.eq(0b0100)
-                m.d.comb += self.fw_wb.dat_w.eq(wr_data << 16)
+                m.d.comb += fw_wb.sel.eq(0b0100)
+                m.d.comb += fw_wb.dat_w.eq(wr_data << 16)
             with m.If (wr_addr[0:2] == 0b11):
-                m.d.comb += self.fw_wb.sel.eq(0b1000)
-                m.d.comb += self.fw_wb.dat_w.eq(wr_data << 24)
-        m.d.comb += self.fw_wb.we.eq(wr_cmd == LPCCycletype.FWWR)
-        with m.If ((wr_cmd == LPCCycletype.FWRD) | (wr_cmd == LPCCycletype.FWWR)):
+                m.d.comb += fw_wb.sel.eq(0b1000)
+                m.d.comb += fw_wb.dat_w.eq(wr_data << 24)
+        m.d.comb += fw_wb.we.eq(wr_we)
+        with m.If (wr_fw & ~wr_err & ~fw_drop):
             # The fiford should always be ready here but check anyway
-            m.d.comb += self.fw_wb.cyc.eq(wr_rdy & fiford.w_rdy)
-            m.d.comb += self.fw_wb.stb.eq(wr_rdy & fiford.w_rdy)
+            m.d.comb += fw_wb.cyc.eq(wr_rdy & fiford.w_rdy)
+            m.d.comb += fw_wb.stb.eq(wr_rdy & fiford.w_rdy & fw_issue)
+        if self.burst:
+            # Hold cyc part way through a burst, while the next word of
+            # a write makes its way through fifowr
+            with m.If ((wr_beat != 0) & ~wr_err):
+                m.d.comb += fw_wb.cyc.eq(1)
         # Arbitrate the acks back into the fifo
-        with m.If ((wr_cmd == LPCCycletype.IORD) | (wr_cmd == LPCCycletype.IOWR)):
-            m.d.comb += fifowr.r_en.eq(self.io_wb.ack | self.io_wb.err)
-            m.d.comb += fiford.w_data[32].eq(self.io_wb.err)
-        with m.If ((wr_cmd == LPCCycletype.FWRD) | (wr_cmd == LPCCycletype.FWWR)):
-            m.d.comb += fifowr.r_en.eq(self.fw_wb.ack)
-            m.d.comb += fiford.w_data[32].eq(0)
+        with m.If (wr_io):
+            m.d.comb += fifowr.r_en.eq(io_wb.ack | io_wb.err)
+            m.d.comb += fiford.w_data[32].eq(io_wb.err)
+        m.d.comb += [
+            fw_done.eq((fw_wb.cyc & (fw_wb.ack | fw_wb.err)) |
+                       (wr_err & wr_rdy & fiford.w_rdy)),
+            fw_fail.eq((fw_wb.cyc & fw_wb.err) | wr_err),
+            fw_end.eq(fw_done & (wr_last | (fw_fail & ~wr_we))),
+        ]
+        m.d.sync += fw_drop.eq(0)
+        with m.If (wr_fw):
+            # Reads send back a word per beat but only finish the
+            # command on the last one (or the first error). Writes get a
+            # fifowr entry per beat but are only acked back to the LPC
+            # on the last one.
+            if self.pipelined:
+                with m.If (fw_wb.stb & ~fw_wb.stall):
+                    m.d.sync += wr_issue.eq(wr_issue + 1)
+            with m.If (fw_done):
+                m.d.sync += wr_beat.eq(wr_beat + 1)
+                with m.If (fw_fail & wr_we):
+                    m.d.sync += wr_err.eq(1)
+                with m.If (fw_end):
+                    m.d.sync += [
+                        wr_beat.eq(0),
+                        wr_issue.eq(0),
+                        wr_err.eq(0),
+                        fw_drop.eq(fw_fail),
+                    ]
+            m.d.comb += fifowr.r_en.eq(fw_done & (fw_end | wr_we))
+            m.d.comb += fiford.w_data[32].eq(fw_fail)
+        # The LPC side reset the fifo (abort or timeout) part way
+        # through a command
+        with m.If (wr_rst):
+            m.d.sync += [
+                wr_beat.eq(0),
+                wr_issue.eq(0),
+                wr_err.eq(0),
+            ]
 
         # sending data back from IO/FW wishbones to fiford
+        m.d.comb += fiford.w_data[33:].eq(wr_tag)
         with m.If (wr_cmd == LPCCycletype.IORD):
-            m.d.comb += fiford.w_data[0:32].eq(self.io_wb.dat_r)
-        with m.Elif (wr_cmd == LPCCycletype.FWRD):
-            m.d.comb += fiford.w_data[0:32].eq(self.fw_wb.dat_r)
+            m.d.comb += fiford.w_data[0:32].eq(io_wb.dat_r)
+        with m.Elif ((wr_cmd == LPCCycletype.FWRD) | (wr_cmd == LPCCycletype.MEMRD)):
+            m.d.comb += fiford.w_data[0:32].eq(fw_wb.dat_r)
             with m.If (wr_size == 1):
                 with m.If (wr_addr[1] == 0b1):
-                    m.d.comb += fiford.w_data[0:16].eq(self.fw_wb.dat_r[16:32])
+                    m.d.comb += fiford.w_data[0:16].eq(fw_wb.dat_r[16:32])
             with m.If (wr_size == 0):
                 with m.If (wr_addr[0:2] == 0b01):
-                    m.d.comb += fiford.w_data[0:8].eq(self.fw_wb.dat_r[8:16])
+                    m.d.comb += fiford.w_data[0:8].eq(fw_wb.dat_r[8:16])
                 with m.If (wr_addr[0:2] == 0b10):
-                    m.d.comb += fiford.w_data[0:8].eq(self.fw_wb.dat_r[16:24])
+                    m.d.comb += fiford.w_data[0:8].eq(fw_wb.dat_r[16:24])
                 with m.If (wr_addr[0:2] == 0b11):
-                    m.d.comb += fiford.w_data[0:8].eq(self.fw_wb.dat_r[24:32])
-        m.d.comb += fiford.w_en.eq(self.io_wb.ack | self.fw_wb.ack | self.io_wb.err)
+                    m.d.comb += fiford.w_data[0:8].eq(fw_wb.dat_r[24:32])
+        # Only take acks for a cycle we are actually running
+        if self.posted_writes:
+            # Nothing goes back for writes, the LPC has already moved on
+            m.d.comb += fiford.w_en.eq(~wr_we & ~wr_rst &
+                                       ((io_wb.cyc & (io_wb.ack | io_wb.err)) |
+                                        (wr_fw & fw_done)))
+            m.d.comb += self.posted_err.eq(wr_we & ((io_wb.cyc & io_wb.err) |
+                                                    (wr_fw & fw_end & fw_fail)))
+            m.d.comb += self.posted_err_addr.eq(wr_addr)
+        else:
+            m.d.comb += fiford.w_en.eq(~wr_rst &
+                                       ((io_wb.cyc & (io_wb.ack | io_wb.err)) |
+                                        (wr_fw & fw_done & (fw_end | ~wr_we))))
 
         # lpc side of read fiford
         m.d.comb += fiford.r_en.eq(lpc.rdcmd.en)
         m.d.comb += lpc.rdcmd.data.eq(fiford.r_data[0:32])
         m.d.comb += lpc.rdcmd.error.eq(fiford.r_data[32])
+        m.d.comb += lpc.rdcmd.tag.eq(fiford.r_data[33:])
         m.d.comb += lpc.rdcmd.rdy.eq(fiford.r_rdy)
 
         return m
@@ -6,25 +6,148 @@
 # reads/writes and translates it into something that can be used for
 # DMA access into another master wishbone bus. Base and mask registers
 # (accessible via an IO wishbone bus) configure this
+#
+# Errors on posted LPC writes can't be reported back to the host, so
+# they are latched in a status register here (with the address of the
+# first one) and can raise an interrupt to the BMC. Write 1 to clear.
+# LPC cycles that time out waiting for the back end (see sync_timeout)
+# are also flagged in the status register.
+#
+# Errors on the DMA wishbone go back to the LPC side (which sends an
+# LPC SYNC ERROR for them) and are also flagged in the status register.
+# They are counted in the DMA error count register (saturating, write
+# to clear) and the DMA error address register has the translated byte
+# address of the last one.
+#
+# The address translation is combinatorial on the way to the DMA
+# wishbone. With registered set, there is a register stage before it
+# (after the write combining buffer, cache and prefetcher below), so
+# the window and page table matching and the translation start from a
+# register rather than from the LPC wishbone.
+# With pipelined the LPC and DMA wishbones are pipelined (with stall).
+# With burst they carry CTI and BTE, which go through the translation
+# as they are, except an incrementing burst that would run off the top
+# of the window is ended there. The next word starts a new burst at
+# the bottom.
+#
+# With write_combine, partial FW writes go through a write combining
+# buffer (see WishboneWriteCombiner) before the translation, and
+# are written out after at most write_combine cycles. Writing 1 to bit
+# 0 of the write combine register writes the buffer out now, bit 0
+# reads as 1 while the buffer holds a write. Writes to base, mask,
+# the windows and the page table wait for the buffer to be written
+# out, so a buffered write is translated with the mapping it came in
+# under. Combined writes are acked before they reach the DMA wishbone,
+# so they fail like posted writes, in status bit 0 and the error
+# address register.
+#
+# With cache_lines, FW reads go through a read cache (see
+# WishboneReadCache) of cache_lines lines of cache_line_words words,
+# cache_ways way set associative, after the write combining buffer and
+# before the translation. It is invalidated when base or mask are
+# written, and by writing 1 to bit 0 of the cache register. Hits and
+# misses are counted in the cache hit and miss registers (saturating,
+# write to clear).
+#
+# With prefetch, FW reads then go through a stream prefetcher (see
+# WishbonePrefetcher) with a buffer of prefetch words. Bit 0 of the
+# prefetch register enables it and bits 15:8 are the number of words to
+# fetch ahead (no more than prefetch). Buffered words that are read and
+# that are thrown away are counted in the prefetch used and wasted
+# registers (saturating, write to clear). The buffer is thrown away
+# when base or mask are written.
+#
+# With shadow_words, FW reads of shadow_words words from LPC address
+# shadow_base are answered from a copy in block RAM (see
+# WishboneShadow), ahead of everything else. The BMC loads it through
+# the shadow address and data registers, each read or write of the data
+# register moves the address on a word. Bit 0 of the shadow register
+# enables it.
+#
+# With windows, there is also a table of that many windows at register
+# 32 up, four registers each: LPC base, LPC mask (size - 1), system
+# base, and control (bit 0 allows reads, bit 1 writes). They are all
+# matched at once, the lowest numbered window containing the address
+# wins. Accesses it doesn't allow fail with an error on the LPC side
+# and are flagged in the status register. Accesses outside all of them
+# go through base and mask as before. Windows can be left set up for
+# reads and writes at the same time, so the host can move between them
+# without the BMC.
+#
+# With pages, accesses outside the windows can instead be translated a
+# page (page_size bytes) at a time through a page table (see
+# WishbonePageTable) of that many entries. Each entry is the system
+# byte address of the page, with bit 0 set if it's mapped. The BMC
+# loads it through the page table address and data registers like the
+# shadow, bit 0 of the page table register enables it. Accesses to
+# pages that aren't mapped fail like those a window doesn't allow.
+#
+# The SERIRQ config register has a byte per target IRQ source: bits 4:0
+# are the IRQ slot, bit 6 sends the IRQ active low and bit 7 enables
+# it.
 
-from nmigen import Elaboratable, Module, Signal
-from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen import Cat, Const, Elaboratable, Module, Mux, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType
 from nmigen_soc.csr import Multiplexer as CSRMultiplexer
 from nmigen_soc.csr import Element as CSRElement
 from nmigen_soc.csr.wishbone import WishboneCSRBridge
 from nmigen.back import verilog
 
+from .wb_slice import WishboneRegSlice
+from .wb_write_combine import WishboneWriteCombiner
+from .wb_cache import WishboneReadCache
+from .wb_prefetch import WishbonePrefetcher
+from .wb_shadow import WishboneShadow
+from .wb_page_table import WishbonePageTable
+
 
 class LPC_Ctrl(Elaboratable):
-    def __init__(self):
-        self.io_wb = WishboneInterface(data_width=32, addr_width=2, granularity=8)
+    def __init__(self, registered=False, pipelined=False, burst=False, write_combine=0,
+                 cache_lines=0, cache_line_words=4, cache_ways=1, prefetch=0,
+                 shadow_words=0, shadow_base=0, windows=0, pages=0, page_size=4096):
+        assert windows <= 8
+        self.registered = registered
+        self.pipelined = pipelined
+        self.burst = burst
+        self.write_combine = write_combine
+        self.cache_lines = cache_lines
+        self.cache_line_words = cache_line_words
+        self.cache_ways = cache_ways
+        self.prefetch = prefetch
+        self.shadow_words = shadow_words
+        self.shadow_base = shadow_base
+        self.windows = windows
+        self.pages = pages
+        self.page_size = page_size
+        features = ["err"] + (["stall"] if pipelined else []) + (["cti", "bte"] if burst else [])
+
+        self.io_wb = WishboneInterface(data_width=32, addr_width=6, granularity=8)
+
+        self.lpc_wb = WishboneInterface(data_width=32, addr_width=30, granularity=8,
+                                        features=features)
+        self.dma_wb = WishboneInterface(data_width=32, addr_width=30, granularity=8,
+                                        features=features)
+
+        # Posted write errors from lpc2wb
+        self.posted_err = Signal()
+        self.posted_err_addr = Signal(32)
+
+        # LPC SYNC timeout in LPC clocks, 0 to disable
+        self.sync_timeout = Signal(16)
+        self.sync_timeout_err = Signal()
 
-        self.lpc_wb = WishboneInterface(data_width=32, addr_width=26, granularity=8)
-        self.dma_wb = WishboneInterface(data_width=32, addr_width=30, granularity=8)
+        # SERIRQ config, a byte per target IRQ source
+        self.serirq_cfg = Signal(32)
+
+        self.irq = Signal()
 
     def elaborate(self, platform):
         m = Module()
 
+        # Same as lpc_wb and dma_wb
+        features = (["err"] + (["stall"] if self.pipelined else []) +
+                    (["cti", "bte"] if self.burst else []))
+
         base_lo_csr = CSRElement(32, "rw")
         base_lo = Signal(32)
         #  Leave space for upper 32 bits, unused for now
@@ -33,32 +156,368 @@ class LPC_Ctrl(Elaboratable):
         mask_lo = Signal(32)
         #  Leave space for upper 32 bits, unused for now
         mask_hi_csr = CSRElement(32, "rw")
+        status_csr = CSRElement(32, "rw")
+        # bit 0: posted write error, bit 1: SYNC timeout, bit 2: DMA error,
+        # bit 3: window error (not allowed, or page not mapped)
+        status = Signal(4)
+        irq_en_csr = CSRElement(32, "rw")
+        irq_en = Signal(4)
+        err_addr_csr = CSRElement(32, "r")
+        err_addr = Signal(32)
+        sync_timeout_csr = CSRElement(32, "rw")
+        serirq_cfg_csr = CSRElement(32, "rw")
+        dma_err_count_csr = CSRElement(32, "rw")
+        dma_err_count = Signal(32)
+        dma_err_addr_csr = CSRElement(32, "r")
+        dma_err_addr = Signal(32)
+        wc_csr = CSRElement(32, "rw")
+        cache_csr = CSRElement(32, "rw")
+        cache_hits_csr = CSRElement(32, "rw")
+        cache_hits = Signal(32)
+        cache_misses_csr = CSRElement(32, "rw")
+        cache_misses = Signal(32)
+        prefetch_csr = CSRElement(32, "rw")
+        prefetch_en = Signal()
+        prefetch_depth = Signal(8)
+        prefetch_used_csr = CSRElement(32, "rw")
+        prefetch_used = Signal(32)
+        prefetch_wasted_csr = CSRElement(32, "rw")
+        prefetch_wasted = Signal(32)
+        shadow_csr = CSRElement(32, "rw")
+        shadow_en = Signal()
+        shadow_addr_csr = CSRElement(32, "rw")
+        shadow_addr = Signal(range(max(self.shadow_words, 2)))
+        shadow_data_csr = CSRElement(32, "rw")
+
+        pt_csr = CSRElement(32, "rw")
+        pt_en = Signal()
+        pt_addr_csr = CSRElement(32, "rw")
+        pt_addr = Signal(range(max(self.pages, 2)))
+        pt_data_csr = CSRElement(32, "rw")
+        win_lpc_base = [Signal(32, name="win%d_lpc_base" % i) for i in range(self.windows)]
+        win_lpc_mask = [Signal(32, name="win%d_lpc_mask" % i) for i in range(self.windows)]
+        win_sys_base = [Signal(32, name="win%d_sys_base" % i) for i in range(self.windows)]
+        win_ctrl = [Signal(2, name="win%d_ctrl" % i) for i in range(self.windows)]
+        win_csrs = [[CSRElement(32, "rw") for _ in range(4)] for _ in range(self.windows)]
 
-        m.submodules.mux = mux = CSRMultiplexer(addr_width=2, data_width=32)
+        m.submodules.mux = mux = CSRMultiplexer(addr_width=6, data_width=32)
         mux.add(base_lo_csr)
         mux.add(base_hi_csr)
         mux.add(mask_lo_csr)
         mux.add(mask_hi_csr)
+        mux.add(status_csr)
+        mux.add(irq_en_csr)
+        mux.add(err_addr_csr)
+        mux.add(sync_timeout_csr)
+        mux.add(serirq_cfg_csr)
+        mux.add(dma_err_count_csr)
+        mux.add(dma_err_addr_csr)
+        mux.add(wc_csr)
+        mux.add(cache_csr)
+        mux.add(cache_hits_csr)
+        mux.add(cache_misses_csr)
+        mux.add(prefetch_csr)
+        mux.add(prefetch_used_csr)
+        mux.add(prefetch_wasted_csr)
+        mux.add(shadow_csr)
+        mux.add(shadow_addr_csr)
+        mux.add(shadow_data_csr)
+        mux.add(pt_csr)
+        mux.add(pt_addr_csr)
+        mux.add(pt_data_csr)
+        for i, csrs in enumerate(win_csrs):
+            for j, csr in enumerate(csrs):
+                mux.add(csr, addr=32 + 4 * i + j)
 
         m.submodules.bridge = bridge = WishboneCSRBridge(mux.bus)
 
-        m.d.comb += self.io_wb.connect(bridge.wb_bus)
+        # The bridge starts another access if stb is still high while it
+        # acks, which would move the shadow address on twice
+        io_hold = Signal()
+        m.d.comb += [
+            self.io_wb.connect(bridge.wb_bus, exclude={"stb"}),
+            bridge.wb_bus.stb.eq(self.io_wb.stb & ~bridge.wb_bus.ack & ~io_hold),
+        ]
 
         m.d.comb += [
             base_lo_csr.r_data.eq(base_lo),
             mask_lo_csr.r_data.eq(mask_lo),
+            status_csr.r_data.eq(status),
+            irq_en_csr.r_data.eq(irq_en),
+            err_addr_csr.r_data.eq(err_addr),
+            sync_timeout_csr.r_data.eq(self.sync_timeout),
+            serirq_cfg_csr.r_data.eq(self.serirq_cfg),
+            dma_err_count_csr.r_data.eq(dma_err_count),
+            dma_err_addr_csr.r_data.eq(dma_err_addr),
+            cache_hits_csr.r_data.eq(cache_hits),
+            cache_misses_csr.r_data.eq(cache_misses),
+            prefetch_csr.r_data.eq(Cat(prefetch_en, Const(0, 7), prefetch_depth)),
+            prefetch_used_csr.r_data.eq(prefetch_used),
+            prefetch_wasted_csr.r_data.eq(prefetch_wasted),
+            shadow_csr.r_data.eq(shadow_en),
+            shadow_addr_csr.r_data.eq(shadow_addr),
+            pt_csr.r_data.eq(pt_en),
+            pt_addr_csr.r_data.eq(pt_addr),
         ]
 
+        # The mapping from LPC to system addresses is changing
+        window_csrs = ([base_lo_csr, mask_lo_csr, pt_csr, pt_data_csr] +
+                       [csr for csrs in win_csrs for csr in csrs])
+        window_changed = Signal()
+        m.d.comb += window_changed.eq(Cat(csr.w_stb for csr in window_csrs).any())
+
+        for i, csrs in enumerate(win_csrs):
+            for csr, reg in zip(csrs, (win_lpc_base[i], win_lpc_mask[i], win_sys_base[i],
+                                       win_ctrl[i])):
+                m.d.comb += csr.r_data.eq(reg)
+                with m.If(csr.w_stb):
+                    m.d.sync += reg.eq(csr.w_data)
+
         with m.If(base_lo_csr.w_stb):
             m.d.sync += base_lo.eq(base_lo_csr.w_data)
         with m.If(mask_lo_csr.w_stb):
             m.d.sync += mask_lo.eq(mask_lo_csr.w_data)
+        with m.If(irq_en_csr.w_stb):
+            m.d.sync += irq_en.eq(irq_en_csr.w_data)
+        with m.If(sync_timeout_csr.w_stb):
+            m.d.sync += self.sync_timeout.eq(sync_timeout_csr.w_data)
+        with m.If(serirq_cfg_csr.w_stb):
+            m.d.sync += self.serirq_cfg.eq(serirq_cfg_csr.w_data)
+        if self.prefetch:
+            with m.If(prefetch_csr.w_stb):
+                m.d.sync += [
+                    prefetch_en.eq(prefetch_csr.w_data[0]),
+                    prefetch_depth.eq(prefetch_csr.w_data[8:16]),
+                ]
+                with m.If(prefetch_csr.w_data[8:16] > self.prefetch):
+                    m.d.sync += prefetch_depth.eq(self.prefetch)
+
+        with m.If(status_csr.w_stb):
+            m.d.sync += status.eq(status & ~status_csr.w_data)
+        # Keep the address of the first error until it's cleared
+        with m.If(self.posted_err):
+            m.d.sync += status[0].eq(1)
+            with m.If(~status[0]):
+                m.d.sync += err_addr.eq(self.posted_err_addr)
+        with m.If(self.sync_timeout_err):
+            m.d.sync += status[1].eq(1)
+
+        with m.If(dma_err_count_csr.w_stb):
+            m.d.sync += dma_err_count.eq(0)
+        with m.If(self.dma_wb.cyc & self.dma_wb.err):
+            m.d.sync += [
+                status[2].eq(1),
+                dma_err_addr.eq(self.dma_wb.adr << 2),
+            ]
+            with m.If(~dma_err_count.all()):
+                m.d.sync += dma_err_count.eq(dma_err_count + 1)
+
+        m.d.comb += self.irq.eq((status & irq_en).any())
+
+        lpc_wb = self.lpc_wb
+
+        if self.shadow_words:
+            m.submodules.shadow = shadow = WishboneShadow(
+                addr_width=lpc_wb.addr_width, data_width=lpc_wb.data_width,
+                granularity=lpc_wb.granularity, features=features,
+                base=self.shadow_base >> 2, words=self.shadow_words)
+            with m.If(shadow_csr.w_stb):
+                m.d.sync += shadow_en.eq(shadow_csr.w_data[0])
+            with m.If(shadow_addr_csr.w_stb):
+                m.d.sync += shadow_addr.eq(shadow_addr_csr.w_data)
+            with m.Elif(shadow_data_csr.r_stb | shadow_data_csr.w_stb):
+                m.d.sync += shadow_addr.eq(shadow_addr + 1)
+            m.d.comb += [
+                lpc_wb.connect(shadow.bus),
+                shadow.enable.eq(shadow_en),
+                shadow.load_adr.eq(shadow_addr),
+                shadow.load_dat_w.eq(shadow_data_csr.w_data),
+                shadow.load_we.eq(shadow_data_csr.w_stb),
+                shadow_data_csr.r_data.eq(shadow.load_dat_r),
+            ]
+            lpc_wb = shadow.sub
+
+        if self.write_combine:
+            m.submodules.write_combine = combiner = WishboneWriteCombiner(
+                addr_width=self.lpc_wb.addr_width, data_width=self.lpc_wb.data_width,
+                granularity=self.lpc_wb.granularity, features=features,
+                timeout=self.write_combine)
+            # Hold writes that change the mapping until the buffer is
+            # written out
+            window_adr = Signal()
+            m.d.comb += window_adr.eq(Cat(self.io_wb.adr == mux.bus.memory_map.find_resource(csr)[0]
+                                          for csr in window_csrs).any())
+            m.d.comb += [
+                lpc_wb.connect(combiner.bus),
+                io_hold.eq(self.io_wb.cyc & self.io_wb.stb & self.io_wb.we & window_adr &
+                           combiner.valid),
+                combiner.flush.eq(io_hold | (wc_csr.w_stb & wc_csr.w_data[0])),
+                wc_csr.r_data.eq(combiner.valid),
+            ]
+            with m.If(combiner.err):
+                m.d.sync += status[0].eq(1)
+                with m.If(~status[0] & ~self.posted_err):
+                    m.d.sync += err_addr.eq(combiner.err_adr << 2)
+            lpc_wb = combiner.sub
+
+        if self.cache_lines:
+            m.submodules.cache = cache = WishboneReadCache(
+                addr_width=lpc_wb.addr_width, data_width=lpc_wb.data_width,
+                granularity=lpc_wb.granularity, features=features,
+                lines=self.cache_lines, line_words=self.cache_line_words,
+                ways=self.cache_ways)
+            m.d.comb += [
+                lpc_wb.connect(cache.bus),
+                # Cached lines were read through the old window
+                cache.invalidate.eq(window_changed | (cache_csr.w_stb & cache_csr.w_data[0])),
+            ]
+            with m.If(cache_hits_csr.w_stb):
+                m.d.sync += cache_hits.eq(0)
+            with m.Elif(cache.hit & ~cache_hits.all()):
+                m.d.sync += cache_hits.eq(cache_hits + 1)
+            with m.If(cache_misses_csr.w_stb):
+                m.d.sync += cache_misses.eq(0)
+            with m.Elif(cache.miss & ~cache_misses.all()):
+                m.d.sync += cache_misses.eq(cache_misses + 1)
+            lpc_wb = cache.sub
+
+        if self.prefetch:
+            m.submodules.prefetch = prefetcher = WishbonePrefetcher(
+                addr_width=lpc_wb.addr_width, data_width=lpc_wb.data_width,
+                granularity=lpc_wb.granularity, features=features,
+                depth=self.prefetch)
+            m.d.comb += [
+                lpc_wb.connect(prefetcher.bus),
+                prefetcher.enable.eq(prefetch_en),
+                prefetcher.depth.eq(prefetch_depth),
+                prefetcher.invalidate.eq(window_changed),
+            ]
+            used = Signal(33)
+            wasted = Signal(33)
+            m.d.comb += [
+                used.eq(prefetch_used + prefetcher.used),
+                wasted.eq(prefetch_wasted + prefetcher.wasted),
+            ]
+            with m.If(prefetch_used_csr.w_stb):
+                m.d.sync += prefetch_used.eq(0)
+            with m.Elif(used[32]):
+                m.d.sync += prefetch_used.eq(~0)
+            with m.Else():
+                m.d.sync += prefetch_used.eq(used)
+            with m.If(prefetch_wasted_csr.w_stb):
+                m.d.sync += prefetch_wasted.eq(0)
+            with m.Elif(wasted[32]):
+                m.d.sync += prefetch_wasted.eq(~0)
+            with m.Else():
+                m.d.sync += prefetch_wasted.eq(wasted)
+            lpc_wb = prefetcher.sub
 
+        if self.registered:
+            # Ahead of the page table and window matching, so the
+            # translation starts from a register
+            m.submodules.dma_slice = dma_slice = WishboneRegSlice(
+                addr_width=lpc_wb.addr_width, data_width=lpc_wb.data_width,
+                granularity=lpc_wb.granularity, features=features)
+            m.d.comb += lpc_wb.connect(dma_slice.bus)
+            lpc_wb = dma_slice.sub
+        dma_wb = self.dma_wb
+
+        # The windows are matched on LPC addresses
+        win_wb = lpc_wb
+        in_window = Signal()
+
+        if self.pages:
+            m.submodules.page_table = page_table = WishbonePageTable(
+                addr_width=lpc_wb.addr_width, data_width=lpc_wb.data_width,
+                granularity=lpc_wb.granularity, features=features,
+                pages=self.pages, page_size=self.page_size)
+            with m.If(pt_csr.w_stb):
+                m.d.sync += pt_en.eq(pt_csr.w_data[0])
+            with m.If(pt_addr_csr.w_stb):
+                m.d.sync += pt_addr.eq(pt_addr_csr.w_data)
+            with m.Elif(pt_data_csr.r_stb | pt_data_csr.w_stb):
+                m.d.sync += pt_addr.eq(pt_addr + 1)
+            m.d.comb += [
+                lpc_wb.connect(page_table.bus),
+                page_table.bypass.eq(in_window | ~pt_en),
+                page_table.flush.eq(pt_csr.w_stb),
+                page_table.load_adr.eq(pt_addr),
+                page_table.load_dat_w.eq(pt_data_csr.w_data),
+                page_table.load_we.eq(pt_data_csr.w_stb),
+                pt_data_csr.r_data.eq(page_table.load_dat_r),
+            ]
+            lpc_wb = page_table.sub
+
+        # Window the access is in. base/mask are in bytes, so convert
+        # to wishbone addresses. The page table has already translated
+        # accesses outside the windows.
+        mask = Signal.like(lpc_wb.adr)
+        base = Signal.like(lpc_wb.adr)
+        denied = Signal()
         m.d.comb += [
-            self.lpc_wb.connect(self.dma_wb),
-            # base/mask are in bytes, so convert to wishbone addresses
-            self.dma_wb.adr.eq((self.lpc_wb.adr & (mask_lo >> 2)) | (base_lo >> 2))
+            mask.eq(mask_lo >> 2),
+            base.eq(base_lo >> 2),
         ]
+        if self.pages:
+            with m.If(pt_en):
+                m.d.comb += [
+                    mask.eq(~0),
+                    base.eq(0),
+                    denied.eq(page_table.unmapped),
+                ]
+        for i in reversed(range(self.windows)):
+            win_mask = win_lpc_mask[i] >> 2
+            with m.If(win_ctrl[i].any() &
+                      ((win_wb.adr & ~win_mask) == ((win_lpc_base[i] >> 2) & ~win_mask))):
+                m.d.comb += [
+                    in_window.eq(1),
+                    mask.eq(win_mask),
+                    base.eq(win_sys_base[i] >> 2),
+                    denied.eq(~Mux(win_wb.we, win_ctrl[i][1], win_ctrl[i][0])),
+                ]
+
+        m.d.comb += [
+            lpc_wb.connect(dma_wb),
+            dma_wb.adr.eq((lpc_wb.adr & mask) | base)
+        ]
+
+        if self.burst:
+            # The next word would wrap to the bottom of the window
+            with m.If((lpc_wb.cti == CycleType.INCR_BURST) &
+                      ((lpc_wb.adr & mask) == mask)):
+                m.d.comb += dma_wb.cti.eq(CycleType.END_OF_BURST)
+
+        if self.windows or self.pages:
+            # Denied accesses don't go to the DMA wishbone, they get an
+            # error a cycle later. On a pipelined wishbone they wait for
+            # the DMA responses already due, so they stay in order.
+            deny_resp = Signal()
+            deny_ok = ~deny_resp
+            if self.pipelined:
+                # More than the words in any LPC cycle
+                pending = Signal(8)
+                dma_resp = dma_wb.ack | dma_wb.err
+                dma_taken = dma_wb.cyc & dma_wb.stb & ~dma_wb.stall
+                with m.If(~dma_wb.cyc):
+                    m.d.sync += pending.eq(0)
+                with m.Elif(dma_taken & ~dma_resp):
+                    m.d.sync += pending.eq(pending + 1)
+                with m.Elif(~dma_taken & dma_resp):
+                    m.d.sync += pending.eq(pending - 1)
+                deny_ok = deny_ok & (pending == 0)
+
+            m.d.sync += deny_resp.eq(0)
+            with m.If(win_wb.cyc & win_wb.stb & denied):
+                m.d.comb += dma_wb.stb.eq(0)
+                if self.pipelined:
+                    m.d.comb += lpc_wb.stall.eq(~deny_ok)
+                with m.If(deny_ok):
+                    m.d.sync += [
+                        deny_resp.eq(1),
+                        status[3].eq(1),
+                    ]
+            with m.If(deny_resp):
+                m.d.comb += lpc_wb.err.eq(lpc_wb.cyc)
 
         return m
 
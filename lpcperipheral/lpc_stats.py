@@ -0,0 +1,198 @@
+# Statistics on the LPC front end, so we can see where LPC time goes on
+# real machines.
+#
+# Counters run in the LPC clock domain and watch the front end state
+# machine. There is a counter for the number of cycles spent in each
+# LPCStates state, the number of completed transactions of each
+# LPCCycletype, the number of SHORT_WAIT and LONG_WAIT SYNC cycles
+# sent, and the number of aborted (by LFRAME# or LRESET#) and ERRORed
+# cycles. Counters saturate rather than wrap.
+#
+# To see the tail latency of the back end there are also histograms of
+# the number of LONG_WAIT SYNC cycles each transaction took, one for
+# each LPCHistType. MEM cycles go in with FW cycles since they take the
+# same path. Bin 0 counts transactions with no LONG_WAITs, bin n counts
+# those with 2^(n-1) to 2^n - 1, and the last bin counts everything
+# longer. Transactions are binned when they finish their SYNC with a
+# READY or ERROR.
+#
+# Counters can't be read directly from the system clock domain. Writing
+# 1 to bit 0 of the control register snapshots all the counters and
+# clears them. Bit 0 reads as 1 until the snapshot is done (which needs
+# LCLK to be running), after which the snapshot can be read.
+#
+# Register map (32 bit registers):
+#   0                     control
+#   STATS_STATE + n       cycles in LPCStates n
+#   STATS_CYCLETYPE + n   completed LPCCycletype n transactions
+#   STATS_SHORT_WAIT      SHORT_WAIT SYNC cycles
+#   STATS_LONG_WAIT       LONG_WAIT SYNC cycles
+#   STATS_ABORT           aborted cycles
+#   STATS_ERROR           SYNC ERRORs
+#   STATS_HIST + n * STATS_HIST_BINS + b
+#                         LPCHistType n transactions in bin b
+
+from enum import Enum, unique
+
+from nmigen import Elaboratable, Module, Signal
+from nmigen.lib.cdc import PulseSynchronizer
+from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen_soc.csr import Multiplexer as CSRMultiplexer
+from nmigen_soc.csr import Element as CSRElement
+from nmigen_soc.csr.wishbone import WishboneCSRBridge
+from nmigen.back import verilog
+
+from .lpcfront import LPCStates, LPCCycletype, LPCSyncType
+
+@unique
+class LPCHistType(Enum):
+    IORD          = 0
+    IOWR          = 1
+    FWRD          = 2  # FW and MEM
+    FWWR          = 3
+
+
+STATS_CTRL = 0
+STATS_STATE = 1
+STATS_CYCLETYPE = STATS_STATE + len(LPCStates)
+STATS_SHORT_WAIT = STATS_CYCLETYPE + len(LPCCycletype)
+STATS_LONG_WAIT = STATS_SHORT_WAIT + 1
+STATS_ABORT = STATS_LONG_WAIT + 1
+STATS_ERROR = STATS_ABORT + 1
+STATS_HIST = STATS_ERROR + 1
+STATS_HIST_BINS = 12
+STATS_COUNTERS = STATS_HIST - 1 + len(LPCHistType) * STATS_HIST_BINS
+
+STATS_COUNTER_WIDTH = 32
+
+
+class LPCStats(Elaboratable):
+    """
+    LPC front end statistics
+
+    Attributes
+    ----------
+    wb : WishboneInterface, system clock domain
+        Register interface.
+    state, cycletype, lframe, lreset, lad_out, lad_en : in, lclk domain
+        LPC front end to watch.
+    """
+    def __init__(self):
+        self.wb = WishboneInterface(data_width=32, addr_width=7, granularity=8)
+
+        self.state = Signal(LPCStates)
+        self.cycletype = Signal(LPCCycletype)
+        self.lframe = Signal()
+        self.lreset = Signal()
+        self.lad_out = Signal(4)
+        self.lad_en = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Events to count, one per lclk cycle at most
+        prevstate = Signal(LPCStates)
+        prevlframe = Signal()
+        prevlreset = Signal()
+        m.d.lclk += prevstate.eq(self.state)
+        m.d.lclk += prevlframe.eq(self.lframe)
+        m.d.lclk += prevlreset.eq(self.lreset)
+
+        insync = Signal()
+        m.d.comb += insync.eq(self.lad_en & ((self.state == LPCStates.RDSYNC) |
+                                             (self.state == LPCStates.WRSYNC)))
+        # Every successful cycle goes through TAR2
+        done = Signal()
+        m.d.comb += done.eq((self.state == LPCStates.TAR2) &
+                            (prevstate != LPCStates.TAR2))
+        # The next cycle can start in the last TAR2 cycle
+        abort = Signal()
+        m.d.comb += abort.eq(((~self.lframe & prevlframe) |
+                              (~self.lreset & prevlreset)) &
+                             (self.state != LPCStates.START) &
+                             (self.state != LPCStates.TAR2))
+
+        # LONG_WAITs in this transaction, saturates in the last bin
+        waits = Signal(STATS_HIST_BINS - 1)
+        with m.If((self.state == LPCStates.RDTAR1) |
+                  (self.state == LPCStates.WRTAR1)):
+            m.d.lclk += waits.eq(0)
+        with m.If(insync & (self.lad_out == LPCSyncType.LONG_WAIT) & ~waits.all()):
+            m.d.lclk += waits.eq(waits + 1)
+        # log2 bin, ie. the number of bits needed for waits
+        waitsbin = Signal(range(STATS_HIST_BINS))
+        m.d.comb += waitsbin.eq(0)
+        for i in range(len(waits)):
+            with m.If(waits[i]):
+                m.d.comb += waitsbin.eq(i + 1)
+        histtype = Signal(LPCHistType)
+        with m.Switch(self.cycletype):
+            with m.Case(LPCCycletype.IORD):
+                m.d.comb += histtype.eq(LPCHistType.IORD)
+            with m.Case(LPCCycletype.IOWR):
+                m.d.comb += histtype.eq(LPCHistType.IOWR)
+            with m.Case(LPCCycletype.FWRD, LPCCycletype.MEMRD):
+                m.d.comb += histtype.eq(LPCHistType.FWRD)
+            with m.Case(LPCCycletype.FWWR, LPCCycletype.MEMWR):
+                m.d.comb += histtype.eq(LPCHistType.FWWR)
+        syncdone = Signal()
+        m.d.comb += syncdone.eq(insync & ((self.lad_out == LPCSyncType.READY) |
+                                          (self.lad_out == LPCSyncType.ERROR)))
+
+        events = []
+        events += [self.state == s for s in LPCStates]
+        events += [done & (self.cycletype == t) for t in LPCCycletype]
+        events += [insync & (self.lad_out == LPCSyncType.SHORT_WAIT),
+                   insync & (self.lad_out == LPCSyncType.LONG_WAIT),
+                   abort,
+                   insync & (self.lad_out == LPCSyncType.ERROR)]
+        events += [syncdone & (histtype == t) & (waitsbin == b)
+                   for t in LPCHistType for b in range(STATS_HIST_BINS)]
+        assert len(events) == STATS_COUNTERS
+
+        # Snapshot requests come from the system clock domain
+        m.submodules.snap_sync = snap_sync = PulseSynchronizer(i_domain="sync",
+                                                               o_domain="lclk")
+        m.submodules.done_sync = done_sync = PulseSynchronizer(i_domain="lclk",
+                                                               o_domain="sync")
+        snapshot = Signal()
+        m.d.comb += snapshot.eq(snap_sync.o)
+        m.d.lclk += done_sync.i.eq(snapshot)
+
+        m.submodules.mux = mux = CSRMultiplexer(addr_width=7, data_width=32)
+        ctrl_csr = CSRElement(32, "rw")
+        mux.add(ctrl_csr)
+
+        for event in events:
+            count = Signal(STATS_COUNTER_WIDTH)
+            snap = Signal(STATS_COUNTER_WIDTH)
+            with m.If(snapshot):
+                m.d.lclk += snap.eq(count)
+                m.d.lclk += count.eq(event)
+            with m.Elif(event & ~count.all()):
+                m.d.lclk += count.eq(count + 1)
+
+            # snap only changes during a snapshot, when busy is set
+            csr = CSRElement(STATS_COUNTER_WIDTH, "r")
+            mux.add(csr)
+            m.d.comb += csr.r_data.eq(snap)
+
+        m.submodules.bridge = bridge = WishboneCSRBridge(mux.bus)
+        m.d.comb += self.wb.connect(bridge.wb_bus)
+
+        busy = Signal()
+        m.d.comb += ctrl_csr.r_data.eq(busy)
+        m.d.comb += snap_sync.i.eq(0)
+        with m.If(ctrl_csr.w_stb & ctrl_csr.w_data[0] & ~busy):
+            m.d.comb += snap_sync.i.eq(1)
+            m.d.sync += busy.eq(1)
+        with m.If(done_sync.o):
+            m.d.sync += busy.eq(0)
+
+        return m
+
+
+if __name__ == "__main__":
+    top = LPCStats()
+    with open("lpc_stats.v", "w") as f:
+        f.write(verilog.convert(top))
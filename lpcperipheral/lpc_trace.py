@@ -0,0 +1,216 @@
+# Trace buffer of LPC transactions, so we can see what the host did
+# when a boot is slow or hangs without putting a logic analyser on LAD.
+#
+# Each transaction is recorded when its SYNC finishes with a READY or
+# ERROR. Aborted cycles aren't recorded. Entries are kept in a ring
+# buffer in block RAM, written in the LPC clock domain and read from the
+# system clock domain. Each entry is 4 words:
+#
+#   0  timestamp, free running count of LPC clocks
+#   1  address
+#   2  data, the first word for 16 and 128 byte FW cycles
+#   3  bits 15:0  number of wait SYNCs
+#      bits 22:16 size in bytes - 1
+#      bits 26:24 LPCCycletype
+#      bit  31    SYNC ERROR
+#
+# Registers:
+#
+#   0  CTRL       bit 0 run, bit 1 wait for a trigger before recording
+#   1  STATUS     bit 0 triggered, bit 1 buffer has wrapped
+#   2  WRPTR      entry that will be written next
+#   3  TRIG_ADDR  trigger on a transaction to this address ...
+#   4  TRIG_MASK  ... comparing only these bits
+#
+# Setting run clears the buffer and starts recording, clearing it stops
+# recording. With trigger set, recording starts with the first
+# transaction that matches TRIG_ADDR. Set up the trigger before setting
+# run. STATUS and WRPTR are only stable once recording has stopped.
+#
+# The buffer is mapped after the registers, at depth * 16 bytes, so
+# depth is a power of 2 and at least 2.
+
+from nmigen import Elaboratable, Module, Signal, Memory, Cat, Const
+from nmigen.lib.cdc import FFSynchronizer
+from nmigen.utils import log2_int
+from nmigen_soc.wishbone import Decoder as WishboneDecoder
+from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen_soc.memory import MemoryMap
+from nmigen_soc.csr import Multiplexer as CSRMultiplexer
+from nmigen_soc.csr import Element as CSRElement
+from nmigen_soc.csr.wishbone import WishboneCSRBridge
+from nmigen.back import verilog
+
+from .lpcfront import (LPCStates, LPCCycletype, LPCSyncType, LPC_MEM_ADDR_WIDTH,
+                       LPC_FW_DATA_WIDTH, LPC_FW_MAX_BYTES, LPC_SYNC_TIMEOUT_WIDTH)
+
+TRACE_ENTRY_WORDS = 4
+TRACE_TIMESTAMP_WIDTH = 32
+
+
+def trace_wb_addr_width(depth):
+    # Registers and buffer each get half of the space
+    return log2_int(depth) + log2_int(TRACE_ENTRY_WORDS) + 1
+
+
+class LPCTrace(Elaboratable):
+    """
+    LPC transaction trace buffer
+
+    Parameters
+    ----------
+    depth : int
+        Number of entries, a power of 2 and at least 2, so the buffer
+        doesn't overlap the registers.
+
+    Attributes
+    ----------
+    wb : WishboneInterface, system clock domain
+        Registers and buffer.
+    state, cycletype, addr, size, data, synccount, lad_out, lad_en : in, lclk domain
+        LPC front end to watch.
+    """
+    def __init__(self, depth=256):
+        assert depth >= 2 and (depth & (depth - 1)) == 0
+        self.depth = depth
+
+        self.wb = WishboneInterface(data_width=32, addr_width=trace_wb_addr_width(depth),
+                                    granularity=8)
+
+        self.state = Signal(LPCStates)
+        self.cycletype = Signal(LPCCycletype)
+        self.addr = Signal(LPC_MEM_ADDR_WIDTH)
+        self.size = Signal(range(LPC_FW_MAX_BYTES))
+        self.data = Signal(LPC_FW_DATA_WIDTH)
+        self.synccount = Signal(LPC_SYNC_TIMEOUT_WIDTH)
+        self.lad_out = Signal(4)
+        self.lad_en = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Registers, system clock domain
+        ctrl_csr = CSRElement(32, "rw")
+        ctrl = Signal(2)
+        status_csr = CSRElement(32, "r")
+        wrptr_csr = CSRElement(32, "r")
+        trig_addr_csr = CSRElement(32, "rw")
+        trig_addr = Signal(LPC_MEM_ADDR_WIDTH)
+        trig_mask_csr = CSRElement(32, "rw")
+        trig_mask = Signal(LPC_MEM_ADDR_WIDTH)
+
+        m.submodules.mux = mux = CSRMultiplexer(addr_width=3, data_width=32)
+        mux.add(ctrl_csr)
+        mux.add(status_csr)
+        mux.add(wrptr_csr)
+        mux.add(trig_addr_csr)
+        mux.add(trig_mask_csr)
+        m.submodules.bridge = bridge = WishboneCSRBridge(mux.bus)
+
+        with m.If(ctrl_csr.w_stb):
+            m.d.sync += ctrl.eq(ctrl_csr.w_data)
+        with m.If(trig_addr_csr.w_stb):
+            m.d.sync += trig_addr.eq(trig_addr_csr.w_data)
+        with m.If(trig_mask_csr.w_stb):
+            m.d.sync += trig_mask.eq(trig_mask_csr.w_data)
+
+        # The buffer
+        mem = Memory(width=TRACE_ENTRY_WORDS * 32, depth=self.depth)
+        m.submodules.wrport = wrport = mem.write_port(domain="lclk")
+        m.submodules.rdport = rdport = mem.read_port(domain="sync", transparent=False)
+
+        buf_wb = WishboneInterface(data_width=32, addr_width=self.wb.addr_width - 1,
+                                   granularity=8)
+        m.d.comb += [
+            rdport.addr.eq(buf_wb.adr[log2_int(TRACE_ENTRY_WORDS):]),
+            buf_wb.dat_r.eq(rdport.data.word_select(buf_wb.adr[:log2_int(TRACE_ENTRY_WORDS)], 32)),
+        ]
+        # Ack cycle after cyc and stb are asserted, when the data is read
+        m.d.sync += buf_wb.ack.eq(buf_wb.cyc & buf_wb.stb & ~buf_wb.ack)
+
+        m.submodules.decode = decode = WishboneDecoder(addr_width=self.wb.addr_width,
+                                                       data_width=32, granularity=8)
+        csr_wb = WishboneInterface(data_width=32, addr_width=3, granularity=8)
+        m.d.comb += csr_wb.connect(bridge.wb_bus)
+        csr_wb.memory_map = MemoryMap(addr_width=5, data_width=8)
+        decode.add(csr_wb, addr=0)
+        buf_wb.memory_map = MemoryMap(addr_width=buf_wb.addr_width + 2, data_width=8)
+        decode.add(buf_wb, addr=self.depth * TRACE_ENTRY_WORDS * 4)
+        m.d.comb += self.wb.connect(decode.bus)
+
+        # Config registers are set before run, so can be synchronised bitwise
+        run = Signal()
+        trig_en = Signal()
+        lclk_trig_addr = Signal.like(trig_addr)
+        lclk_trig_mask = Signal.like(trig_mask)
+        m.submodules += FFSynchronizer(ctrl[0], run, o_domain="lclk")
+        m.submodules += FFSynchronizer(ctrl[1], trig_en, o_domain="lclk")
+        m.submodules += FFSynchronizer(trig_addr, lclk_trig_addr, o_domain="lclk")
+        m.submodules += FFSynchronizer(trig_mask, lclk_trig_mask, o_domain="lclk")
+
+        # Recording, LPC clock domain
+        timestamp = Signal(TRACE_TIMESTAMP_WIDTH)
+        m.d.lclk += timestamp.eq(timestamp + 1)
+
+        wrptr = Signal(range(self.depth))
+        wrapped = Signal()
+        triggered = Signal()
+        prevrun = Signal()
+        m.d.lclk += prevrun.eq(run)
+
+        syncdone = Signal()
+        m.d.comb += syncdone.eq(self.lad_en &
+                                ((self.state == LPCStates.RDSYNC) |
+                                 (self.state == LPCStates.WRSYNC)) &
+                                ((self.lad_out == LPCSyncType.READY) |
+                                 (self.lad_out == LPCSyncType.ERROR)))
+        match = Signal()
+        m.d.comb += match.eq((self.addr & lclk_trig_mask) ==
+                             (lclk_trig_addr & lclk_trig_mask))
+
+        # Everything but the data is latched at the end of the SYNC. Read
+        # data isn't in the front end until the cycle after, so write
+        # the entry then.
+        record = Signal()
+        entry = Signal(TRACE_ENTRY_WORDS * 32)
+        with m.If(syncdone & run & (~trig_en | triggered | match)):
+            m.d.lclk += record.eq(1)
+            m.d.lclk += triggered.eq(1)
+            m.d.lclk += entry.eq(Cat(timestamp, self.addr, Const(0, 32),
+                                     self.synccount, self.size, Const(0, 1),
+                                     self.cycletype, Const(0, 4),
+                                     self.lad_out == LPCSyncType.ERROR))
+        with m.Else():
+            m.d.lclk += record.eq(0)
+
+        m.d.comb += [
+            wrport.addr.eq(wrptr),
+            wrport.data.eq(entry),
+            wrport.data.word_select(2, 32).eq(self.data),
+            wrport.en.eq(record),
+        ]
+        with m.If(record):
+            m.d.lclk += wrptr.eq(wrptr + 1)
+            with m.If(wrptr == self.depth - 1):
+                m.d.lclk += wrapped.eq(1)
+
+        with m.If(run & ~prevrun):
+            m.d.lclk += wrptr.eq(0)
+            m.d.lclk += wrapped.eq(0)
+            m.d.lclk += triggered.eq(0)
+
+        m.d.comb += [
+            ctrl_csr.r_data.eq(ctrl),
+            status_csr.r_data.eq(Cat(triggered, wrapped)),
+            wrptr_csr.r_data.eq(wrptr),
+            trig_addr_csr.r_data.eq(trig_addr),
+            trig_mask_csr.r_data.eq(trig_mask),
+        ]
+
+        return m
+
+
+if __name__ == "__main__":
+    top = LPCTrace()
+    with open("lpc_trace.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -18,19 +18,64 @@
 # respond with READY and finish the LPC transaction. This happens on
 # both LPC reads and writes.
 #
-# DMA and MEM read/write cycles are not supported currently. LPC
-# interrupts (SERIRQ) is also not supported currently
+# FW reads of 16 and 128 bytes are sent to the back end as a single
+# command. The back end streams the data back one word at a time over
+# the read interface. We can't insert wait states once the data phase
+# has started, so the SYNC is held in a long wait until every word has
+# arrived. FW writes of 16 and 128 bytes are buffered here and sent to
+# the back end as one command entry per word, which the back end acks
+# once after the last word.
+#
+# MEM read/write cycles are single byte with a 32 bit address. They are
+# passed to the back end like FW cycles so they can share the same path.
+#
+# Optionally writes can be posted. In this case the SYNC responds with
+# READY as soon as the back end has taken all of the write, rather
+# than waiting for the ack. The back end has to report any errors some
+# other way. Since a posted write can still be in the back end when
+# the next cycle starts, we only reset the fifos when a cycle that has
+# sent a command is aborted, and we don't send a new command until the
+# back end is idle, so that reset can't throw away an earlier write.
+# The exception is single word writes. Once one is in the fifo it's
+# done as far as we are concerned, so it never needs a reset and can be
+# queued behind other posted writes, as many as the fifo will hold.
+#
+# If the back end never responds (eg. the DMA wishbone has locked up)
+# the host would sit in a LONG_WAIT SYNC until it times out itself. To
+# avoid this, sync_timeout can be set to a number of lclk cycles after
+# which we give up with a SYNC ERROR and reset the fifos. The first
+# short_waits SYNC cycles can be sent as SHORT_WAIT rather than
+# LONG_WAIT, for back ends that are expected to respond quickly.
+#
+# Hosts poll some status registers (eg. UART LSR) in tight loops. Reads
+# of the IO addresses in shadow_addrs are answered straight away from
+# shadow_data rather than going to the back end. The back end needs to
+# keep shadow_data up to date. We only do this when the back end is
+# idle, so a read can't overtake a posted write that changes it.
+#
+# When a cycle is aborted (lframe or lreset) or times out, the back end
+# may still be working on its command and can send a response after the
+# fifos have been reset. Each command carries a tag that is bumped on
+# every fifo reset. The back end returns the tag with the response, and
+# responses with an old tag are thrown away as soon as they turn up, so
+# they can't be taken as the answer to the next cycle.
+#
+# The current state, cycle type, address, size, data and SYNC count are
+# exported so they can be watched for statistics and tracing.
+#
+# DMA read/write cycles are not supported currently. LPC interrupts
+# (SERIRQ) are handled separately in serirq.py
 #
 
 from enum import Enum, unique
-from nmigen import Signal, Elaboratable, Module, unsigned, Cat
+from nmigen import Signal, Elaboratable, Module, Cat, Array
 from nmigen.back import verilog
 import math
 
 @unique
 class LPCStates(Enum):
     START       = 0
-    CYCLETYPE   = 1 # IO
+    CYCLETYPE   = 1 # IO and MEM
     IOADDR      = 2
     FWIDSEL     = 3 # FW
     FWADDR      = 4
@@ -49,6 +94,8 @@ class LPCCycletype(Enum):
     IOWR          = 1
     FWRD          = 2
     FWWR          = 3
+    MEMRD         = 4
+    MEMWR         = 5
 
 class LPCStartType():
     MEMIODMA      = 0b0000
@@ -65,38 +112,96 @@ LPC_IO_DATA_WIDTH = 8
 LPC_IO_ADDR_WIDTH = 16
 LPC_FW_DATA_WIDTH = 32
 LPC_FW_ADDR_WIDTH = 28
+LPC_MEM_ADDR_WIDTH = 32
+# Largest FW cycle we support is MSIZE 0b0111 (128 bytes)
+LPC_FW_MAX_BYTES = 128
+LPC_FW_MAX_DATA_WIDTH = LPC_FW_MAX_BYTES * 8
+LPC_SYNC_TIMEOUT_WIDTH = 16
+# The host only allows 8 SHORT_WAIT SYNC cycles
+LPC_SHORT_WAIT_MAX = 8
+# Enough to tell the current cycle from any that were recently aborted
+LPC_TAG_WIDTH = 2
 
 class LPCWRCMDInterface():
     def __init__(self, *, addr_width, data_width):
         self.addr = Signal(addr_width)
         self.data = Signal(data_width)
         self.cmd = Signal(LPCCycletype)
-        self.size = Signal(2) # upto 4 bytes
+        self.size = Signal(range(LPC_FW_MAX_BYTES)) # bytes - 1, upto 128 bytes
+        self.tag = Signal(LPC_TAG_WIDTH)  # returned with the response
         self.rdy = Signal()
         self.en = Signal()
         self.rst = Signal()
+        self.idle = Signal()  # back end has no commands outstanding
 
     # width of fifo needed to transport this
     def width(self):
-        return self.addr.width + self.data.width + self.cmd.width + self.size.width
+        return (self.addr.width + self.data.width + self.cmd.width + self.size.width +
+                self.tag.width)
 
+# Reads of more than 4 bytes are streamed back one data_width word at
+# a time, lowest address first. The front end pops one entry per word.
 class LPCRDCMDInterface():
     def __init__(self, *, data_width):
         self.data = Signal(data_width)
         self.error = Signal()
+        self.tag = Signal(LPC_TAG_WIDTH)  # from the command
         self.rdy = Signal()  # data is ready
         self.en = Signal()  # data has been read
         self.rst = Signal()
 
     # width of fifo needed to transport this
     def width(self):
-        return self.data.width + self.error.width
+        return self.data.width + self.error.width + self.tag.width
 
 class lpcfront(Elaboratable):
     """
     LPC slave
+
+    Parameters
+    ----------
+    early_dispatch : bool
+        Send read commands to the back end in the last address (or
+        MSIZE) cycle rather than in the first TAR cycle, so the back end
+        gets a head start on the SYNC.
+    posted_writes : bool
+        Respond to writes with a SYNC READY once the back end has taken
+        the write, rather than waiting for the back end to ack it.
+    short_waits : int
+        Number of SHORT_WAIT SYNC cycles to send before switching to
+        LONG_WAIT, upto LPC_SHORT_WAIT_MAX.
+    shadow_addrs : tuple of int
+        IO addresses to answer reads of from shadow_data.
+
+    Attributes
+    ----------
+    sync_timeout : Signal(LPC_SYNC_TIMEOUT_WIDTH), in
+        SYNC cycles to wait for the back end before responding with an
+        ERROR. 0 waits forever.
+    timeout : Signal(), out
+        Pulsed when a SYNC times out.
+    shadow_data : list of Signal(LPC_IO_DATA_WIDTH), in
+        Value to return for reads of each of shadow_addrs.
+    state : Signal(LPCStates), out
+        Current state.
+    cycletype : Signal(LPCCycletype), out
+        Type of the current cycle.
+    addr, size : out
+        Address and size (bytes - 1) of the current cycle.
+    data : Signal(LPC_FW_DATA_WIDTH), out
+        First word of data of the current cycle. Read data is valid
+        from the cycle after the SYNC READY.
+    synccount : Signal(LPC_SYNC_TIMEOUT_WIDTH), out
+        SYNC cycles so far in the current cycle, saturates.
     """
-    def __init__(self):
+    def __init__(self, early_dispatch=False, posted_writes=False, short_waits=0,
+                 shadow_addrs=()):
+        assert short_waits <= LPC_SHORT_WAIT_MAX
+        self.early_dispatch = early_dispatch
+        self.posted_writes = posted_writes
+        self.short_waits = short_waits
+        self.shadow_addrs = shadow_addrs
+
         # Ports
         self.lframe = Signal()
         self.lad_in = Signal(4)
@@ -107,32 +212,110 @@ class lpcfront(Elaboratable):
         # synthetic tristate signals
         self.lad_tri = Signal(4)
 
-        self.wrcmd = LPCWRCMDInterface(addr_width=LPC_FW_ADDR_WIDTH,
+        self.wrcmd = LPCWRCMDInterface(addr_width=LPC_MEM_ADDR_WIDTH,
                                        data_width=LPC_FW_DATA_WIDTH)
         self.rdcmd = LPCRDCMDInterface(data_width=LPC_FW_DATA_WIDTH)
 
+        self.sync_timeout = Signal(LPC_SYNC_TIMEOUT_WIDTH)
+        self.timeout = Signal()
+
+        self.shadow_data = [Signal(LPC_IO_DATA_WIDTH, name="shadow_data%d" % i)
+                            for i in range(len(shadow_addrs))]
+
+        self.state = Signal(LPCStates)
+        self.cycletype = Signal(LPCCycletype)
+        self.addr = Signal(LPC_MEM_ADDR_WIDTH)
+        self.size = Signal(range(LPC_FW_MAX_BYTES))
+        self.data = Signal(LPC_FW_DATA_WIDTH)
+        self.synccount = Signal(LPC_SYNC_TIMEOUT_WIDTH)
+
     def elaborate(self, platform):
         m = Module()
 
         state = Signal(LPCStates)
         statenext = Signal(LPCStates)
         cycletype = Signal(LPCCycletype)
-        # FW data is 32 bites with 4 bits per cycle = 8 cycles
-        cyclecount = Signal(math.ceil(math.log2(LPC_FW_DATA_WIDTH/4)))
-        addr = Signal(LPC_FW_ADDR_WIDTH)
-        data = Signal(LPC_FW_DATA_WIDTH)
-        size = Signal(unsigned(2)) # 1, 2 or 4 bytes
+        # FW data is upto 128 bytes with 4 bits per cycle = 256 cycles
+        cyclecount = Signal(math.ceil(math.log2(LPC_FW_MAX_DATA_WIDTH/4)))
+        addr = Signal(LPC_MEM_ADDR_WIDTH)
+        data = Signal(LPC_FW_MAX_DATA_WIDTH)
+        size = Signal(range(LPC_FW_MAX_BYTES)) # 1, 2, 4, 16 or 128 bytes
+        sizenext = Signal.like(size)
+        sizevalid = Signal()
+        # Number of 32 bit words moved across the back end interface so
+        # far. Only multi word (16 and 128 byte) FW cycles use more than one.
+        wordcount = Signal(range(LPC_FW_MAX_BYTES // 4 + 1))
+        lastword = Signal(range(LPC_FW_MAX_BYTES // 4))
 
         lframesync = Signal()
+        # Bumped on every fifo reset, responses with an old tag are stale
+        tag = Signal(LPC_TAG_WIDTH)
+        rdvalid = Signal()
+        # A command for this cycle has gone to the back end
+        pushed = Signal()
+        canpush = Signal()
+        # Posted write that goes to the back end in one go
+        queueable = Signal()
+        wrdone = Signal()
+        # Number of SYNC cycles so far, saturates
+        synccount = Signal(LPC_SYNC_TIMEOUT_WIDTH)
+        syncwait = Signal(4)
+        synctimeout = Signal()
+        # This read is for one of the shadow_addrs
+        shadowmatch = Signal()
+        shadowhit = Signal()
+        shadowmatchsel = Signal(range(max(len(self.shadow_addrs), 1)))
+        shadowsel = Signal.like(shadowmatchsel)
+        shadowrdy = Signal()
 
         # fifo interface
         m.d.comb += self.wrcmd.addr.eq(addr)
-        m.d.comb += self.wrcmd.data.eq(data)
+        m.d.comb += self.wrcmd.data.eq(data.word_select(wordcount, LPC_FW_DATA_WIDTH))
         m.d.comb += self.wrcmd.size.eq(size)
+        m.d.comb += self.wrcmd.cmd.eq(cycletype)
+        m.d.comb += self.wrcmd.tag.eq(tag)
+        m.d.comb += lastword.eq(size >> 2)
         m.d.comb += self.wrcmd.en.eq(0)  # default, also set below
-        m.d.comb += self.rdcmd.en.eq(0)  # default, also set below
+        # Drop stale responses whatever state we are in
+        m.d.comb += rdvalid.eq(self.rdcmd.rdy & (self.rdcmd.tag == tag))
+        m.d.comb += self.rdcmd.en.eq(self.rdcmd.rdy & ~rdvalid)  # also set below
+        if self.posted_writes:
+            m.d.comb += queueable.eq(((cycletype == LPCCycletype.IOWR) |
+                                      (cycletype == LPCCycletype.MEMWR) |
+                                      (cycletype == LPCCycletype.FWWR)) &
+                                     (lastword == 0))
+            # Don't send a new command while a posted write is still
+            # in the back end, see fifo reset below
+            m.d.comb += canpush.eq(pushed | self.wrcmd.idle | queueable)
+        else:
+            m.d.comb += canpush.eq(1)
+        # SHORT_WAIT for the first few SYNC cycles then LONG_WAIT
+        m.d.comb += syncwait.eq(LPCSyncType.LONG_WAIT)
+        if self.short_waits:
+            with m.If(synccount < self.short_waits):
+                m.d.comb += syncwait.eq(LPCSyncType.SHORT_WAIT)
+        m.d.comb += synctimeout.eq((self.sync_timeout != 0) &
+                                   (synccount >= self.sync_timeout))
+        m.d.comb += self.timeout.eq(0)  # set below
+        # Check the IO address as the last nibble comes in
+        for i, shadow_addr in enumerate(self.shadow_addrs):
+            with m.If(Cat(self.lad_in, addr[:12]) == shadow_addr):
+                m.d.comb += shadowmatch.eq(cycletype == LPCCycletype.IORD)
+                m.d.comb += shadowmatchsel.eq(i)
+        if self.shadow_addrs:
+            m.d.comb += shadowrdy.eq(shadowhit & self.wrcmd.idle)
+        # All the words of a write have been taken by the back end
+        m.d.comb += wrdone.eq((wordcount > lastword) |
+                              ((wordcount == lastword) &
+                               self.wrcmd.en & self.wrcmd.rdy))
 
         m.d.sync += state.eq(statenext)  # state machine
+        m.d.comb += self.state.eq(state)
+        m.d.comb += self.cycletype.eq(cycletype)
+        m.d.comb += self.addr.eq(addr)
+        m.d.comb += self.size.eq(size)
+        m.d.comb += self.data.eq(data[:LPC_FW_DATA_WIDTH])
+        m.d.comb += self.synccount.eq(synccount)
         m.d.comb += self.lad_en.eq(0)  # set below also
         # run the states
         m.d.comb += statenext.eq(state)  # stay where we are by default
@@ -143,31 +326,46 @@ class lpcfront(Elaboratable):
 
             with m.Case(LPCStates.CYCLETYPE):
                 m.d.comb += statenext.eq(LPCStates.IOADDR)
-                m.d.sync += cyclecount.eq(3)
+                m.d.sync += cyclecount.eq(3) # 4 cycle IO addr
+                m.d.sync += shadowhit.eq(0)
+                m.d.sync += wordcount.eq(0)
+                m.d.sync += addr.eq(0)
 
                 with m.Switch(self.lad_in):
                     with m.Case("000-"):
                         m.d.sync += cycletype.eq(LPCCycletype.IORD)
                     with m.Case("001-"):
                         m.d.sync += cycletype.eq(LPCCycletype.IOWR)
+                    with m.Case("010-"):
+                        m.d.sync += cycletype.eq(LPCCycletype.MEMRD)
+                        m.d.sync += cyclecount.eq(7) # 8 cycle MEM addr
+                    with m.Case("011-"):
+                        m.d.sync += cycletype.eq(LPCCycletype.MEMWR)
+                        m.d.sync += cyclecount.eq(7) # 8 cycle MEM addr
                     with m.Default():
                         m.d.comb += statenext.eq(LPCStates.START) # Bail
 
             with m.Case(LPCStates.IOADDR):
                 m.d.sync += cyclecount.eq(cyclecount - 1)
-                m.d.sync += addr.eq(Cat(self.lad_in, addr[:24]))
-                # Make sure the read fifo is cleared out of any
-                # entries before adding another. This could happen on
-                # an LPC transaction abort (ie. when lframe/lreset is
-                # asserted during a transaction).
-                m.d.comb += self.rdcmd.en.eq(1)
+                m.d.sync += addr.eq(Cat(self.lad_in, addr[:28]))
 
                 with m.If(cyclecount == 0):
-                    m.d.sync += size.eq(0) # IO cycles are 1 byte
+                    m.d.sync += size.eq(0) # IO and MEM cycles are 1 byte
                     m.d.sync += cyclecount.eq(1)  # TAR 2 cycles
-                    with m.If(cycletype == LPCCycletype.IORD):
+                    m.d.sync += shadowhit.eq(shadowmatch)
+                    m.d.sync += shadowsel.eq(shadowmatchsel)
+                    with m.If((cycletype == LPCCycletype.IORD) |
+                              (cycletype == LPCCycletype.MEMRD)):
                         m.d.comb += statenext.eq(LPCStates.RDTAR1)
-                    with m.Elif(cycletype == LPCCycletype.IOWR):
+                        if self.early_dispatch:
+                            # The last address nibble is on LAD now, so
+                            # get the back end going rather than waiting
+                            # for the TAR
+                            m.d.comb += self.wrcmd.addr.eq(Cat(self.lad_in, addr[:28]))
+                            m.d.comb += self.wrcmd.size.eq(0)
+                            m.d.comb += self.wrcmd.en.eq(canpush & ~shadowmatch)
+                    with m.Elif((cycletype == LPCCycletype.IOWR) |
+                                (cycletype == LPCCycletype.MEMWR)):
                         m.d.comb += statenext.eq(LPCStates.WRDATA)
                     with m.Else():
                         m.d.comb += statenext.eq(LPCStates.START) # Bail
@@ -175,38 +373,47 @@ class lpcfront(Elaboratable):
             with m.Case(LPCStates.FWIDSEL):
                 # Respond to any IDSEL
                 m.d.comb += statenext.eq(LPCStates.FWADDR)
+                m.d.sync += shadowhit.eq(0)
                 m.d.sync += cyclecount.eq(6) # 7 cycle FW addr
+                m.d.sync += wordcount.eq(0)
+                m.d.sync += addr.eq(0)
 
             with m.Case(LPCStates.FWADDR):
                 m.d.comb += statenext.eq(LPCStates.FWADDR)
-                m.d.sync += addr.eq(Cat(self.lad_in, addr[:24]))
-                # Make sure the read fifo is cleared out of any
-                # entries before adding another. This could happen on
-                # an LPC transaction abort (ie. when lframe/lreset is
-                # asserted during a transaction).
-                m.d.comb += self.rdcmd.en.eq(1)
+                m.d.sync += addr.eq(Cat(self.lad_in, addr[:28]))
 
                 m.d.sync += cyclecount.eq(cyclecount - 1)
                 with m.If(cyclecount == 0):
                     m.d.comb += statenext.eq(LPCStates.FWMSIZE)
 
             with m.Case(LPCStates.FWMSIZE):
+                m.d.comb += sizevalid.eq(1)
                 with m.Switch(self.lad_in):
                     with m.Case(0b0000): # 1 byte
-                        m.d.sync += size.eq(0)
-                        m.d.sync += cyclecount.eq(1) # 1 byte = 2 nibbles
+                        m.d.comb += sizenext.eq(0)
                     with m.Case(0b0001): # 2 bytes
-                        m.d.sync += size.eq(1)
-                        m.d.sync += cyclecount.eq(3) # 2 byte = 2 nibbles
+                        m.d.comb += sizenext.eq(1)
                     with m.Case(0b0010): # 4 bytes
-                        m.d.sync += size.eq(3)
-                        m.d.sync += cyclecount.eq(7) # 4 byte = 8 nibbles
+                        m.d.comb += sizenext.eq(3)
+                    with m.Case(0b0100): # 16 bytes
+                        m.d.comb += sizenext.eq(15)
+                    with m.Case(0b0111): # 128 bytes
+                        m.d.comb += sizenext.eq(127)
                     with m.Default():
-                        m.d.comb += statenext.eq(LPCStates.START) # Bail
+                        m.d.comb += sizevalid.eq(0)
+                m.d.sync += size.eq(sizenext)
+                m.d.sync += cyclecount.eq((sizenext << 1) | 1) # 2 nibbles per byte
 
-                with m.If(cycletype == LPCCycletype.FWRD):
+                with m.If(~sizevalid):
+                    m.d.comb += statenext.eq(LPCStates.START) # Bail
+                with m.Elif(cycletype == LPCCycletype.FWRD):
                     m.d.sync += cyclecount.eq(1)  # TAR 2 cycles
                     m.d.comb += statenext.eq(LPCStates.RDTAR1)
+                    if self.early_dispatch:
+                        # Address and size are known now, so get the back
+                        # end going rather than waiting for the TAR
+                        m.d.comb += self.wrcmd.size.eq(sizenext)
+                        m.d.comb += self.wrcmd.en.eq(canpush)
                 with m.Elif(cycletype == LPCCycletype.FWWR):
                     m.d.comb += statenext.eq(LPCStates.WRDATA)
                 with m.Else():
@@ -214,22 +421,36 @@ class lpcfront(Elaboratable):
 
             # LPC FW and IO reads
             with m.Case(LPCStates.RDTAR1):
-                # send off the command to the fifo in the first cycle
-                m.d.comb += self.wrcmd.en.eq(cyclecount == 1)
-                with m.If(cycletype == LPCCycletype.IORD):
-                    m.d.comb += self.wrcmd.cmd.eq(LPCCycletype.IORD)
-                with m.Else():
-                    m.d.comb += self.wrcmd.cmd.eq(LPCCycletype.FWRD)
+                # send off the command to the fifo in the first cycle,
+                # unless it's already gone in early dispatch mode
+                if not self.early_dispatch:
+                    m.d.comb += self.wrcmd.en.eq((cyclecount == 1) & canpush & ~shadowhit)
+                m.d.sync += synccount.eq(0)
 
                 m.d.sync += cyclecount.eq(cyclecount - 1)
                 with m.If(cyclecount == 0):
                     m.d.comb += statenext.eq(LPCStates.RDSYNC)
 
             with m.Case(LPCStates.RDSYNC):
-                m.d.comb += self.lad_out.eq(LPCSyncType.LONG_WAIT)
+                m.d.comb += self.lad_out.eq(syncwait)
                 m.d.comb += self.lad_en.eq(1)
+                with m.If(~synccount.all()):
+                    m.d.sync += synccount.eq(synccount + 1)
+
+                if self.posted_writes:
+                    # send the command now if it was held back behind a
+                    # posted write
+                    m.d.comb += self.wrcmd.en.eq(~pushed & self.wrcmd.idle & ~shadowhit)
 
-                with m.If(self.rdcmd.rdy):
+                with m.If(shadowrdy):
+                    # Answer from the shadow copy, the back end never
+                    # sees this read
+                    m.d.comb += statenext.eq(LPCStates.RDDATA)
+                    m.d.comb += self.lad_out.eq(LPCSyncType.READY)
+                    m.d.sync += cyclecount.eq(1) # 1 byte = 2 nibbles
+                    if self.shadow_addrs:
+                        m.d.sync += data.eq(Cat(Array(self.shadow_data)[shadowsel], 0))
+                with m.Elif(rdvalid):
                     m.d.comb += self.rdcmd.en.eq(1)
                     m.d.comb += statenext.eq(LPCStates.RDDATA)
                     m.d.comb += self.lad_out.eq(LPCSyncType.READY)  # Ready
@@ -244,17 +465,31 @@ class lpcfront(Elaboratable):
                         with m.Case(3): # 4 bytes
                             m.d.sync += cyclecount.eq(7) # 4 byte = 8 nibbles
                             m.d.sync += data.eq(self.rdcmd.data)  # grab the data
+                        with m.Case(15, 127): # 16 or 128 bytes
+                            # Collect one word at a time, we can't
+                            # stall once the data starts so hold the
+                            # SYNC until we have all of it.
+                            m.d.sync += data.word_select(wordcount, LPC_FW_DATA_WIDTH).eq(self.rdcmd.data)
+                            m.d.sync += wordcount.eq(wordcount + 1)
+                            m.d.sync += cyclecount.eq((size << 1) | 1) # 2 nibbles per byte
+                            with m.If(wordcount != lastword):
+                                m.d.comb += statenext.eq(LPCStates.RDSYNC)
+                                m.d.comb += self.lad_out.eq(syncwait)
                         with m.Default():
                             m.d.comb += statenext.eq(LPCStates.START) # Bail
                     # we shouldn't get FW errors, but here for completeness
                     with m.If(self.rdcmd.error):
                         m.d.comb += statenext.eq(LPCStates.START)
                         m.d.comb += self.lad_out.eq(LPCSyncType.ERROR)
+                with m.Elif(synctimeout):
+                    m.d.comb += self.timeout.eq(1)
+                    m.d.comb += statenext.eq(LPCStates.START)
+                    m.d.comb += self.lad_out.eq(LPCSyncType.ERROR)
 
 
             with m.Case(LPCStates.RDDATA):
                 m.d.comb += self.lad_en.eq(1)
-                m.d.sync += data.eq(Cat(data[4:], data[:28]))
+                m.d.sync += data.eq(Cat(data[4:], data[:4]))
                 m.d.comb += self.lad_out.eq(data[:4])
 
                 m.d.sync += cyclecount.eq(cyclecount - 1)
@@ -271,6 +506,10 @@ class lpcfront(Elaboratable):
                         m.d.sync += data.eq(Cat(data[4:16],self.lad_in))
                     with m.Case(3): # 4 bytes
                         m.d.sync += data.eq(Cat(data[4:32],self.lad_in))
+                    with m.Case(15): # 16 bytes
+                        m.d.sync += data.eq(Cat(data[4:128],self.lad_in))
+                    with m.Case(127): # 128 bytes
+                        m.d.sync += data.eq(Cat(data[4:1024],self.lad_in))
                     with m.Default():
                         m.d.comb += statenext.eq(LPCStates.START) # Bail
 
@@ -281,27 +520,50 @@ class lpcfront(Elaboratable):
 
             with m.Case(LPCStates.WRTAR1):
                 # send off the command to the fifo in the first cycle
-                m.d.comb += self.wrcmd.en.eq(cyclecount == 1)
-                with m.If(cycletype == LPCCycletype.IOWR):
-                    m.d.comb += self.wrcmd.cmd.eq(LPCCycletype.IOWR)
-                with m.Else():
-                    m.d.comb += self.wrcmd.cmd.eq(LPCCycletype.FWWR)
+                m.d.comb += self.wrcmd.en.eq((wordcount <= lastword) & canpush)
+                with m.If(self.wrcmd.en & self.wrcmd.rdy):
+                    m.d.sync += wordcount.eq(wordcount + 1)
+                m.d.sync += synccount.eq(0)
 
                 m.d.sync += cyclecount.eq(cyclecount - 1)
                 with m.If(cyclecount == 0):
                     m.d.comb += statenext.eq(LPCStates.WRSYNC)
 
             with m.Case(LPCStates.WRSYNC):
-                m.d.comb += self.lad_out.eq(LPCSyncType.LONG_WAIT)
+                m.d.comb += self.lad_out.eq(syncwait)
                 m.d.comb += self.lad_en.eq(1)
-
-                with m.If(self.rdcmd.rdy):  # wait for ack
-                    m.d.comb += self.rdcmd.en.eq(1)
-                    m.d.comb += statenext.eq(LPCStates.TAR2)
-                    m.d.comb += self.lad_out.eq(LPCSyncType.READY)
-                    m.d.sync += cyclecount.eq(1)  # 2 cycle tar
-                    # we shouldn't get FW errors, but here for completeness
-                    with m.If(self.rdcmd.error):
+                with m.If(~synccount.all()):
+                    m.d.sync += synccount.eq(synccount + 1)
+
+                # Multi word FW writes are forwarded a word at a time,
+                # keep going until the fifo has taken all of them
+                m.d.comb += self.wrcmd.en.eq((wordcount <= lastword) & canpush)
+                with m.If(self.wrcmd.en & self.wrcmd.rdy):
+                    m.d.sync += wordcount.eq(wordcount + 1)
+
+                if self.posted_writes:
+                    # Done once the back end has all of the write. It
+                    # doesn't send an ack back for posted writes.
+                    with m.If(wrdone):
+                        m.d.comb += statenext.eq(LPCStates.TAR2)
+                        m.d.comb += self.lad_out.eq(LPCSyncType.READY)
+                        m.d.sync += cyclecount.eq(1)  # 2 cycle tar
+                    with m.Elif(synctimeout):
+                        m.d.comb += self.timeout.eq(1)
+                        m.d.comb += statenext.eq(LPCStates.START)
+                        m.d.comb += self.lad_out.eq(LPCSyncType.ERROR)
+                else:
+                    with m.If(rdvalid):  # wait for ack
+                        m.d.comb += self.rdcmd.en.eq(1)
+                        m.d.comb += statenext.eq(LPCStates.TAR2)
+                        m.d.comb += self.lad_out.eq(LPCSyncType.READY)
+                        m.d.sync += cyclecount.eq(1)  # 2 cycle tar
+                        # we shouldn't get FW errors, but here for completeness
+                        with m.If(self.rdcmd.error):
+                            m.d.comb += statenext.eq(LPCStates.START)
+                            m.d.comb += self.lad_out.eq(LPCSyncType.ERROR)
+                    with m.Elif(synctimeout):
+                        m.d.comb += self.timeout.eq(1)
                         m.d.comb += statenext.eq(LPCStates.START)
                         m.d.comb += self.lad_out.eq(LPCSyncType.ERROR)
 
@@ -325,6 +587,7 @@ class lpcfront(Elaboratable):
         with m.If(self.lframe == 0):
             m.d.comb += self.wrcmd.rst.eq(1)
             m.d.comb += self.rdcmd.rst.eq(1)
+            m.d.comb += self.wrcmd.en.eq(0) # this cycle has been aborted
             m.d.comb += self.lad_en.eq(0) # override us driving
             with m.Switch(self.lad_in):
                 with m.Case(LPCStartType.MEMIODMA):
@@ -338,11 +601,32 @@ class lpcfront(Elaboratable):
                 with m.Default():
                     m.d.comb += statenext.eq(LPCStates.START) # Bail
 
+        # Track if this cycle has sent anything to the back end. It's
+        # finished with the fifos once it gets to TAR2.
+        with m.If(self.wrcmd.en & self.wrcmd.rdy & ~queueable):
+            m.d.sync += pushed.eq(1)
+        with m.If((state == LPCStates.TAR2) | (state == LPCStates.START) |
+                  (self.lframe == 0)):
+            m.d.sync += pushed.eq(0)
+
         # fifo reset needs to be held for two cycles
-        m.d.sync += lframesync.eq(self.lframe)
+        fiforst = Signal()
+        abort = Signal()
+        m.d.comb += abort.eq((self.lframe == 0) | (self.lreset == 0))
+        if self.posted_writes:
+            # Only reset if we abort a cycle that has sent a command,
+            # otherwise we could throw away a posted write
+            m.d.comb += fiforst.eq((abort & pushed) | self.timeout)
+        else:
+            m.d.comb += fiforst.eq(abort | self.timeout)
+        m.d.sync += lframesync.eq(~fiforst)
+        # Anything the back end sends back from now on is for a command
+        # we have given up on
+        with m.If(fiforst & lframesync):
+            m.d.sync += tag.eq(tag + 1)
         m.d.comb += self.wrcmd.rst.eq(0)
         m.d.comb += self.rdcmd.rst.eq(0)
-        with m.If((self.lframe == 0) | (lframesync == 0)):
+        with m.If(fiforst | (lframesync == 0)):
             m.d.comb += self.wrcmd.rst.eq(1)
             m.d.comb += self.rdcmd.rst.eq(1)
 
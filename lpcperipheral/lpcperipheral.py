@@ -1,11 +1,14 @@
 from enum import Enum, unique
 
-from nmigen import Signal, Elaboratable, Module, Cat
+from nmigen import Signal, Elaboratable, Module, Cat, DomainRenamer
 from nmigen.back import verilog
 
 from .io_space import IOSpace
 from .lpc2wb import lpc2wb
 from .lpc_ctrl import LPC_Ctrl
+from .lpc_stats import LPCStats
+from .lpc_trace import LPCTrace
+from .serirq import SerIRQ
 
 
 @unique
@@ -18,11 +21,104 @@ class LPCPeripheral(Elaboratable):
     """
     Parameters
     ----------
+    early_dispatch : bool
+        Send LPC read commands to the back end as soon as the address
+        is known, see :class:`lpcfront`.
+    posted_writes : bool
+        Finish LPC writes without waiting for the wishbone ack. Errors
+        are reported in the LPC CTRL status register instead.
+    short_waits : int
+        Number of SHORT_WAIT SYNCs to send before LONG_WAIT.
+    shadow_status : bool
+        Answer host reads of the UART LSR and IPMI BT_CTRL registers
+        from a copy in the LPC clock domain.
+    stats : bool
+        Count where LPC time goes, readable at 0x3000 on the BMC
+        wishbone. See :class:`LPCStats`.
+    trace_depth : int
+        Entries in the LPC transaction trace buffer, readable at 0x8000
+        on the BMC wishbone. 0 for no trace buffer, otherwise a power of
+        2 and at least 2. See :class:`LPCTrace`.
+    fifo_depth : int
+        Depth of the fifos between the LPC and system clock domains, a
+        power of 2. Deeper fifos let more posted writes queue up and
+        help multi word FW cycles to a slow DMA wishbone.
+    single_clock : bool
+        The system clock is LCLK, or phase locked to it. Skips the
+        clock domain crossing, the lclk pin is not used.
+    registered_wb : bool
+        Put register stages on the wishbone outputs of the LPC side and
+        before the DMA address translation, to help the system clock
+        Fmax at the cost of a few cycles of latency.
+    pipelined : bool
+        Pipelined BMC and DMA wishbones, with stall. The BMC can run
+        back to back accesses to the VUART and IPMI BT, and multi word
+        FW reads are sent to the DMA wishbone back to back.
+    burst : bool
+        Add CTI and BTE to the DMA wishbone. Multi word FW cycles go out
+        as incrementing bursts.
+    write_combine : int
+        Merge partial FW writes to the same word into one DMA write,
+        holding them for at most this many cycles. 0 for no write
+        combining. See :class:`WishboneWriteCombiner`.
+    cache_lines : int
+        Lines in the FW read cache, a power of 2. 0 for no cache. See
+        :class:`WishboneReadCache`.
+    cache_line_words : int
+        Words in a cache line, a power of 2.
+    cache_ways : int
+        Associativity of the cache.
+    prefetch : int
+        Words in the FW read prefetch buffer. 0 for no prefetching. See
+        :class:`WishbonePrefetcher`.
+    shadow_words : int
+        Words in the shadow copy of the start of the boot image, loaded
+        by the BMC and used for FW reads. 0 for no shadow. See
+        :class:`WishboneShadow`.
+    shadow_base : int
+        LPC FW address the shadow copy starts at.
+    windows : int
+        Entries in the LPC CTRL window table, up to 8, so the host can
+        have several FW windows (eg. HIOMAP read and write windows)
+        mapped at once.
+    pages : int
+        Entries in the LPC CTRL page table, which can translate FW
+        accesses a page at a time so the image can be scattered around
+        BMC memory. 0 for no page table. See :class:`WishbonePageTable`.
+    page_size : int
+        Bytes in a page, a power of 2.
 
     Attributes
     ----------
     """
-    def __init__(self):
+    def __init__(self, early_dispatch=False, posted_writes=False, short_waits=0,
+                 shadow_status=False, stats=False, trace_depth=0, fifo_depth=2,
+                 single_clock=False, registered_wb=False, pipelined=False, burst=False,
+                 write_combine=0, cache_lines=0, cache_line_words=4, cache_ways=1,
+                 prefetch=0, shadow_words=0, shadow_base=0, windows=0,
+                 pages=0, page_size=4096):
+        self.early_dispatch = early_dispatch
+        self.posted_writes = posted_writes
+        self.short_waits = short_waits
+        self.shadow_status = shadow_status
+        self.stats = stats
+        self.trace_depth = trace_depth
+        self.fifo_depth = fifo_depth
+        self.single_clock = single_clock
+        self.registered_wb = registered_wb
+        self.pipelined = pipelined
+        self.burst = burst
+        self.write_combine = write_combine
+        self.cache_lines = cache_lines
+        self.cache_line_words = cache_line_words
+        self.cache_ways = cache_ways
+        self.prefetch = prefetch
+        self.shadow_words = shadow_words
+        self.shadow_base = shadow_base
+        self.windows = windows
+        self.pages = pages
+        self.page_size = page_size
+
         # BMC wishbone. We dont use a Record because we want predictable
         # signal names so we can hook it up to VHDL/Verilog
         self.adr = Signal(14)
@@ -33,6 +129,7 @@ class LPCPeripheral(Elaboratable):
         self.stb = Signal()
         self.we = Signal()
         self.ack = Signal()
+        self.stall = Signal()  # Only used if pipelined
 
         # DMA wishbone
         self.dma_adr = Signal(30)
@@ -43,6 +140,10 @@ class LPCPeripheral(Elaboratable):
         self.dma_stb = Signal()
         self.dma_we = Signal()
         self.dma_ack = Signal()
+        self.dma_err = Signal()
+        self.dma_stall = Signal()  # Only used if pipelined
+        self.dma_cti = Signal(3)  # Only used if burst
+        self.dma_bte = Signal(2)  # Only used if burst
 
         # LPC bus
         self.lclk  = Signal()
@@ -51,10 +152,15 @@ class LPCPeripheral(Elaboratable):
         self.lad_out = Signal(4)
         self.lad_en = Signal()
         self.lreset = Signal()
+        self.serirq_in = Signal(reset=1)
+        self.serirq_out = Signal()
+        self.serirq_en = Signal()
 
         # Interrupts
         self.bmc_vuart_irq = Signal()
         self.bmc_ipmi_irq = Signal()
+        self.bmc_lpc_ctrl_irq = Signal()
+        self.bmc_postcode_irq = Signal()
 
         self.target_vuart_irq = Signal()
         self.target_ipmi_irq = Signal()
@@ -62,9 +168,41 @@ class LPCPeripheral(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.io = io = IOSpace()
-        m.submodules.lpc = lpc = lpc2wb()
-        m.submodules.lpc_ctrl = lpc_ctrl = LPC_Ctrl()
+        # Domain the LPC side runs in
+        lclk = "sync" if self.single_clock else "lclk"
+
+        m.submodules.io = io = IOSpace(lpc_stats=self.stats,
+                                       lpc_trace_depth=self.trace_depth,
+                                       pipelined=self.pipelined)
+        shadow = []
+        if self.shadow_status:
+            shadow = [(io.target_vuart_lsr_addr, io.target_vuart_lsr),
+                      (io.target_ipmi_bt_ctrl_addr, io.target_ipmi_bt_ctrl)]
+        m.submodules.lpc = lpc = lpc2wb(early_dispatch=self.early_dispatch,
+                                        posted_writes=self.posted_writes,
+                                        short_waits=self.short_waits,
+                                        shadow_addrs=[addr for addr, _ in shadow],
+                                        fifo_depth=self.fifo_depth,
+                                        single_clock=self.single_clock,
+                                        registered_wb=self.registered_wb,
+                                        pipelined=self.pipelined,
+                                        burst=self.burst)
+        m.submodules.lpc_ctrl = lpc_ctrl = LPC_Ctrl(registered=self.registered_wb,
+                                                    pipelined=self.pipelined,
+                                                    burst=self.burst,
+                                                    write_combine=self.write_combine,
+                                                    cache_lines=self.cache_lines,
+                                                    cache_line_words=self.cache_line_words,
+                                                    cache_ways=self.cache_ways,
+                                                    prefetch=self.prefetch,
+                                                    shadow_words=self.shadow_words,
+                                                    shadow_base=self.shadow_base,
+                                                    windows=self.windows,
+                                                    pages=self.pages,
+                                                    page_size=self.page_size)
+        # Target interrupts go to the host over SERIRQ
+        target_irqs = [io.target_vuart_irq, io.target_ipmi_irq]
+        m.submodules.serirq = serirq = DomainRenamer(lclk)(SerIRQ(nirqs=len(target_irqs)))
 
         m.d.comb += [
             # BMC wishbone
@@ -97,6 +235,7 @@ class LPCPeripheral(Elaboratable):
             self.dma_we.eq(lpc_ctrl.dma_wb.we),
             lpc_ctrl.dma_wb.dat_r.eq(self.dma_dat_r),
             lpc_ctrl.dma_wb.ack.eq(self.dma_ack),
+            lpc_ctrl.dma_wb.err.eq(self.dma_err),
 
             # LPC to LPC CTRL DMA wishbone
             lpc.fw_wb.connect(lpc_ctrl.lpc_wb),
@@ -104,6 +243,14 @@ class LPCPeripheral(Elaboratable):
             # LPC CTRL I/O wishbone
             io.lpc_ctrl_wb.connect(lpc_ctrl.io_wb),
 
+            # Posted LPC write errors
+            lpc_ctrl.posted_err.eq(lpc.posted_err),
+            lpc_ctrl.posted_err_addr.eq(lpc.posted_err_addr),
+
+            # LPC SYNC timeout
+            lpc.sync_timeout.eq(lpc_ctrl.sync_timeout),
+            lpc_ctrl.sync_timeout_err.eq(lpc.sync_timeout_err),
+
             # LPC
             lpc.lclk.eq(self.lclk),
             lpc.lframe.eq(self.lframe),
@@ -112,13 +259,75 @@ class LPCPeripheral(Elaboratable):
             self.lad_en.eq(lpc.lad_en),
             lpc.lreset.eq(self.lreset),
 
+            # SERIRQ
+            serirq.irqs.eq(Cat(*target_irqs)),
+            serirq.serirq_in.eq(self.serirq_in),
+            self.serirq_out.eq(serirq.serirq_out),
+            self.serirq_en.eq(serirq.serirq_en),
+            serirq.lreset.eq(self.lreset),
+
             # Interrupts
             self.bmc_vuart_irq.eq(io.bmc_vuart_irq),
             self.bmc_ipmi_irq.eq(io.bmc_ipmi_irq),
+            self.bmc_lpc_ctrl_irq.eq(lpc_ctrl.irq),
+            self.bmc_postcode_irq.eq(io.bmc_postcode_irq),
             self.target_vuart_irq.eq(io.target_vuart_irq),
             self.target_ipmi_irq.eq(io.target_ipmi_irq),
         ]
 
+        if self.pipelined:
+            m.d.comb += [
+                self.stall.eq(io.bmc_wb.stall),
+                lpc.io_wb.stall.eq(io.target_wb.stall),
+                lpc_ctrl.dma_wb.stall.eq(self.dma_stall),
+            ]
+
+        if self.burst:
+            m.d.comb += [
+                self.dma_cti.eq(lpc_ctrl.dma_wb.cti),
+                self.dma_bte.eq(lpc_ctrl.dma_wb.bte),
+            ]
+
+        # Status registers shadowed in the LPC front end
+        for shadow_data, (_, data) in zip(lpc.shadow_data, shadow):
+            m.d.comb += shadow_data.eq(data)
+
+        # SERIRQ config, a byte per target IRQ source
+        for i, slot in enumerate(serirq.slots):
+            cfg = lpc_ctrl.serirq_cfg[i * 8:(i + 1) * 8]
+            m.d.comb += [
+                slot.eq(cfg[0:5]),
+                serirq.active_low[i].eq(cfg[6]),
+                serirq.enables[i].eq(cfg[7]),
+            ]
+
+        if self.stats:
+            m.submodules.lpc_stats = lpc_stats = DomainRenamer({"lclk": lclk})(LPCStats())
+            m.d.comb += [
+                io.lpc_stats_wb.connect(lpc_stats.wb),
+                lpc_stats.state.eq(lpc.state),
+                lpc_stats.cycletype.eq(lpc.cycletype),
+                lpc_stats.lframe.eq(self.lframe),
+                lpc_stats.lreset.eq(self.lreset),
+                lpc_stats.lad_out.eq(lpc.lad_out),
+                lpc_stats.lad_en.eq(lpc.lad_en),
+            ]
+
+        if self.trace_depth:
+            m.submodules.lpc_trace = lpc_trace = DomainRenamer({"lclk": lclk})(
+                LPCTrace(depth=self.trace_depth))
+            m.d.comb += [
+                io.lpc_trace_wb.connect(lpc_trace.wb),
+                lpc_trace.state.eq(lpc.state),
+                lpc_trace.cycletype.eq(lpc.cycletype),
+                lpc_trace.addr.eq(lpc.addr),
+                lpc_trace.size.eq(lpc.size),
+                lpc_trace.data.eq(lpc.data),
+                lpc_trace.synccount.eq(lpc.synccount),
+                lpc_trace.lad_out.eq(lpc.lad_out),
+                lpc_trace.lad_en.eq(lpc.lad_en),
+            ]
+
         return m
 
 
@@ -127,8 +336,11 @@ if __name__ == "__main__":
     with open("lpcperipheral.v", "w") as f:
         f.write(verilog.convert(top, ports=[
             top.adr, top.dat_w, top.dat_r, top.sel, top.cyc, top.stb,
-            top.we, top.ack, top.dma_adr, top.dma_dat_w, top.dma_dat_r,
-            top.dma_sel, top.dma_cyc, top.dma_stb, top.dma_we, top.dma_ack,
+            top.we, top.ack, top.stall, top.dma_adr, top.dma_dat_w, top.dma_dat_r,
+            top.dma_sel, top.dma_cyc, top.dma_stb, top.dma_we, top.dma_ack, top.dma_err,
+            top.dma_stall, top.dma_cti, top.dma_bte,
             top.lclk, top.lframe, top.lad_in,
-            top.lad_out, top.lad_en, top.lreset, top.bmc_vuart_irq,
-            top.bmc_ipmi_irq, top.target_vuart_irq, top.target_ipmi_irq], name="lpc_top"))
+            top.lad_out, top.lad_en, top.lreset,
+            top.serirq_in, top.serirq_out, top.serirq_en, top.bmc_vuart_irq,
+            top.bmc_ipmi_irq, top.bmc_lpc_ctrl_irq, top.bmc_postcode_irq,
+            top.target_vuart_irq, top.target_ipmi_irq], name="lpc_top"))
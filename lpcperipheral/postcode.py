@@ -0,0 +1,204 @@
+# POST code snoop. Host firmware writes boot progress codes to IO ports
+# 0x80 and 0x81. These are acked straight away and queued in a FIFO
+# with a timestamp (system clocks since reset) for the BMC to read.
+#
+# Reading CODE pops the next code from the FIFO, bit 31 says if there
+# was one. The timestamp of that code can then be read from
+# TIMESTAMP_LO/HI. If the FIFO is full new codes are dropped and the
+# overflow bit is set in STATUS. The BMC gets an interrupt when the FIFO
+# has THRESHOLD or more codes in it, or on overflow. A THRESHOLD of 0
+# disables the interrupt.
+#
+# Target reads of the ports return the last code written to them.
+
+from enum import IntEnum, unique
+
+from nmigen import Signal, Elaboratable, Module, Cat, Const
+from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen.lib.fifo import SyncFIFOBuffered
+
+from nmigen.back import verilog
+
+POSTCODE_TIMESTAMP_WIDTH = 48
+
+
+@unique
+class RegEnum(IntEnum):
+    POSTCODE = 0
+    POSTCODE_EXT = 1
+
+
+@unique
+class BMCRegEnum(IntEnum):
+    CODE = 0  # bits 7:0 code, bit 8 written to POSTCODE_EXT, bit 31 valid
+    TIMESTAMP_LO = 1
+    TIMESTAMP_HI = 2
+    STATUS = 3  # bits 15:0 FIFO level, bit 16 overflow (write 1 to clear)
+    THRESHOLD = 4
+
+
+@unique
+class StateEnum(IntEnum):
+    IDLE = 0
+    ACK = 1
+
+
+class PostCode(Elaboratable):
+    def __init__(self, depth=256):
+        assert depth < 1 << 16
+        self.depth = depth
+
+        self.bmc_wb = WishboneInterface(data_width=32, addr_width=3, granularity=8)
+        self.bmc_irq = Signal()
+
+        self.target_wb = WishboneInterface(data_width=8, addr_width=1)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        timestamp = Signal(POSTCODE_TIMESTAMP_WIDTH)
+        m.d.sync += timestamp.eq(timestamp + 1)
+
+        m.submodules.fifo = fifo = SyncFIFOBuffered(width=8 + 1 + POSTCODE_TIMESTAMP_WIDTH,
+                                                    depth=self.depth)
+        m.d.comb += fifo.w_data.eq(Cat(self.target_wb.dat_w, self.target_wb.adr, timestamp))
+
+        # Last code written to each port
+        last_code = Signal(8)
+        last_code_ext = Signal(8)
+        overflow = Signal()
+        threshold = Signal(range(self.depth + 1))
+        # Timestamp of the last code popped
+        code_timestamp = Signal(POSTCODE_TIMESTAMP_WIDTH)
+
+        m.d.comb += self.bmc_irq.eq((threshold != 0) &
+                                    ((fifo.level >= threshold) | overflow))
+
+        # Some wishbone helpers
+        is_bmc_write = Signal()
+        is_bmc_read = Signal()
+        m.d.comb += [
+            is_bmc_write.eq(self.bmc_wb.stb & self.bmc_wb.cyc & self.bmc_wb.we),
+            is_bmc_read.eq(self.bmc_wb.stb & self.bmc_wb.cyc & ~self.bmc_wb.we)
+        ]
+        is_target_read = Signal()
+        is_target_write = Signal()
+        m.d.comb += [
+            is_target_write.eq(self.target_wb.stb & self.target_wb.cyc & self.target_wb.we),
+            is_target_read.eq(self.target_wb.stb & self.target_wb.cyc & ~self.target_wb.we)
+        ]
+
+        # BMC and target wishbone state machine
+        bmc_state = Signal(StateEnum, reset=StateEnum.IDLE)
+        target_state = Signal(StateEnum, reset=StateEnum.IDLE)
+
+        m.d.sync += [
+            fifo.w_en.eq(0),
+            fifo.r_en.eq(0)
+        ]
+
+        m.d.sync += [
+            self.bmc_wb.ack.eq(0),
+            self.target_wb.ack.eq(0)
+        ]
+
+        # Target wishbone state machine. Ack in the next cycle so we
+        # never hold up the host.
+        with m.Switch(target_state):
+            with m.Case(StateEnum.IDLE):
+                with m.If(is_target_write):
+                    with m.Switch(self.target_wb.adr):
+                        with m.Case(RegEnum.POSTCODE):
+                            m.d.sync += last_code.eq(self.target_wb.dat_w)
+                        with m.Case(RegEnum.POSTCODE_EXT):
+                            m.d.sync += last_code_ext.eq(self.target_wb.dat_w)
+
+                    # Only assert write if there is space
+                    m.d.sync += fifo.w_en.eq(fifo.w_rdy)
+                    with m.If(~fifo.w_rdy):
+                        m.d.sync += overflow.eq(1)
+
+                    m.d.sync += [
+                        self.target_wb.ack.eq(1),
+                        target_state.eq(StateEnum.ACK)
+                    ]
+
+                with m.If(is_target_read):
+                    with m.Switch(self.target_wb.adr):
+                        with m.Case(RegEnum.POSTCODE):
+                            m.d.sync += self.target_wb.dat_r.eq(last_code)
+                        with m.Case(RegEnum.POSTCODE_EXT):
+                            m.d.sync += self.target_wb.dat_r.eq(last_code_ext)
+
+                    m.d.sync += [
+                        self.target_wb.ack.eq(1),
+                        target_state.eq(StateEnum.ACK)
+                    ]
+
+            with m.Case(StateEnum.ACK):
+                m.d.sync += [
+                    self.target_wb.ack.eq(0),
+                    target_state.eq(StateEnum.IDLE),
+                ]
+
+        # BMC wishbone state machine
+        with m.Switch(bmc_state):
+            with m.Case(StateEnum.IDLE):
+                with m.If(is_bmc_write):
+                    with m.Switch(self.bmc_wb.adr):
+                        with m.Case(BMCRegEnum.STATUS):
+                            # Bit 16, write 1 to clear overflow
+                            with m.If(self.bmc_wb.dat_w[16]):
+                                m.d.sync += overflow.eq(0)
+
+                        with m.Case(BMCRegEnum.THRESHOLD):
+                            m.d.sync += threshold.eq(self.bmc_wb.dat_w)
+
+                    m.d.sync += [
+                        self.bmc_wb.ack.eq(1),
+                        bmc_state.eq(StateEnum.ACK)
+                    ]
+
+                with m.If(is_bmc_read):
+                    with m.Switch(self.bmc_wb.adr):
+                        with m.Case(BMCRegEnum.CODE):
+                            # Don't read from an empty FIFO
+                            m.d.sync += self.bmc_wb.dat_r.eq(0)
+                            with m.If(fifo.r_rdy):
+                                m.d.sync += [
+                                    self.bmc_wb.dat_r.eq(Cat(fifo.r_data[0:9], Const(0, 22), 1)),
+                                    code_timestamp.eq(fifo.r_data[9:]),
+                                    fifo.r_en.eq(1),
+                                ]
+
+                        with m.Case(BMCRegEnum.TIMESTAMP_LO):
+                            m.d.sync += self.bmc_wb.dat_r.eq(code_timestamp[0:32])
+
+                        with m.Case(BMCRegEnum.TIMESTAMP_HI):
+                            m.d.sync += self.bmc_wb.dat_r.eq(code_timestamp[32:])
+
+                        with m.Case(BMCRegEnum.STATUS):
+                            m.d.sync += self.bmc_wb.dat_r.eq(Cat(fifo.level, Const(0, 16 - len(fifo.level)),
+                                                                 overflow))
+
+                        with m.Case(BMCRegEnum.THRESHOLD):
+                            m.d.sync += self.bmc_wb.dat_r.eq(threshold)
+
+                    m.d.sync += [
+                        self.bmc_wb.ack.eq(1),
+                        bmc_state.eq(StateEnum.ACK)
+                    ]
+
+            with m.Case(StateEnum.ACK):
+                m.d.sync += [
+                    self.bmc_wb.ack.eq(0),
+                    bmc_state.eq(StateEnum.IDLE),
+                ]
+
+        return m
+
+
+if __name__ == "__main__":
+    top = PostCode()
+    with open("postcode.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -0,0 +1,160 @@
+#
+# This is an LPC SERIRQ (serialised IRQ) slave. It runs off the LPC
+# clock and sends the state of a number of interrupt sources to the
+# host, each in a configurable IRQ slot.
+#
+# SERIRQ is a single open drain style line shared by the host and all
+# the peripherals. The host sends a start frame (SERIRQ low for 4-8
+# clocks), then there are a number of 3 clock IRQ frames (Sample,
+# Recovery, Turnaround), and then the host sends a stop frame (low for
+# 2 or 3 clocks). In the sample phase of its slot a peripheral drives
+# SERIRQ low if its IRQ line is low, otherwise it leaves SERIRQ alone
+# so it's pulled high. If it drove it low it drives SERIRQ high again
+# in the recovery phase.
+#
+# The length of the stop frame tells us which mode the host wants next:
+# 2 clocks for quiet mode and 3 for continuous mode. In continuous mode
+# the host sends start frames itself. In quiet mode the host only sends
+# a start frame when a peripheral asks for one by driving SERIRQ low for
+# a clock while the bus is idle, which we do when one of our IRQ lines
+# has changed since we last sent it.
+#
+# ISA style IRQs (the normal case) are asserted high in the IRQ frame,
+# so SERIRQ is driven low while the IRQ isn't asserted. active_low
+# flips this for hosts that want the IRQ driven low to assert it.
+#
+# The IRQ and config inputs can come from any clock domain and are
+# synchronised here.
+#
+
+from nmigen import Signal, Elaboratable, Module
+from nmigen.lib.cdc import FFSynchronizer
+from nmigen.back import verilog
+
+SERIRQ_SLOTS = 32
+SERIRQ_START_MIN = 4  # Shortest start frame
+SERIRQ_STOP_QUIET = 2  # Stop frame lengths
+SERIRQ_STOP_CONTINUOUS = 3
+
+
+class SerIRQ(Elaboratable):
+    """
+    SERIRQ slave
+
+    Parameters
+    ----------
+    nirqs : int
+        Number of IRQ sources.
+
+    Attributes
+    ----------
+    irqs : Signal(nirqs), in
+        IRQ sources, asserted high.
+    slots : list of Signal(range(SERIRQ_SLOTS)), in
+        IRQ slot to send each IRQ in.
+    enables : Signal(nirqs), in
+        Send this IRQ. Disabled IRQs never drive SERIRQ.
+    active_low : Signal(nirqs), in
+        Drive SERIRQ low rather than high to assert this IRQ.
+    """
+    def __init__(self, nirqs=1):
+        self.nirqs = nirqs
+
+        self.irqs = Signal(nirqs)
+        self.slots = [Signal(range(SERIRQ_SLOTS), name="slot%d" % i)
+                      for i in range(nirqs)]
+        self.enables = Signal(nirqs)
+        self.active_low = Signal(nirqs)
+
+        # LPC pins
+        self.serirq_in = Signal(reset=1)
+        self.serirq_out = Signal()
+        self.serirq_en = Signal()
+        self.lreset = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        irqs = Signal(self.nirqs)
+        slots = [Signal.like(slot) for slot in self.slots]
+        enables = Signal(self.nirqs)
+        active_low = Signal(self.nirqs)
+        m.submodules += FFSynchronizer(self.irqs, irqs)
+        # Config registers are set rarely so can be synchronised bitwise
+        for slot, self_slot in zip(slots, self.slots):
+            m.submodules += FFSynchronizer(self_slot, slot)
+        m.submodules += FFSynchronizer(self.enables, enables)
+        m.submodules += FFSynchronizer(self.active_low, active_low)
+
+        # Level each IRQ wants on SERIRQ, and the level we last sent
+        level = Signal(self.nirqs)
+        sent = Signal(self.nirqs, reset=(1 << self.nirqs) - 1)
+        m.d.comb += level.eq(irqs ^ active_low)
+        pending = Signal()
+        m.d.comb += pending.eq((enables & (level ^ sent)).any())
+
+        quiet = Signal()  # Mode from the last stop frame
+        inframe = Signal()
+        # Clocks since the end of the start frame. Slot n is sampled at
+        # 2 + 3n.
+        framecycle = Signal(range(3 * SERIRQ_SLOTS + 3))
+        lowcount = Signal(range(SERIRQ_START_MIN + 1))  # saturates
+        highcount = Signal(range(3))  # saturates
+
+        # Watch SERIRQ for start and stop frames
+        with m.If(~self.serirq_in):
+            m.d.sync += highcount.eq(0)
+            with m.If(lowcount != SERIRQ_START_MIN):
+                m.d.sync += lowcount.eq(lowcount + 1)
+        with m.Else():
+            m.d.sync += lowcount.eq(0)
+            with m.If(highcount != 2):
+                m.d.sync += highcount.eq(highcount + 1)
+
+        with m.If(inframe & (framecycle != 3 * SERIRQ_SLOTS + 2)):
+            m.d.sync += framecycle.eq(framecycle + 1)
+
+        with m.If(self.serirq_in):
+            with m.If(lowcount == SERIRQ_START_MIN):
+                # This is the recovery clock of the start frame
+                m.d.sync += inframe.eq(1)
+                m.d.sync += framecycle.eq(1)
+            with m.Elif(inframe & (lowcount == SERIRQ_STOP_QUIET)):
+                m.d.sync += inframe.eq(0)
+                m.d.sync += quiet.eq(1)
+            with m.Elif(inframe & (lowcount == SERIRQ_STOP_CONTINUOUS)):
+                m.d.sync += inframe.eq(0)
+                m.d.sync += quiet.eq(0)
+
+        # Drive our slots
+        drive_low = Signal()
+        drive_high = Signal()
+        for i in range(self.nirqs):
+            with m.If(inframe & enables[i]):
+                with m.If(framecycle == 2 + slots[i] * 3):  # Sample
+                    m.d.sync += sent[i].eq(level[i])
+                    with m.If(~level[i]):
+                        m.d.comb += drive_low.eq(1)
+                with m.If(framecycle == 3 + slots[i] * 3):  # Recovery
+                    with m.If(~sent[i]):
+                        m.d.comb += drive_high.eq(1)
+
+        # In quiet mode ask the host for a frame if an IRQ has changed
+        start = Signal()
+        m.d.comb += start.eq(quiet & ~inframe & pending & (highcount == 2))
+
+        m.d.comb += self.serirq_en.eq(drive_low | drive_high | start)
+        m.d.comb += self.serirq_out.eq(drive_high)
+
+        # The host starts in continuous mode after reset
+        with m.If(self.lreset == 0):
+            m.d.sync += inframe.eq(0)
+            m.d.sync += quiet.eq(0)
+
+        return m
+
+
+if __name__ == "__main__":
+    top = SerIRQ(nirqs=2)
+    with open("serirq.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -30,11 +30,17 @@ class VUart(Elaboratable):
 
     Parameters
     ----------
+    pipelined : bool
+        Pipelined wishbone slave, with a stall signal (always 0). Every
+        access is acked in the next cycle and a new one can be started
+        in each cycle. The FIFO enables are then combinatorial.
 
     Attributes
     ----------
     """
-    def __init__(self):
+    def __init__(self, pipelined=False):
+        self.pipelined = pipelined
+
         # Write port of FIFO A
         self.w_data = Signal(8)
         self.w_rdy = Signal()
@@ -47,8 +53,12 @@ class VUart(Elaboratable):
 
         self.irq = Signal()
 
+        # Current value of the line status register
+        self.lsr = Signal(8)
+
         # Wishbone slave
-        self.wb = WishboneInterface(data_width=8, addr_width=3)
+        self.wb = WishboneInterface(data_width=8, addr_width=3,
+                                    features=["stall"] if pipelined else [])
 
     def elaborate(self, platform):
         m = Module()
@@ -85,14 +95,30 @@ class VUart(Elaboratable):
         dlab = Signal()
         m.d.comb += dlab.eq(lcr[LCR_DLAB])
 
+        m.d.comb += [
+            lsr.eq(0),
+            lsr[0].eq(self.r_rdy),
+            # Should we do something with the OE bit?
+            lsr[1].eq(0),
+            # Set THRE always to 1
+            lsr[5].eq(1),
+            # Set TEMT always to 1
+            lsr[6].eq(1),
+            self.lsr.eq(lsr),
+        ]
+
         # Don't read from an empty FIFO
         read_data = Signal(8)
         m.d.comb += read_data.eq(0)
         with m.If(self.r_rdy):
             m.d.comb += read_data.eq(self.r_data)
 
-        m.d.sync += self.r_en.eq(0)
-        m.d.sync += self.w_en.eq(0)
+        # Back to back pipelined accesses have to see the FIFOs
+        # updated by the previous one, so drive them straight away
+        fifo = m.d.comb if self.pipelined else m.d.sync
+
+        fifo += self.r_en.eq(0)
+        fifo += self.w_en.eq(0)
 
         # IRQ handling.
         #
@@ -124,6 +150,10 @@ class VUart(Elaboratable):
                     iir.eq(0b0100),
                 ]
 
+        m.d.sync += self.wb.ack.eq(0)
+        if self.pipelined:
+            m.d.comb += self.wb.stall.eq(0)
+
         with m.FSM():
             with m.State('IDLE'):
                 # Write
@@ -133,9 +163,9 @@ class VUart(Elaboratable):
                             with m.If(dlab):
                                 m.d.sync += dll.eq(self.wb.dat_w)
                             with m.Else():
-                                m.d.sync += self.w_data.eq(self.wb.dat_w)
+                                fifo += self.w_data.eq(self.wb.dat_w)
                                 with m.If(self.w_rdy):
-                                    m.d.sync += self.w_en.eq(1)
+                                    fifo += self.w_en.eq(1)
 
                         with m.Case(RegEnum.IER_DLM):
                             with m.If(dlab):
@@ -159,7 +189,8 @@ class VUart(Elaboratable):
                             m.d.sync += scr.eq(self.wb.dat_w)
 
                     m.d.sync += self.wb.ack.eq(1)
-                    m.next = 'ACK'
+                    if not self.pipelined:
+                        m.next = 'ACK'
 
                 # Read
                 with m.Elif(is_read):
@@ -170,7 +201,7 @@ class VUart(Elaboratable):
                             with m.Else():
                                 m.d.sync += self.wb.dat_r.eq(read_data)
                                 with m.If(self.r_rdy):
-                                    m.d.sync += self.r_en.eq(1)
+                                    fifo += self.r_en.eq(1)
 
                         with m.Case(RegEnum.IER_DLM):
                             with m.If(dlab):
@@ -188,16 +219,7 @@ class VUart(Elaboratable):
                             m.d.sync += self.wb.dat_r.eq(mcr)
 
                         with m.Case(RegEnum.LSR):
-                            m.d.sync += [
-                                self.wb.dat_r.eq(0),
-                                self.wb.dat_r[0].eq(self.r_rdy),
-                                # Should we do something with the OE bit?
-                                self.wb.dat_r[1].eq(0),
-                                # Set THRE always to 1
-                                self.wb.dat_r[5].eq(1),
-                                # Set TEMT always to 1
-                                self.wb.dat_r[6].eq(1)
-                            ]
+                            m.d.sync += self.wb.dat_r.eq(lsr)
 
                         with m.Case(RegEnum.MSR):
                             m.d.sync += self.wb.dat_r.eq(msr)
@@ -206,7 +228,8 @@ class VUart(Elaboratable):
                             m.d.sync += self.wb.dat_r.eq(scr)
 
                     m.d.sync += self.wb.ack.eq(1)
-                    m.next = 'ACK'
+                    if not self.pipelined:
+                        m.next = 'ACK'
 
             with m.State('ACK'):
                 m.d.sync += self.wb.ack.eq(0)
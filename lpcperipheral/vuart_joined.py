@@ -13,26 +13,34 @@ class VUartJoined(Elaboratable):
 
     Parameters
     ----------
+    pipelined : bool
+        Pipelined wishbone slaves, see :class:`VUart`.
 
     Attributes
     ----------
     """
-    def __init__(self, depth=8):
+    def __init__(self, depth=8, pipelined=False):
         self.depth = depth
+        self.pipelined = pipelined
+        features = ["stall"] if pipelined else []
 
         self.irq_a = Signal()
-        self.wb_a = WishboneInterface(data_width=32, addr_width=3, granularity=8)
+        self.lsr_a = Signal(8)
+        self.wb_a = WishboneInterface(data_width=32, addr_width=3, granularity=8,
+                                      features=features)
 
         self.irq_b = Signal()
-        self.wb_b = WishboneInterface(data_width=8, addr_width=3, granularity=8)
+        self.lsr_b = Signal(8)
+        self.wb_b = WishboneInterface(data_width=8, addr_width=3, granularity=8,
+                                      features=features)
 
     def elaborate(self, platform):
         m = Module()
 
         m.submodules.fifo_a = fifo_a = SyncFIFOBuffered(width=8, depth=self.depth)
         m.submodules.fifo_b = fifo_b = SyncFIFOBuffered(width=8, depth=self.depth)
-        m.submodules.vuart_a = vuart_a = VUart()
-        m.submodules.vuart_b = vuart_b = VUart()
+        m.submodules.vuart_a = vuart_a = VUart(pipelined=self.pipelined)
+        m.submodules.vuart_b = vuart_b = VUart(pipelined=self.pipelined)
 
         m.d.comb += [
             fifo_a.w_data.eq(vuart_a.w_data),
@@ -52,6 +60,9 @@ class VUartJoined(Elaboratable):
             self.irq_a.eq(vuart_a.irq),
             self.irq_b.eq(vuart_b.irq),
 
+            self.lsr_a.eq(vuart_a.lsr),
+            self.lsr_b.eq(vuart_b.lsr),
+
             self.wb_a.connect(vuart_a.wb),
             self.wb_b.connect(vuart_b.wb),
         ]
@@ -0,0 +1,277 @@
+#
+# Wishbone read cache. Host firmware reads the same flash structures
+# (TOC, partition tables, ECC headers) over and over during boot, and
+# each read is otherwise a round trip to the system bus. This keeps
+# lines of recently read words and answers reads that hit from its own
+# memory, a cycle after the request.
+#
+# The cache has lines lines of line_words words, ways way set
+# associative. A miss reads the whole line from the subordinate (as an
+# incrementing burst if there is cti) and answers the request once the
+# line is in. Lines are replaced round robin. An error reading a line
+# goes back on the request, and neither it nor the line it was
+# replacing is kept.
+#
+# Writes go straight through, and throw away any line holding the
+# word. On a pipelined wishbone they go one at a time, and reads wait
+# for the last write's response. invalidate throws away every line,
+# and a line being read in when it happens isn't kept either.
+#
+# hit and miss pulse for every read, for counting.
+#
+
+from nmigen import Array, Cat, Elaboratable, Memory, Module, Signal
+from nmigen.utils import log2_int
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType, BurstTypeExt
+from nmigen.back import verilog
+
+
+class WishboneReadCache(Elaboratable):
+    """
+    Read cache
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+    lines : int
+        Lines in the cache, a power of 2.
+    line_words : int
+        Words in a line, a power of 2.
+    ways : int
+        Associativity, a power of 2 no more than lines.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    invalidate : Signal, in
+        Throw away all the lines.
+    hit, miss : Signal, out
+        Pulsed for each read.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=(),
+                 lines=16, line_words=4, ways=1):
+        assert lines & (lines - 1) == 0
+        assert line_words & (line_words - 1) == 0
+        assert ways & (ways - 1) == 0 and ways <= lines
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.lines = lines
+        self.line_words = line_words
+        self.ways = ways
+
+        self.invalidate = Signal()
+        self.hit = Signal()
+        self.miss = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_err = hasattr(bus, "err")
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+
+        sets = self.lines // self.ways
+        offset_bits = log2_int(self.line_words)
+        index_bits = log2_int(sets)
+        tag_width = len(bus.adr) - offset_bits - index_bits
+
+        index = Signal(max(index_bits, 1))
+        tag = Signal(tag_width)
+        m.d.comb += [
+            index.eq(bus.adr[offset_bits:offset_bits + index_bits]),
+            tag.eq(bus.adr[offset_bits + index_bits:]),
+        ]
+
+        valid = [Signal(sets, name="valid%d" % w) for w in range(self.ways)]
+        tags = [Array(Signal(tag_width, name="tag%d_%d" % (w, i)) for i in range(sets))
+                for w in range(self.ways)]
+
+        # Ways holding the word being requested
+        hits = Signal(self.ways)
+        for w in range(self.ways):
+            m.d.comb += hits[w].eq(valid[w].bit_select(index, 1) & (tags[w][index] == tag))
+
+        # The request being answered
+        req_adr = Signal.like(bus.adr)
+        req_index = Signal.like(index)
+        req_tag = Signal.like(tag)
+        req_way = Signal(range(max(self.ways, 2)))
+        req_data = Signal.like(bus.dat_r)
+        req_err = Signal()
+        abandoned = Signal()  # The master dropped cyc
+        stale = Signal()  # Invalidated while the line was read in
+        victim = Signal.like(req_way)
+
+        issued = Signal(range(self.line_words + 1))
+        filled = Signal(range(self.line_words + 1))
+
+        data = []
+        for w in range(self.ways):
+            mem = Memory(width=len(bus.dat_r), depth=sets * self.line_words)
+            m.submodules["rdport%d" % w] = rdport = mem.read_port(transparent=False)
+            m.submodules["wrport%d" % w] = wrport = mem.write_port()
+            m.d.comb += [
+                rdport.addr.eq(bus.adr[:offset_bits + index_bits]),
+                wrport.addr.eq(Cat(filled[:offset_bits], req_index[:index_bits])),
+                wrport.data.eq(sub.dat_r),
+            ]
+            data.append((rdport, wrport))
+
+        # A pipelined write waiting for its response. Only one at a
+        # time, so its response can't be mistaken for a line read.
+        pending = Signal()
+        if has_stall:
+            m.d.comb += bus.stall.eq(1)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                with m.If(bus.cyc & (bus.we | ~bus.stb | pending)):
+                    # Writes, and waiting for their responses. Reads
+                    # wait until the writes are done.
+                    m.d.comb += [
+                        sub.adr.eq(bus.adr),
+                        sub.dat_w.eq(bus.dat_w),
+                        sub.sel.eq(bus.sel),
+                        sub.we.eq(bus.we),
+                        sub.cyc.eq(bus.cyc),
+                        sub.stb.eq(bus.stb & bus.we & ~pending),
+                        bus.dat_r.eq(sub.dat_r),
+                        bus.ack.eq(sub.ack),
+                    ]
+                    if has_err:
+                        m.d.comb += bus.err.eq(sub.err)
+                    if has_stall:
+                        m.d.comb += bus.stall.eq(sub.stall | ~bus.we | pending)
+                        sub_resp = sub.ack | sub.err if has_err else sub.ack
+                        with m.If(sub.stb & ~sub.stall & ~sub_resp):
+                            m.d.sync += pending.eq(1)
+                        with m.If(sub_resp):
+                            m.d.sync += pending.eq(0)
+                    if has_cti:
+                        m.d.comb += [
+                            sub.cti.eq(bus.cti),
+                            sub.bte.eq(bus.bte),
+                        ]
+                    with m.If(sub.stb):
+                        for w in range(self.ways):
+                            with m.If(hits[w]):
+                                m.d.sync += valid[w].bit_select(index, 1).eq(0)
+                with m.Elif(bus.cyc & bus.stb):
+                    if has_stall:
+                        m.d.comb += bus.stall.eq(0)
+                    m.d.sync += [
+                        req_adr.eq(bus.adr),
+                        req_index.eq(index),
+                        req_tag.eq(tag),
+                    ]
+                    with m.If(hits.any()):
+                        m.d.comb += self.hit.eq(1)
+                        for w in range(self.ways):
+                            with m.If(hits[w]):
+                                m.d.sync += req_way.eq(w)
+                        m.next = "HIT"
+                    with m.Else():
+                        m.d.comb += self.miss.eq(1)
+                        m.d.sync += req_way.eq(victim)
+                        # The line is overwritten as it's read in, so
+                        # it's gone even if that fails
+                        for w in range(self.ways):
+                            with m.If(victim == w):
+                                m.d.sync += valid[w].bit_select(index, 1).eq(0)
+                        if self.ways > 1:
+                            m.d.sync += victim.eq(victim + 1)
+                        m.next = "FILL"
+
+            with m.State("HIT"):
+                # Data comes out of the memory a cycle after the request
+                for w, (rdport, _) in enumerate(data):
+                    with m.If(req_way == w):
+                        m.d.comb += bus.dat_r.eq(rdport.data)
+                m.d.comb += bus.ack.eq(bus.cyc)
+                m.next = "IDLE"
+
+            with m.State("FILL"):
+                word = issued if has_stall else filled
+                m.d.comb += [
+                    sub.adr.eq(Cat(word[:offset_bits], req_adr[offset_bits:])),
+                    sub.sel.eq(~0),
+                    sub.cyc.eq(1),
+                    sub.stb.eq(issued != self.line_words),
+                ]
+                if has_cti:
+                    m.d.comb += sub.bte.eq(BurstTypeExt.LINEAR)
+                    if self.line_words == 1:
+                        m.d.comb += sub.cti.eq(CycleType.CLASSIC)
+                    else:
+                        with m.If(word == self.line_words - 1):
+                            m.d.comb += sub.cti.eq(CycleType.END_OF_BURST)
+                        with m.Else():
+                            m.d.comb += sub.cti.eq(CycleType.INCR_BURST)
+
+                if has_stall:
+                    with m.If(sub.stb & ~sub.stall):
+                        m.d.sync += issued.eq(issued + 1)
+                else:
+                    with m.If(sub.ack):
+                        m.d.sync += issued.eq(issued + 1)
+
+                with m.If(sub.ack):
+                    for w, (_, wrport) in enumerate(data):
+                        m.d.comb += wrport.en.eq(req_way == w)
+                    with m.If(filled == req_adr[:offset_bits]):
+                        m.d.sync += req_data.eq(sub.dat_r)
+                    m.d.sync += filled.eq(filled + 1)
+                    with m.If(filled == self.line_words - 1):
+                        for w in range(self.ways):
+                            with m.If(req_way == w):
+                                m.d.sync += [
+                                    tags[w][req_index].eq(req_tag),
+                                    valid[w].bit_select(req_index, 1).eq(~stale),
+                                ]
+                        m.next = "RESP"
+                if has_err:
+                    with m.If(sub.err):
+                        m.d.sync += req_err.eq(1)
+                        m.next = "RESP"
+
+                with m.If(~bus.cyc):
+                    m.d.sync += abandoned.eq(1)
+                with m.If(self.invalidate):
+                    m.d.sync += stale.eq(1)
+
+            with m.State("RESP"):
+                m.d.comb += bus.dat_r.eq(req_data)
+                with m.If(bus.cyc & ~abandoned):
+                    m.d.comb += bus.ack.eq(~req_err)
+                    if has_err:
+                        m.d.comb += bus.err.eq(req_err)
+                m.d.sync += [
+                    issued.eq(0),
+                    filled.eq(0),
+                    req_err.eq(0),
+                    abandoned.eq(0),
+                    stale.eq(0),
+                ]
+                m.next = "IDLE"
+
+        with m.If(~bus.cyc):
+            m.d.sync += pending.eq(0)
+        with m.If(self.invalidate):
+            for w in range(self.ways):
+                m.d.sync += valid[w].eq(0)
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishboneReadCache(addr_width=30, data_width=32, granularity=8)
+    with open("wb_cache.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -0,0 +1,161 @@
+#
+# Pipelined wishbone decoder. The nmigen_soc Decoder picks the
+# subordinate to take the response from using the current address,
+# which only works if the master holds the address until the ack. A
+# pipelined master moves on to the next address as soon as a request
+# is accepted, so this remembers which subordinate has requests
+# outstanding and takes the responses from it.
+#
+# A request to a different subordinate is stalled until all the
+# responses from the current one are back, so responses always come
+# back in order.
+#
+# Subordinates without a stall signal are classic. They are stalled
+# until they ack, so the request is accepted in the same cycle as its
+# response. They only see stb for one request at a time, so there is a
+# cycle without stb after each ack and their responses are ignored
+# when stb is low.
+#
+
+from nmigen import Cat, Module, Repl, Signal
+from nmigen.utils import log2_int
+from nmigen_soc.wishbone import Decoder as WishboneDecoder
+from nmigen.back import verilog
+
+
+class WishbonePipelinedDecoder(WishboneDecoder):
+    """
+    Pipelined wishbone decoder
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features, alignment
+        As for the nmigen_soc Decoder. features must include stall.
+    max_pending : int
+        Requests that can be outstanding at once.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        Bus providing access to the subordinate buses.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=frozenset(),
+                 alignment=0, max_pending=4):
+        assert "stall" in features
+        super().__init__(addr_width=addr_width, data_width=data_width,
+                         granularity=granularity, features=features,
+                         alignment=alignment)
+        self.max_pending = max_pending
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        subs = []
+
+        # Subordinate the current request is for
+        hit = Signal()
+        index = Signal(range(max(len(self._subs), 2)))
+
+        with m.Switch(bus.adr):
+            for sub_map, (sub_pat, sub_ratio) in self._map.window_patterns():
+                sub_bus = self._subs[sub_map]
+
+                m.d.comb += [
+                    sub_bus.adr.eq(bus.adr << log2_int(sub_ratio)),
+                    sub_bus.dat_w.eq(bus.dat_w),
+                    sub_bus.sel.eq(Cat(Repl(sel, sub_ratio) for sel in bus.sel)),
+                    sub_bus.we.eq(bus.we),
+                ]
+
+                with m.Case(sub_pat[:len(sub_pat) - log2_int(bus.data_width // bus.granularity)]):
+                    m.d.comb += [
+                        hit.eq(1),
+                        index.eq(len(subs)),
+                    ]
+                subs.append(sub_bus)
+
+        # Subordinate with responses outstanding
+        current = Signal.like(index)
+        pending = Signal(range(self.max_pending + 1))
+
+        # Hold off requests to another subordinate until the current
+        # one is done
+        blocked = Signal()
+        m.d.comb += blocked.eq((pending != 0) &
+                               ((index != current) | (pending == self.max_pending)))
+
+        # Responses come from the current subordinate, or the one
+        # being addressed if nothing is outstanding
+        resp_index = Signal.like(index)
+        m.d.comb += resp_index.eq(current)
+        with m.If(pending == 0):
+            m.d.comb += resp_index.eq(index)
+
+        resp = Signal()
+        for i, sub_bus in enumerate(subs):
+            sub_resp = sub_bus.ack
+            for opt in ("err", "rty"):
+                if hasattr(sub_bus, opt):
+                    sub_resp = sub_resp | getattr(sub_bus, opt)
+
+            selected = Signal(name="selected%d" % i)
+            m.d.comb += selected.eq(hit & (index == i) & ~blocked)
+            m.d.comb += sub_bus.cyc.eq(bus.cyc & (selected | ((current == i) & (pending != 0))))
+
+            if hasattr(sub_bus, "stall"):
+                m.d.comb += sub_bus.stb.eq(bus.stb & selected)
+                with m.If(selected):
+                    m.d.comb += bus.stall.eq(sub_bus.stall)
+            else:
+                # Drop stb for a cycle after each ack
+                gap = Signal(name="gap%d" % i)
+                m.d.sync += gap.eq(sub_bus.stb & sub_resp)
+                m.d.comb += sub_bus.stb.eq(bus.stb & selected & ~gap)
+                sub_resp = sub_bus.stb & sub_resp
+                with m.If(selected):
+                    m.d.comb += bus.stall.eq(~sub_resp)
+
+            with m.If(resp_index == i):
+                # Classic responses only count while stb is high
+                valid = sub_bus.cyc if hasattr(sub_bus, "stall") else sub_bus.stb
+                m.d.comb += [
+                    bus.dat_r.eq(sub_bus.dat_r),
+                    bus.ack.eq(valid & sub_bus.ack),
+                    resp.eq(valid & sub_resp),
+                ]
+                for opt in ("err", "rty"):
+                    if hasattr(bus, opt) and hasattr(sub_bus, opt):
+                        m.d.comb += getattr(bus, opt).eq(valid & getattr(sub_bus, opt))
+
+        with m.If(blocked):
+            m.d.comb += bus.stall.eq(1)
+
+        accepted = Signal()
+        m.d.comb += accepted.eq(bus.cyc & bus.stb & ~bus.stall & hit)
+
+        with m.If(accepted):
+            m.d.sync += current.eq(index)
+        with m.If(accepted & ~resp):
+            m.d.sync += pending.eq(pending + 1)
+        with m.Elif(~accepted & resp):
+            m.d.sync += pending.eq(pending - 1)
+        with m.If(~bus.cyc):
+            m.d.sync += pending.eq(0)
+
+        return m
+
+
+if __name__ == "__main__":
+    from nmigen_soc.memory import MemoryMap
+    from nmigen_soc.wishbone import Interface as WishboneInterface
+
+    top = WishbonePipelinedDecoder(addr_width=14, data_width=32, granularity=8,
+                                   features=["stall"])
+    for addr in (0x0, 0x1000):
+        sub = WishboneInterface(addr_width=3, data_width=32, granularity=8,
+                                features=["stall"])
+        sub.memory_map = MemoryMap(addr_width=5, data_width=8)
+        top.add(sub, addr=addr)
+    with open("wb_decoder.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -0,0 +1,184 @@
+#
+# Wishbone page table address translation. Rather than one contiguous
+# block of memory behind the FW window, each page of it can be
+# anywhere (or nowhere). A table in block RAM has an entry per page:
+# the system byte address of the page, with bit 0 set if it's mapped.
+#
+# Looking up the table takes a cycle, so recent translations are kept
+# in tlb_entries registers (replaced round robin) and used
+# combinatorially. A request whose page isn't in them waits two cycles
+# for the entry to be read. Requests to pages that aren't mapped, or
+# past the end of the table, don't go to the subordinate and unmapped
+# is set for them, it's up to the master side to fail them. An
+# incrementing burst is ended at the end of each page.
+#
+# With bypass set the request goes through untranslated. The load port
+# reads and writes the table directly, load_dat_r is the entry at
+# load_adr a cycle after it's set. Writes to it, and flush, throw away
+# the kept translations.
+#
+
+from nmigen import Elaboratable, Memory, Module, Signal
+from nmigen.utils import log2_int
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType
+from nmigen.back import verilog
+
+
+class WishbonePageTable(Elaboratable):
+    """
+    Page table address translation
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+    pages : int
+        Entries in the page table.
+    page_size : int
+        Bytes in a page, a power of 2.
+    tlb_entries : int
+        Translations kept.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    bypass : Signal, in
+        Don't translate.
+    unmapped : Signal, out
+        The request is to a page that isn't mapped.
+    flush : Signal, in
+        Throw away the kept translations.
+    load_adr, load_dat_w, load_we : Signal, in
+        Entry to read or write, data to write, write strobe.
+    load_dat_r : Signal, out
+        Entry read.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=(),
+                 pages=1024, page_size=4096, tlb_entries=2):
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.pages = pages
+        self.page_size = page_size
+        self.tlb_entries = tlb_entries
+
+        self.bypass = Signal()
+        self.unmapped = Signal()
+        self.flush = Signal()
+        self.load_adr = Signal(range(pages))
+        self.load_dat_w = Signal(32)
+        self.load_we = Signal()
+        self.load_dat_r = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+
+        # Page offset and number, in wishbone words
+        offset_bits = log2_int(self.page_size) - log2_int(len(bus.sel))
+        page_bits = len(bus.adr) - offset_bits
+        vpn = bus.adr[offset_bits:]
+
+        mem = Memory(width=32, depth=self.pages)
+        m.submodules.rdport = rdport = mem.read_port(transparent=False)
+        m.submodules.load_rdport = load_rdport = mem.read_port(transparent=False)
+        m.submodules.wrport = wrport = mem.write_port()
+        m.d.comb += [
+            rdport.addr.eq(vpn),
+            load_rdport.addr.eq(self.load_adr),
+            self.load_dat_r.eq(load_rdport.data),
+            wrport.addr.eq(self.load_adr),
+            wrport.data.eq(self.load_dat_w),
+            wrport.en.eq(self.load_we),
+        ]
+
+        # Kept translations
+        tlb_valid = Signal(self.tlb_entries)
+        tlb_vpn = [Signal(page_bits, name="tlb%d_vpn" % i) for i in range(self.tlb_entries)]
+        tlb_ppn = [Signal(page_bits, name="tlb%d_ppn" % i) for i in range(self.tlb_entries)]
+        tlb_mapped = Signal(self.tlb_entries)
+        victim = Signal(range(max(self.tlb_entries, 2)))
+
+        hit = Signal()
+        mapped = Signal()
+        ppn = Signal(page_bits)
+        for i in range(self.tlb_entries):
+            with m.If(tlb_valid[i] & (tlb_vpn[i] == vpn)):
+                m.d.comb += [
+                    hit.eq(1),
+                    mapped.eq(tlb_mapped[i]),
+                    ppn.eq(tlb_ppn[i]),
+                ]
+
+        in_table = Signal()
+        m.d.comb += in_table.eq(vpn < self.pages)
+
+        walk = Signal()  # Start reading the entry for the request
+        walking = Signal()  # and it's being read
+        stale = Signal()  # Flushed as it was read
+        walk_vpn = Signal(page_bits)
+
+        m.d.comb += bus.connect(sub, exclude={"adr"} | ({"cti"} if has_cti else set()))
+        m.d.comb += sub.adr.eq(bus.adr)
+        if has_cti:
+            m.d.comb += sub.cti.eq(bus.cti)
+
+        with m.If(bus.cyc & bus.stb & ~self.bypass):
+            with m.If(~in_table | (hit & ~mapped)):
+                m.d.comb += [
+                    self.unmapped.eq(1),
+                    sub.stb.eq(0),
+                ]
+            with m.Elif(hit):
+                m.d.comb += sub.adr.eq(bus.adr[:offset_bits] | (ppn << offset_bits))
+                if has_cti:
+                    with m.If((bus.cti == CycleType.INCR_BURST) & bus.adr[:offset_bits].all()):
+                        m.d.comb += sub.cti.eq(CycleType.END_OF_BURST)
+            with m.Else():
+                m.d.comb += sub.stb.eq(0)
+                if has_stall:
+                    m.d.comb += bus.stall.eq(1)
+                m.d.comb += walk.eq(~walking)
+                m.d.sync += [
+                    walking.eq(walk),
+                    walk_vpn.eq(vpn),
+                ]
+
+        with m.If(walking):
+            m.d.sync += [
+                walking.eq(0),
+                stale.eq(0),
+            ]
+            with m.If(~stale & ~self.flush & ~self.load_we):
+                for i in range(self.tlb_entries):
+                    with m.If(victim == i):
+                        m.d.sync += [
+                            tlb_valid[i].eq(1),
+                            tlb_vpn[i].eq(walk_vpn),
+                            tlb_ppn[i].eq(rdport.data[log2_int(self.page_size):]),
+                            tlb_mapped[i].eq(rdport.data[0]),
+                        ]
+                if self.tlb_entries > 1:
+                    m.d.sync += victim.eq(victim + 1)
+
+        with m.If(self.flush | self.load_we):
+            m.d.sync += [
+                tlb_valid.eq(0),
+                stale.eq(walk),
+            ]
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishbonePageTable(addr_width=30, data_width=32, granularity=8)
+    with open("wb_page_table.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -0,0 +1,238 @@
+#
+# Wishbone stream prefetcher. Boot firmware reads flash mostly
+# sequentially a word at a time, and each read otherwise waits for the
+# subordinate. Once two reads in a row are to ascending words, this
+# reads the words after them from the subordinate while the bus is
+# idle, and answers the next reads from a buffer of them, a cycle after
+# the request.
+#
+# Up to depth words (the depth input, no more than the depth parameter)
+# are fetched ahead, one at a time. A read that isn't for the next
+# buffered word, any write, or invalidate throws the buffer away. A
+# read or write waits for a prefetch already on the subordinate to
+# finish first. Prefetching stops on an error, and until the next
+# sequential reads.
+#
+# used pulses for each read answered from the buffer, wasted is the
+# number of words being thrown away.
+#
+
+from nmigen import Array, Elaboratable, Module, Mux, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType
+from nmigen.back import verilog
+
+
+class WishbonePrefetcher(Elaboratable):
+    """
+    Stream prefetcher
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+    depth : int
+        Words in the prefetch buffer.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    enable : Signal, in
+        Prefetch sequential reads.
+    depth : Signal, in
+        Words to fetch ahead.
+    invalidate : Signal, in
+        Throw away the buffer.
+    used : Signal, out
+        Pulsed for each read answered from the buffer.
+    wasted : Signal, out
+        Words being thrown away.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=(), depth=4):
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.max_depth = depth
+
+        self.enable = Signal()
+        self.depth = Signal(range(depth + 1))
+        self.invalidate = Signal()
+        self.used = Signal()
+        self.wasted = Signal(range(depth + 1))
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_err = hasattr(bus, "err")
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+
+        sub_resp = sub.ack | sub.err if has_err else sub.ack
+
+        # Buffered words, oldest first from rd_ptr
+        buf = Array(Signal.like(bus.dat_r, name="buf%d" % i) for i in range(self.max_depth))
+        rd_ptr = Signal(range(max(self.max_depth, 2)))
+        wr_ptr = Signal.like(rd_ptr)
+        count = Signal(range(self.max_depth + 1))
+        head_adr = Signal.like(bus.adr)  # Address of the oldest word
+        next_adr = Signal.like(bus.adr)  # Address to fetch next
+
+        last_adr = Signal.like(bus.adr)  # Last read
+        last_valid = Signal()
+        streaming = Signal()
+
+        fetching = Signal()  # Prefetch on the subordinate
+        sent = Signal()  # and the subordinate has taken it
+        drop = Signal()  # Invalidated while fetching
+        pending = Signal()  # Pipelined read or write waiting for its response
+        resp = Signal()  # Answering a read from the buffer
+        resp_data = Signal.like(bus.dat_r)
+
+        discard = Signal()
+
+        def ptr_inc(ptr):
+            return Mux(ptr == self.max_depth - 1, 0, ptr + 1)
+
+        if has_stall:
+            m.d.comb += bus.stall.eq(1)
+
+        # Words going in and out of the buffer
+        push = Signal()
+        pop = Signal()
+
+        with m.If(fetching):
+            m.d.comb += [
+                sub.adr.eq(next_adr),
+                sub.sel.eq(~0),
+                sub.cyc.eq(1),
+                sub.stb.eq(~sent),
+            ]
+            if has_cti:
+                m.d.comb += sub.cti.eq(CycleType.CLASSIC)
+            if has_stall:
+                with m.If(~sub.stall):
+                    m.d.sync += sent.eq(1)
+            with m.If(sub_resp):
+                m.d.sync += [
+                    fetching.eq(0),
+                    sent.eq(0),
+                    drop.eq(0),
+                ]
+                with m.If(sub.ack & ~drop):
+                    m.d.comb += push.eq(1)
+                    m.d.sync += [
+                        buf[wr_ptr].eq(sub.dat_r),
+                        wr_ptr.eq(ptr_inc(wr_ptr)),
+                        next_adr.eq(next_adr + 1),
+                    ]
+                with m.Else():
+                    m.d.sync += streaming.eq(0)
+
+        # Reads of buffered words are answered even while a prefetch is
+        # on the subordinate
+        with m.If(resp):
+            m.d.comb += [
+                bus.dat_r.eq(resp_data),
+                bus.ack.eq(bus.cyc),
+            ]
+            m.d.sync += resp.eq(0)
+
+        with m.Elif(bus.cyc & bus.stb & ~bus.we & ~pending &
+                    (count != 0) & (bus.adr == head_adr)):
+            # The next buffered word
+            if has_stall:
+                m.d.comb += bus.stall.eq(0)
+            m.d.comb += [
+                pop.eq(1),
+                self.used.eq(1),
+            ]
+            m.d.sync += [
+                resp.eq(1),
+                resp_data.eq(buf[rd_ptr]),
+                rd_ptr.eq(ptr_inc(rd_ptr)),
+                head_adr.eq(head_adr + 1),
+                last_adr.eq(bus.adr),
+            ]
+
+        with m.Elif(~fetching & bus.cyc & (bus.stb | pending)):
+            m.d.comb += [
+                sub.adr.eq(bus.adr),
+                sub.dat_w.eq(bus.dat_w),
+                sub.sel.eq(bus.sel),
+                sub.we.eq(bus.we),
+                sub.cyc.eq(bus.cyc),
+                sub.stb.eq(bus.stb & ~pending),
+                bus.dat_r.eq(sub.dat_r),
+                bus.ack.eq(sub.ack),
+            ]
+            if has_err:
+                m.d.comb += bus.err.eq(sub.err)
+            if has_cti:
+                m.d.comb += [
+                    sub.cti.eq(bus.cti),
+                    sub.bte.eq(bus.bte),
+                ]
+
+            # Pipelined requests are taken when not stalled, classic
+            # ones when they finish
+            if has_stall:
+                m.d.comb += bus.stall.eq(sub.stall | pending)
+                taken = sub.stb & ~sub.stall
+                with m.If(taken & ~sub_resp):
+                    m.d.sync += pending.eq(1)
+                with m.If(sub_resp):
+                    m.d.sync += pending.eq(0)
+            else:
+                taken = sub_resp
+
+            with m.If(taken):
+                m.d.comb += discard.eq(1)
+                with m.If(bus.we):
+                    m.d.sync += [
+                        last_valid.eq(0),
+                        streaming.eq(0),
+                    ]
+                with m.Else():
+                    m.d.sync += [
+                        last_adr.eq(bus.adr),
+                        last_valid.eq(1),
+                        streaming.eq(self.enable & last_valid & (bus.adr == last_adr + 1)),
+                        head_adr.eq(bus.adr + 1),
+                        next_adr.eq(bus.adr + 1),
+                    ]
+
+        with m.Elif(~fetching & streaming & self.enable & (count < self.depth)):
+            m.d.sync += fetching.eq(1)
+
+        with m.If(self.invalidate):
+            m.d.comb += discard.eq(1)
+            m.d.sync += [
+                last_valid.eq(0),
+                streaming.eq(0),
+                drop.eq(fetching & ~sub_resp),
+            ]
+
+        m.d.sync += count.eq(count + push - pop)
+        with m.If(discard):
+            m.d.comb += self.wasted.eq(count)
+            m.d.sync += [
+                count.eq(0),
+                rd_ptr.eq(0),
+                wr_ptr.eq(0),
+            ]
+
+        with m.If(~bus.cyc):
+            m.d.sync += pending.eq(0)
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishbonePrefetcher(addr_width=30, data_width=32, granularity=8)
+    with open("wb_prefetch.v", "w") as f:
+        f.write(verilog.convert(top))
@@ -0,0 +1,190 @@
+#
+# Wishbone shadow memory. The host pulls the first part of its boot
+# image from flash while the BMC is busy booting too, and every FW read
+# otherwise competes with the BMC CPU for its memory. This holds a copy
+# of a range of words, loaded by the BMC, and once enabled answers reads
+# of that range itself, a cycle after the request, without going to the
+# subordinate.
+#
+# Everything else goes through to the subordinate. Writes to the range
+# go through too, and when it's enabled update the copy once the
+# subordinate acks them, so it stays the same as what's behind it. A
+# write that fails leaves the copy alone. On a pipelined wishbone a read of the range
+# waits for any requests already on the subordinate to finish, so
+# responses stay in order.
+#
+# The load port reads and writes the copy directly, load_dat_r is the
+# word at load_adr a cycle after it's set.
+#
+
+from nmigen import Elaboratable, Memory, Module, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen.back import verilog
+
+
+class WishboneShadow(Elaboratable):
+    """
+    Shadow memory
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+    base : int
+        Wishbone address of the first word of the range.
+    words : int
+        Words in the range.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    enable : Signal, in
+        Answer reads of the range.
+    load_adr, load_dat_w, load_we : Signal, in
+        Word in the range to read or write, data to write, write strobe.
+    load_dat_r : Signal, out
+        Data read.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=(),
+                 base=0, words=1024):
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.base = base
+        self.words = words
+
+        self.enable = Signal()
+        self.load_adr = Signal(range(words))
+        self.load_dat_w = Signal(data_width)
+        self.load_we = Signal()
+        self.load_dat_r = Signal(data_width)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_err = hasattr(bus, "err")
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+        granularity = len(bus.dat_w) // len(bus.sel)
+
+        mem = Memory(width=len(bus.dat_r), depth=self.words)
+        m.submodules.rdport = rdport = mem.read_port(transparent=False)
+        m.submodules.load_rdport = load_rdport = mem.read_port(transparent=False)
+        m.submodules.wrport = wrport = mem.write_port(granularity=granularity)
+
+        offset = Signal(range(self.words))
+        in_range = Signal()
+        m.d.comb += [
+            offset.eq(bus.adr - self.base),
+            in_range.eq((bus.adr >= self.base) & (bus.adr < self.base + self.words)),
+            rdport.addr.eq(offset),
+            load_rdport.addr.eq(self.load_adr),
+            self.load_dat_r.eq(load_rdport.data),
+        ]
+
+        resp = Signal()  # Answering a read of the range
+        pending = Signal()  # Pipelined request waiting for its response
+        # and if it's a write to the copy, what to write once it's acked
+        wr_copy = Signal()
+        wr_offset = Signal.like(offset)
+        wr_dat = Signal.like(bus.dat_w)
+        wr_sel = Signal.like(bus.sel)
+
+        if has_stall:
+            m.d.comb += bus.stall.eq(1)
+
+        with m.If(resp):
+            m.d.comb += [
+                bus.dat_r.eq(rdport.data),
+                bus.ack.eq(bus.cyc),
+            ]
+            m.d.sync += resp.eq(0)
+
+        with m.Elif(bus.cyc & bus.stb & ~bus.we & self.enable & in_range & ~pending):
+            if has_stall:
+                m.d.comb += bus.stall.eq(0)
+            m.d.sync += resp.eq(1)
+
+        with m.Elif(bus.cyc & (bus.stb | pending)):
+            m.d.comb += [
+                sub.adr.eq(bus.adr),
+                sub.dat_w.eq(bus.dat_w),
+                sub.sel.eq(bus.sel),
+                sub.we.eq(bus.we),
+                sub.cyc.eq(bus.cyc),
+                sub.stb.eq(bus.stb & ~pending),
+                bus.dat_r.eq(sub.dat_r),
+                bus.ack.eq(sub.ack),
+            ]
+            if has_err:
+                m.d.comb += bus.err.eq(sub.err)
+            if has_cti:
+                m.d.comb += [
+                    sub.cti.eq(bus.cti),
+                    sub.bte.eq(bus.bte),
+                ]
+
+            # The copy is only updated once the subordinate has acked
+            # the write. A pipelined write is taken when not stalled,
+            # so it's held until its response comes back.
+            copy = bus.we & self.enable & in_range
+            sub_resp = sub.ack | sub.err if has_err else sub.ack
+            if has_stall:
+                m.d.comb += bus.stall.eq(sub.stall | pending)
+                taken = sub.stb & ~sub.stall
+                with m.If(taken & ~sub_resp):
+                    m.d.sync += [
+                        pending.eq(1),
+                        wr_copy.eq(copy),
+                        wr_offset.eq(offset),
+                        wr_dat.eq(bus.dat_w),
+                        wr_sel.eq(bus.sel),
+                    ]
+                with m.If(sub_resp):
+                    m.d.sync += [
+                        pending.eq(0),
+                        wr_copy.eq(0),
+                    ]
+                with m.If(sub.ack & pending & wr_copy):
+                    m.d.comb += [
+                        wrport.addr.eq(wr_offset),
+                        wrport.data.eq(wr_dat),
+                        wrport.en.eq(wr_sel),
+                    ]
+                ack_now = taken & sub.ack
+            else:
+                ack_now = sub.ack
+
+            with m.If(ack_now & copy):
+                m.d.comb += [
+                    wrport.addr.eq(offset),
+                    wrport.data.eq(bus.dat_w),
+                    wrport.en.eq(bus.sel),
+                ]
+
+        with m.If(self.load_we):
+            m.d.comb += [
+                wrport.addr.eq(self.load_adr),
+                wrport.data.eq(self.load_dat_w),
+                wrport.en.eq(~0),
+            ]
+
+        with m.If(~bus.cyc):
+            m.d.sync += [
+                pending.eq(0),
+                wr_copy.eq(0),
+            ]
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishboneShadow(addr_width=30, data_width=32, granularity=8)
+    with open("wb_shadow.v", "w") as f:
+        f.write(verilog.convert(top))
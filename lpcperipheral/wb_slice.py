@@ -0,0 +1,137 @@
+#
+# Registered wishbone stage. Everything going through it, both the
+# request from the master and the ack and data coming back, comes out
+# of a register, which breaks up long combinatorial paths for a
+# cycle of latency each way.
+#
+# One request is in flight at a time. If the master drops cyc before
+# the ack comes back, the request is dropped downstream too and any
+# ack for it is thrown away.
+#
+# With the stall feature both sides are pipelined. The master is
+# stalled while a request is in flight, and the request is only held
+# downstream until the subordinate takes it.
+#
+# With the cti feature (and bte) the burst tags go through with the
+# request, and cyc is held between the words of an incrementing burst
+# so the subordinate sees one burst rather than a run of single
+# cycles.
+#
+
+from nmigen import Elaboratable, Module, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType
+from nmigen.back import verilog
+
+
+class WishboneRegSlice(Elaboratable):
+    """
+    Registered wishbone stage
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=()):
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_err = hasattr(bus, "err")
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+
+        # Request in flight. Without bursts that's whenever cyc is
+        # set, with them cyc can be held between requests.
+        if has_cti:
+            busy = Signal()
+        else:
+            busy = sub.cyc
+
+        # Ack or err
+        bus_resp = Signal()
+        sub_resp = Signal()
+        if has_err:
+            m.d.comb += bus_resp.eq(bus.ack | bus.err)
+            m.d.comb += sub_resp.eq(sub.ack | sub.err)
+        else:
+            m.d.comb += bus_resp.eq(bus.ack)
+            m.d.comb += sub_resp.eq(sub.ack)
+
+        if has_stall:
+            # Same condition as taking the next request below
+            m.d.comb += bus.stall.eq(busy | bus_resp)
+            with m.If(~sub.stall):
+                m.d.sync += sub.stb.eq(0)
+
+        # Responses are a single cycle pulse
+        m.d.sync += bus.ack.eq(0)
+        if has_err:
+            m.d.sync += bus.err.eq(0)
+
+        with m.If(~busy):
+            # Take the next request, but not while we are acking the
+            # last one as the master hasn't moved on yet
+            with m.If(bus.cyc & bus.stb & ~bus_resp):
+                m.d.sync += [
+                    sub.adr.eq(bus.adr),
+                    sub.dat_w.eq(bus.dat_w),
+                    sub.sel.eq(bus.sel),
+                    sub.we.eq(bus.we),
+                    sub.cyc.eq(1),
+                    sub.stb.eq(1),
+                ]
+                if has_cti:
+                    m.d.sync += [
+                        sub.cti.eq(bus.cti),
+                        sub.bte.eq(bus.bte),
+                        busy.eq(1),
+                    ]
+            if has_cti:
+                # Between the words of a burst
+                with m.If(~bus.cyc):
+                    m.d.sync += sub.cyc.eq(0)
+        with m.Elif(~bus.cyc):
+            # The master has given up on it
+            m.d.sync += [
+                sub.cyc.eq(0),
+                sub.stb.eq(0),
+            ]
+            if has_cti:
+                m.d.sync += busy.eq(0)
+        with m.Elif(sub_resp):
+            m.d.sync += [
+                sub.cyc.eq(0),
+                sub.stb.eq(0),
+                bus.dat_r.eq(sub.dat_r),
+                bus.ack.eq(sub.ack),
+            ]
+            if has_err:
+                m.d.sync += bus.err.eq(sub.err)
+            if has_cti:
+                # Hold cyc if the burst carries on, an error ends it
+                m.d.sync += [
+                    sub.cyc.eq(sub.ack & (sub.cti == CycleType.INCR_BURST)),
+                    busy.eq(0),
+                ]
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishboneRegSlice(addr_width=30, data_width=32, granularity=8)
+    with open("wb_slice.v", "w") as f:
+        f.write(verilog.convert(top))
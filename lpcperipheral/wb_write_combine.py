@@ -0,0 +1,203 @@
+#
+# Wishbone write combining buffer. Hosts flashing firmware tend to
+# write a byte or two at a time, which would otherwise each be a
+# partial sel write downstream. Partial writes are acked straight away
+# and merged into a one word buffer, which is written out as a single
+# write when:
+#
+#   - the buffered word has all its bytes (full sel)
+#   - a write comes in for a different word
+#   - a read comes in. Reads never get ahead of buffered writes, so
+#     there are no read after write hazards
+#   - nothing has been merged for timeout cycles
+#   - flush is pulsed
+#
+# The last two wait for the master to drop cyc. Full word writes with
+# nothing buffered go straight through (with any burst tags), as do
+# reads once the buffer is empty.
+#
+# Writes are acked before they reach the subordinate, so an error on a
+# buffered write can't go back to the master. err pulses for it instead
+# with the buffered address in err_adr, for the master side to report.
+#
+
+from nmigen import Elaboratable, Module, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface
+from nmigen.back import verilog
+
+
+class WishboneWriteCombiner(Elaboratable):
+    """
+    Write combining buffer
+
+    Parameters
+    ----------
+    addr_width, data_width, granularity, features
+        As for the wishbone Interface, both sides are the same.
+    timeout : int
+        Cycles without a merge before the buffer is written out.
+
+    Attributes
+    ----------
+    bus : WishboneInterface
+        From the master.
+    sub : WishboneInterface
+        To the subordinate.
+    flush : Signal, in
+        Write out the buffer.
+    valid : Signal, out
+        The buffer holds a write.
+    err : Signal, out
+        Writing the buffer out failed.
+    err_adr : Signal, out
+        Address of the buffered write.
+    """
+    def __init__(self, *, addr_width, data_width, granularity=None, features=(), timeout=64):
+        self.bus = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.sub = WishboneInterface(addr_width=addr_width, data_width=data_width,
+                                     granularity=granularity, features=features)
+        self.timeout = timeout
+
+        self.flush = Signal()
+        self.valid = Signal()
+        self.err = Signal()
+        self.err_adr = Signal(addr_width)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bus = self.bus
+        sub = self.sub
+        has_err = hasattr(bus, "err")
+        has_stall = hasattr(bus, "stall")
+        has_cti = hasattr(bus, "cti")
+        lanes = len(bus.sel)
+        lane_width = len(bus.dat_w) // lanes
+        full = (1 << lanes) - 1
+
+        buf_adr = Signal.like(bus.adr)
+        buf_dat = Signal.like(bus.dat_w)
+        buf_sel = Signal.like(bus.sel)
+        valid = self.valid
+
+        flushing = Signal()  # Writing the buffer out
+        sent = Signal()  # and the subordinate has taken it
+        acked = Signal()  # Acking a merged write
+        flush_req = Signal()
+        timer = Signal(range(self.timeout + 1))
+
+        merge = Signal()
+        flush_now = Signal()
+        passthru = Signal()
+
+        idle = Signal()
+        m.d.comb += idle.eq(bus.cyc & ~flushing & ~acked)
+        with m.If(idle & bus.stb):
+            with m.If(bus.we & ((valid & (bus.adr == buf_adr)) |
+                                (~valid & (bus.sel != full)))):
+                m.d.comb += merge.eq(1)
+            with m.Elif(valid):
+                m.d.comb += flush_now.eq(1)
+            with m.Else():
+                m.d.comb += passthru.eq(1)
+        with m.Elif(idle & ~valid):
+            # Between the words of a burst, or waiting for pipelined
+            # responses
+            m.d.comb += passthru.eq(1)
+
+        if has_stall:
+            m.d.comb += bus.stall.eq(1)
+            with m.If(merge):
+                m.d.comb += bus.stall.eq(0)
+        m.d.comb += bus.ack.eq(acked)
+
+        with m.If(passthru):
+            m.d.comb += [
+                sub.adr.eq(bus.adr),
+                sub.dat_w.eq(bus.dat_w),
+                sub.sel.eq(bus.sel),
+                sub.we.eq(bus.we),
+                sub.cyc.eq(bus.cyc),
+                sub.stb.eq(bus.stb),
+                bus.dat_r.eq(sub.dat_r),
+                bus.ack.eq(sub.ack),
+            ]
+            if has_err:
+                m.d.comb += bus.err.eq(sub.err)
+            if has_stall:
+                m.d.comb += bus.stall.eq(sub.stall)
+            if has_cti:
+                m.d.comb += [
+                    sub.cti.eq(bus.cti),
+                    sub.bte.eq(bus.bte),
+                ]
+        with m.Elif(flushing):
+            m.d.comb += [
+                sub.adr.eq(buf_adr),
+                sub.dat_w.eq(buf_dat),
+                sub.sel.eq(buf_sel),
+                sub.we.eq(1),
+                sub.cyc.eq(1),
+                sub.stb.eq(~sent),
+            ]
+
+        # Merge partial writes into the buffer, ack them on the next
+        # cycle
+        m.d.sync += acked.eq(merge)
+        new_sel = Signal.like(bus.sel)
+        m.d.comb += new_sel.eq(bus.sel)
+        with m.If(valid):
+            m.d.comb += new_sel.eq(buf_sel | bus.sel)
+        with m.If(merge):
+            m.d.sync += [
+                buf_adr.eq(bus.adr),
+                buf_sel.eq(new_sel),
+                valid.eq(1),
+                flushing.eq(new_sel == full),
+                timer.eq(0),
+            ]
+            # Start a new buffer afresh, so the unused lanes don't
+            # have stale data from the last word
+            for i in range(lanes):
+                with m.If(bus.sel[i] | ~valid):
+                    m.d.sync += buf_dat.word_select(i, lane_width).eq(
+                        bus.dat_w.word_select(i, lane_width))
+        with m.Elif(valid & ~flushing & (timer != self.timeout)):
+            m.d.sync += timer.eq(timer + 1)
+
+        with m.If(self.flush):
+            m.d.sync += flush_req.eq(1)
+        with m.If(valid & ~flushing & (flush_now |
+                                      (~bus.cyc & (flush_req | (timer == self.timeout))))):
+            m.d.sync += [
+                flushing.eq(1),
+                flush_req.eq(0),
+            ]
+        with m.If(~valid):
+            m.d.sync += flush_req.eq(0)
+
+        with m.If(flushing):
+            if has_stall:
+                with m.If(sub.stb & ~sub.stall):
+                    m.d.sync += sent.eq(1)
+            sub_resp = sub.ack
+            if has_err:
+                sub_resp = sub_resp | sub.err
+            with m.If(sub_resp):
+                m.d.sync += [
+                    flushing.eq(0),
+                    sent.eq(0),
+                    valid.eq(0),
+                ]
+            if has_err:
+                m.d.comb += self.err.eq(sub.err)
+        m.d.comb += self.err_adr.eq(buf_adr)
+
+        return m
+
+
+if __name__ == "__main__":
+    top = WishboneWriteCombiner(addr_width=30, data_width=32, granularity=8)
+    with open("wb_write_combine.v", "w") as f:
+        f.write(verilog.convert(top))
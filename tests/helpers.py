@@ -1,15 +1,23 @@
 import unittest
 
+from nmigen.sim import Settle
+
 START_IO   = 0b0000
 START_FWRD = 0b1101
 START_FWWR = 0b1110
 
-CYCLE_IOWRITE = 0b0010
-CYCLE_IOREAD  = 0b0000
+CYCLE_IOWRITE  = 0b0010
+CYCLE_IOREAD   = 0b0000
+CYCLE_MEMWRITE = 0b0110
+CYCLE_MEMREAD  = 0b0100
 
 SYNC_READY      = 0b0000
 SYNC_SHORT_WAIT = 0b0101
 SYNC_LONG_WAIT  = 0b0110
+SYNC_ERROR      = 0b1010
+
+SERIRQ_SLOTS = 32
+SERIRQ_START_CYCLES = 4
 
 class Helpers:
     def wishbone_write(self, wb, addr, data, sel=1, delay=1):
@@ -49,12 +57,45 @@ class Helpers:
             yield
 
         self.assertEqual((yield wb.ack), 1)
-        self.assertEqual((yield wb.dat_r), expected)
+        if expected is not None:
+            self.assertEqual((yield wb.dat_r), expected)
         yield wb.cyc.eq(0)
         yield wb.stb.eq(0)
         yield wb.sel.eq(0)
         # Shouldn't need to clear dat and adr, so leave it
 
+    # Back to back accesses on a pipelined wishbone. ops is a list of
+    # (addr, data), data is None for reads. Returns the read data (None
+    # for writes) and the number of clocks it took.
+    def wishbone_pipelined(self, wb, ops, sel=1, timeout=100):
+        yield wb.cyc.eq(1)
+        yield wb.sel.eq(sel)
+        todo = list(ops)
+        results = []
+        clocks = 0
+        while len(results) < len(ops):
+            if todo:
+                addr, data = todo[0]
+                yield wb.adr.eq(addr)
+                yield wb.we.eq(data is not None)
+                if data is not None:
+                    yield wb.dat_w.eq(data)
+            yield wb.stb.eq(len(todo) > 0)
+            yield Settle()
+            if todo and not (yield wb.stall):
+                todo.pop(0)
+            if (yield wb.ack):
+                addr, data = ops[len(results)]
+                results.append(None if data is not None else (yield wb.dat_r))
+            yield
+            clocks += 1
+            self.assertLess(clocks, timeout)
+        yield wb.cyc.eq(0)
+        yield wb.stb.eq(0)
+        yield wb.we.eq(0)
+        yield wb.sel.eq(0)
+        return results, clocks
+
     # Partial transaction. Useful to test reset cases
     def lpc_io_read_partial(self, lpc, cycles):
         # Once driven things should start moving
@@ -104,10 +145,12 @@ class Helpers:
 
         # Sync cycles
         yield
-        while (yield lpc.lad_out) == SYNC_LONG_WAIT:
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
             lad = yield lpc.lad_out
             # print("Write SYNC wait: LAD:0x%x" % (lad))
             self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
             yield
         self.assertEqual((yield lpc.lad_en), 1)
         self.assertEqual((yield lpc.lad_out), SYNC_READY)
@@ -120,6 +163,9 @@ class Helpers:
         yield
         self.assertEqual((yield lpc.lad_en), 0)
 
+        return waits
+
+
     def lpc_io_read(self, lpc, addr, data):
         # Once driven things should start moving
         yield lpc.lframe.eq(0)
@@ -146,10 +192,12 @@ class Helpers:
 
         # Sync cycles
         yield
-        while (yield lpc.lad_out) == SYNC_LONG_WAIT:
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
             lad = yield lpc.lad_out
             # print("Read SYNC wait: LAD:0x%x" % (lad))
             self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
             yield
         self.assertEqual((yield lpc.lad_en), 1)
         self.assertEqual((yield lpc.lad_out), SYNC_READY)
@@ -169,8 +217,159 @@ class Helpers:
         yield
         self.assertEqual((yield lpc.lad_en), 0)
 
-    def lpc_fw_write(self, lpc, addr, data, size):
-        assert ((size == 4) | (size == 2) | (size == 1))
+        return waits
+
+
+    # IO read that should end in a SYNC ERROR. Returns the wait SYNCs
+    # seen before the error.
+    def lpc_io_read_error(self, lpc, addr):
+        # Once driven things should start moving
+        yield lpc.lframe.eq(0)
+        yield lpc.lad_in.eq(START_IO)
+        yield
+
+        yield lpc.lframe.eq(1)
+        yield lpc.lad_in.eq(CYCLE_IOREAD)
+        yield
+
+        # 16 bits of addr, little endian, least significant nibble first
+        for i in reversed(range(0, 16, 4)):
+            x = (addr >> i) & 0xf
+            yield lpc.lad_in.eq(x)
+            yield
+
+        # TAR1 2 cycles
+        yield lpc.lad_in.eq(0x1) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+        yield lpc.lad_in.eq(0x2) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        # Sync cycles
+        yield
+        syncs = []
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
+            self.assertEqual((yield lpc.lad_en), 1)
+            syncs.append((yield lpc.lad_out))
+            yield
+        self.assertEqual((yield lpc.lad_en), 1)
+        self.assertEqual((yield lpc.lad_out), SYNC_ERROR)
+
+        # LAD released straight away, no TAR2
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        return syncs
+
+
+    def lpc_mem_write(self, lpc, addr, data):
+        # Once driven things should start moving
+        yield lpc.lframe.eq(0)
+        yield lpc.lad_in.eq(START_IO)
+        yield
+
+        yield lpc.lframe.eq(1)
+        yield lpc.lad_in.eq(CYCLE_MEMWRITE)
+        yield
+
+        # 32 bits of addr, little endian, least significant nibble first
+        for i in reversed(range(0, 32, 4)):
+            x = (addr >> i) & 0xf
+            yield lpc.lad_in.eq(x)
+            yield
+
+        # 8 bits of data, big endian, most significant nibble first
+        for i in range(0, 8, 4):
+            x = (data >> i) & 0xf
+            yield lpc.lad_in.eq(x)
+            yield
+
+        # TAR1 2 cycles
+        yield lpc.lad_in.eq(0x1) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+        yield lpc.lad_in.eq(0x2) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        # Sync cycles
+        yield
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
+            self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
+            yield
+        self.assertEqual((yield lpc.lad_en), 1)
+        self.assertEqual((yield lpc.lad_out), SYNC_READY)
+
+        # TAR2 2 cycles
+        yield
+        self.assertEqual((yield lpc.lad_out), 0b1111)
+        self.assertEqual((yield lpc.lad_en), 1)
+        yield lpc.lad_in.eq(0xa) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        return waits
+
+
+    def lpc_mem_read(self, lpc, addr, data):
+        # Once driven things should start moving
+        yield lpc.lframe.eq(0)
+        yield lpc.lad_in.eq(START_IO)
+        yield
+
+        yield lpc.lframe.eq(1)
+        yield lpc.lad_in.eq(CYCLE_MEMREAD)
+        yield
+
+        # 32 bits of addr, little endian, least significant nibble first
+        for i in reversed(range(0, 32, 4)):
+            x = (addr >> i) & 0xf
+            yield lpc.lad_in.eq(x)
+            yield
+
+        # TAR1 2 cycles
+        yield lpc.lad_in.eq(0x1) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+        yield lpc.lad_in.eq(0x2) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        # Sync cycles
+        yield
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
+            self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
+            yield
+        self.assertEqual((yield lpc.lad_en), 1)
+        self.assertEqual((yield lpc.lad_out), SYNC_READY)
+
+        # 8 bits of data, big endian, most significant nibble first
+        for i in range(0, 8, 4):
+            yield
+            x = (data >> i) & 0xf
+            self.assertEqual((yield lpc.lad_out), x)
+            self.assertEqual((yield lpc.lad_en), 1)
+
+        # TAR2 2 cycles
+        yield
+        self.assertEqual((yield lpc.lad_en), 1)
+        self.assertEqual((yield lpc.lad_out), 0b1111)
+        yield lpc.lad_in.eq(0xa) # eyecatcher
+        yield
+        self.assertEqual((yield lpc.lad_en), 0)
+
+        return waits
+
+
+    # With error the back end is expected to fail the cycle, so it ends
+    # with a SYNC ERROR
+    def lpc_fw_write(self, lpc, addr, data, size, error=False):
+        assert size in (1, 2, 4, 16, 128)
         # Once driven things should start moving
         yield lpc.lframe.eq(0)
         yield lpc.lad_in.eq(START_FWWR)
@@ -193,6 +392,10 @@ class Helpers:
             yield lpc.lad_in.eq(0b0001)
         elif (size == 4):
             yield lpc.lad_in.eq(0b0010)
+        elif (size == 16):
+            yield lpc.lad_in.eq(0b0100)
+        elif (size == 128):
+            yield lpc.lad_in.eq(0b0111)
         else:
             assert(0)
         yield
@@ -213,12 +416,20 @@ class Helpers:
 
         # Sync cycles
         yield
-        while (yield lpc.lad_out) == SYNC_LONG_WAIT:
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
             lad = yield lpc.lad_out
             # print("Write SYNC wait: LAD:0x%x" % (lad))
             self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
             yield
         self.assertEqual((yield lpc.lad_en), 1)
+        if error:
+            self.assertEqual((yield lpc.lad_out), SYNC_ERROR)
+            # LAD released straight away, no TAR2
+            yield
+            self.assertEqual((yield lpc.lad_en), 0)
+            return waits
         self.assertEqual((yield lpc.lad_out), SYNC_READY)
 
         # TAR2 2 cycles
@@ -229,8 +440,11 @@ class Helpers:
         yield
         self.assertEqual((yield lpc.lad_en), 0)
 
-    def lpc_fw_read(self, lpc, addr, data, size):
-        assert ((size == 4) | (size == 2) | (size == 1))
+        return waits
+
+
+    def lpc_fw_read(self, lpc, addr, data, size, error=False):
+        assert size in (1, 2, 4, 16, 128)
         # Once driven things should start moving
         yield lpc.lframe.eq(0)
         yield lpc.lad_in.eq(START_FWRD)
@@ -253,6 +467,10 @@ class Helpers:
             yield lpc.lad_in.eq(0b0001)
         elif (size == 4):
             yield lpc.lad_in.eq(0b0010)
+        elif (size == 16):
+            yield lpc.lad_in.eq(0b0100)
+        elif (size == 128):
+            yield lpc.lad_in.eq(0b0111)
         else:
             assert(0)
         yield
@@ -267,15 +485,22 @@ class Helpers:
 
         # Sync cycles
         yield
-        while (yield lpc.lad_out) == SYNC_LONG_WAIT:
+        waits = 0
+        while (yield lpc.lad_out) in (SYNC_SHORT_WAIT, SYNC_LONG_WAIT):
             lad = yield lpc.lad_out
             # print("Read SYNC wait: LAD:0x%x" % (lad))
             self.assertEqual((yield lpc.lad_en), 1)
+            waits += 1
             yield
         self.assertEqual((yield lpc.lad_en), 1)
+        if error:
+            self.assertEqual((yield lpc.lad_out), SYNC_ERROR)
+            yield
+            self.assertEqual((yield lpc.lad_en), 0)
+            return waits
         self.assertEqual((yield lpc.lad_out), SYNC_READY)
 
-        # 32 bits of data, big endian, most significant nibble first
+        # size*8 bits of data, big endian, most significant nibble first
         for i in range(0, size*8, 4):
             yield
             x = (data >> i) & 0xf
@@ -289,3 +514,60 @@ class Helpers:
         yield lpc.lad_in.eq(0xa) # eyecatcher
         yield
         self.assertEqual((yield lpc.lad_en), 0)
+
+        return waits
+
+    # Emulate the host side of SERIRQ. host is the level the host drives
+    # (1 for tristate), the peripheral can pull it low or drive it high.
+    def serirq_cycle(self, dut, host=1):
+        yield Settle()
+        en = yield dut.serirq_en
+        out = yield dut.serirq_out
+        line = host & (out if en else 1)
+        yield dut.serirq_in.eq(line)
+        yield
+        return line
+
+    # Run a SERIRQ frame and return the level sampled in each IRQ slot.
+    # start is the number of start frame clocks the host drives.
+    def serirq_frame(self, dut, stop, start=SERIRQ_START_CYCLES):
+        for _ in range(start):
+            yield from self.serirq_cycle(dut, 0)
+        yield from self.serirq_cycle(dut, 1)  # Recovery
+        yield from self.serirq_cycle(dut, 1)  # Turnaround
+
+        samples = []
+        for _ in range(SERIRQ_SLOTS):
+            samples.append((yield from self.serirq_cycle(dut, 1)))  # Sample
+            yield from self.serirq_cycle(dut, 1)  # Recovery
+            yield from self.serirq_cycle(dut, 1)  # Turnaround
+
+        for _ in range(stop):
+            yield from self.serirq_cycle(dut, 0)
+        yield from self.serirq_cycle(dut, 1)  # Recovery
+        yield from self.serirq_cycle(dut, 1)  # Turnaround
+        return samples
+
+    # SERIRQ samples with the given slots driven low
+    def serirq_expected(self, driven):
+        return [0 if slot in driven else 1 for slot in range(SERIRQ_SLOTS)]
+
+    # Snapshot the LPCStats counters and wait for it to finish
+    def lpc_stats_snapshot(self, wb, base=0):
+        # Note CSRs have an extra cycle before ack, hence delay=2
+        yield from self.wishbone_write(wb, base, 1, delay=2)
+        yield
+        busy = 1
+        while busy:
+            yield wb.adr.eq(base)
+            yield wb.cyc.eq(1)
+            yield wb.stb.eq(1)
+            yield wb.sel.eq(0xf)
+            for i in range(3):
+                yield
+            self.assertEqual((yield wb.ack), 1)
+            busy = yield wb.dat_r
+            yield wb.cyc.eq(0)
+            yield wb.stb.eq(0)
+            yield wb.sel.eq(0)
+            yield
@@ -4,6 +4,7 @@ from nmigen.sim import Simulator
 
 from lpcperipheral.io_space import IOSpace
 from lpcperipheral.ipmi_bt import RegEnum, BMCRegEnum
+from lpcperipheral.postcode import BMCRegEnum as PostCodeBMCRegEnum
 
 from .helpers import Helpers
 
@@ -58,6 +59,66 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("test_io_space_ipmi_bt.vcd"):
             sim.run()
 
+    def test_io_space_postcode(self):
+        def bench():
+            yield
+
+            # POST codes are acked without an error and queued for the BMC
+            yield from self.wishbone_write(self.dut.target_wb, 0x80, 0x5a)
+            self.assertEqual((yield self.dut.target_wb.err), 0)
+            yield
+            yield from self.wishbone_read(self.dut.bmc_wb, 0x4000//4 + PostCodeBMCRegEnum.CODE,
+                                          (1 << 31) | 0x5a)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_io_space_postcode.vcd"):
+            sim.run()
+
+    def test_io_space_pipelined(self):
+        self.dut = IOSpace(pipelined=True)
+
+        def bench():
+            yield
+
+            # Back to back BMC writes to the VUART
+            results, clocks = yield from self.wishbone_pipelined(
+                self.dut.bmc_wb, [(0x0 // 4, 0x10 + i) for i in range(4)])
+            self.assertEqual(clocks, 5)
+            yield
+
+            # Target side runs one access at a time
+            for i in range(4):
+                results, _ = yield from self.wishbone_pipelined(self.dut.target_wb,
+                                                                [(0x3f8, None)])
+                self.assertEqual(results, [0x10 + i])
+            yield from self.wishbone_pipelined(self.dut.target_wb, [(0x80, 0x5a)])
+            yield
+
+            # Mixed with the classic POST code slave
+            ops = [
+                (0x4000//4 + PostCodeBMCRegEnum.STATUS, None),
+                ((0x0 + (5 * 4)) // 4, None),
+                (0x1000//4 + BMCRegEnum.BMC2HOST_HOST2BMC, 0x43),
+                (0x4000//4 + PostCodeBMCRegEnum.CODE, None),
+                ((0x0 + (7 * 4)) // 4, 0x99),
+                ((0x0 + (7 * 4)) // 4, None),
+            ]
+            results, clocks = yield from self.wishbone_pipelined(self.dut.bmc_wb, ops)
+            self.assertEqual(results, [1, 0x60, None, (1 << 31) | 0x5a, None, 0x99])
+            yield
+
+            results, _ = yield from self.wishbone_pipelined(
+                self.dut.target_wb, [(0xe4 + RegEnum.BMC2HOST_HOST2BMC, None)])
+            self.assertEqual(results, [0x43])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_io_space_pipelined.vcd"):
+            sim.run()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -73,6 +73,39 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("test_ipmi_bt_fifo.vcd"):
             sim.run()
 
+    def test_pipelined(self):
+        self.dut = IPMI_BT(depth=64, pipelined=True)
+
+        def bench():
+            yield
+
+            # BMC fills the FIFO back to back, including one too many
+            # which is dropped, then the target drains it back to back
+            ops = [(BMCRegEnum.BMC2HOST_HOST2BMC, i) for i in range(65)]
+            results, clocks = yield from self.wishbone_pipelined(self.dut.bmc_wb, ops)
+            self.assertEqual(clocks, len(ops) + 1)
+            yield
+
+            ops = [(RegEnum.BMC2HOST_HOST2BMC, None)] * 65
+            results, clocks = yield from self.wishbone_pipelined(self.dut.target_wb, ops)
+            self.assertEqual(results, list(range(64)) + [0])
+            self.assertEqual(clocks, len(ops) + 1)
+
+            # Same the other way, with a FIFO clear in the middle
+            ops = ([(RegEnum.BMC2HOST_HOST2BMC, 0x5a)] * 4 + [(RegEnum.BT_CTRL, 0x1)] +
+                   [(RegEnum.BMC2HOST_HOST2BMC, i) for i in range(4)])
+            yield from self.wishbone_pipelined(self.dut.target_wb, ops)
+            yield
+            ops = [(BMCRegEnum.BMC2HOST_HOST2BMC, None)] * 5
+            results, clocks = yield from self.wishbone_pipelined(self.dut.bmc_wb, ops)
+            self.assertEqual(results, [0, 1, 2, 3, 0])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_ipmi_bt_pipelined.vcd"):
+            sim.run()
+
     def test_ctrl(self):
         def bench():
             # Init value for BT_CTRL
@@ -4,7 +4,9 @@ from nmigen import Elaboratable, Module, Signal
 from nmigen_soc.wishbone import Interface as WishboneInterface
 from nmigen.sim import Simulator
 
+from lpcperipheral.lpcfront import LPCCycletype
 from lpcperipheral.lpcperipheral import LPCPeripheral
+from lpcperipheral.lpc_stats import STATS_CYCLETYPE, STATS_ABORT
 
 from .ROM import ROM
 from .helpers import Helpers
@@ -25,8 +27,11 @@ LPC_FW_TESTS = 2
 
 
 class LPC_AND_ROM(Elaboratable):
-    def __init__(self):
-        self.bmc_wb = WishboneInterface(data_width=32, addr_width=14, granularity=8)
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.pipelined = kwargs.get("pipelined", False)
+        self.bmc_wb = WishboneInterface(data_width=32, addr_width=14, granularity=8,
+                                        features=["stall"] if self.pipelined else [])
 
         # LPC bus
         self.lclk  = Signal()
@@ -35,6 +40,9 @@ class LPC_AND_ROM(Elaboratable):
         self.lad_out = Signal(4)
         self.lad_en = Signal()
         self.lreset = Signal()
+        self.serirq_in = Signal(reset=1)
+        self.serirq_out = Signal()
+        self.serirq_en = Signal()
 
         # Interrupts
         self.bmc_vuart_irq = Signal()
@@ -46,7 +54,7 @@ class LPC_AND_ROM(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.lpc = lpc = LPCPeripheral()
+        m.submodules.lpc = lpc = LPCPeripheral(**self.kwargs)
 
         m.d.comb += [
             # BMC wishbone
@@ -66,6 +74,9 @@ class LPC_AND_ROM(Elaboratable):
             self.lad_out.eq(lpc.lad_out),
             self.lad_en.eq(lpc.lad_en),
             lpc.lreset.eq(self.lreset),
+            lpc.serirq_in.eq(self.serirq_in),
+            self.serirq_out.eq(lpc.serirq_out),
+            self.serirq_en.eq(lpc.serirq_en),
         ]
 
         # Initialize ROM with the offset so we can easily determine if we are
@@ -79,12 +90,27 @@ class LPC_AND_ROM(Elaboratable):
             rom.dat_w.eq(lpc.dma_dat_w),
             rom.sel.eq(lpc.dma_sel),
             rom.cyc.eq(lpc.dma_cyc),
-            rom.stb.eq(lpc.dma_stb),
             rom.we.eq(lpc.dma_we),
             lpc.dma_dat_r.eq(rom.dat_r),
-            lpc.dma_ack.eq(rom.ack),
         ]
 
+        if self.pipelined:
+            # The ROM is classic, hold each request until it's acked and
+            # drop stb for a cycle after so it sees the next one
+            gap = Signal()
+            m.d.sync += gap.eq(rom.stb & rom.ack)
+            m.d.comb += [
+                self.bmc_wb.stall.eq(lpc.stall),
+                rom.stb.eq(lpc.dma_stb & ~gap),
+                lpc.dma_stall.eq(~(rom.stb & rom.ack)),
+                lpc.dma_ack.eq(rom.stb & rom.ack),
+            ]
+        else:
+            m.d.comb += [
+                rom.stb.eq(lpc.dma_stb),
+                lpc.dma_ack.eq(rom.ack),
+            ]
+
         return m
 
 wb_read_go = 0
@@ -148,5 +174,288 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("test_lpc.vcd"):
             sim.run()
 
+    def test_mem_read(self):
+        def bench():
+            global wb_read_go
+            # Point the FW window at the ROM. The ROM is 128 words so
+            # only keep the bottom 9 bits of the address
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.bmc_wb, 0x2000>>2, 0x0, delay=2)
+            yield from self.wishbone_write(self.dut.bmc_wb, (0x2000>>2) + 2, 0x1ff, delay=2)
+            wb_read_go = 1
+
+        def lbench():
+            global wb_read_go
+            wb_read_go = 0
+            yield
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            while wb_read_go == 0:
+                yield
+
+            # MEM cycles are translated the same way as FW cycles. The
+            # ROM holds its word offset in each word.
+            yield from self.lpc_mem_read(self.dut, 0xfffff014, 0x5)
+            yield from self.lpc_mem_read(self.dut, 0xfffff015, 0x0)
+            yield from self.lpc_mem_read(self.dut, 0xfc0001fc, 0x7f)
+            yield from self.lpc_fw_read(self.dut, 0x0000014, 0x5, 4)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_mem_read.vcd"):
+            sim.run()
+
+    def test_pipelined(self):
+        self.dut = LPC_AND_ROM(pipelined=True)
+
+        def bench():
+            global wb_read_go
+            # Point the FW window at the ROM
+            yield from self.wishbone_pipelined(self.dut.bmc_wb, [(0x2000>>2, 0x0),
+                                                                 ((0x2000>>2) + 2, 0x1ff)])
+            wb_read_go = 1
+            while wb_read_go == 1:
+                yield
+
+            # Back to back reads of the IPMI BT FIFO and BT_CTRL
+            results, _ = yield from self.wishbone_pipelined(self.dut.bmc_wb,
+                                                            [(0x1014>>2, None)] * 3 +
+                                                            [(0x1010>>2, None)])
+            self.assertEqual(results, [0x65, 0x48, 0, 0x4])
+
+        def lbench():
+            global wb_read_go
+            wb_read_go = 0
+            yield
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            while wb_read_go == 0:
+                yield
+
+            # The ROM holds its word offset in each word
+            data = sum((5 + i) << (32 * i) for i in range(4))
+            yield from self.lpc_fw_read(self.dut, 0x0000014, data, 16)
+
+            yield from self.lpc_io_write(self.dut, 0xe5, 0x65)
+            yield from self.lpc_io_write(self.dut, 0xe5, 0x48)
+            yield from self.lpc_io_write(self.dut, 0xe4, 0x4)
+            wb_read_go = 0
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_pipelined.vcd"):
+            sim.run()
+
+    def test_shadow_status(self):
+        # With shadow_status the host reads the UART LSR and BT_CTRL from
+        # copies in the LPC clock domain, check they track the real ones
+        self.dut = LPC_AND_ROM(shadow_status=True)
+        wb_read_go = 0
+
+        def bench():
+            nonlocal wb_read_go
+            while wb_read_go == 0:
+                yield
+            # BMC sends a character to the host
+            yield from self.wishbone_write(self.dut.bmc_wb, 0x0, 0x41)
+            wb_read_go = 0
+
+        def lbench():
+            nonlocal wb_read_go
+            yield
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            # THRE and TEMT are always set
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x60)
+            wb_read_go = 1
+            while wb_read_go == 1:
+                yield
+            for _ in range(4):
+                yield
+            # Data ready
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x61)
+            yield from self.lpc_io_read(self.dut, 0x3f8, 0x41)
+            for _ in range(4):
+                yield
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x60)
+
+            # Set H2B_ATN and read it back
+            yield from self.lpc_io_read(self.dut, 0xe4, 0x00)
+            yield from self.lpc_io_write(self.dut, 0xe4, 0x04)
+            for _ in range(4):
+                yield
+            yield from self.lpc_io_read(self.dut, 0xe4, 0x04)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_shadow_status.vcd"):
+            sim.run()
+
+    def test_serirq(self):
+        wb_read_go = 0
+
+        def bench():
+            nonlocal wb_read_go
+            # Send the UART IRQ in slot 4 and the IPMI BT IRQ in slot 10
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.bmc_wb, (0x2000>>2) + 8, 0x8a84, delay=2)
+            wb_read_go = 1
+
+        def lbench():
+            nonlocal wb_read_go
+            yield
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            while wb_read_go == 0:
+                yield
+            for _ in range(4):
+                yield
+
+            # No IRQs, so both slots are driven low
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([4, 10]))
+
+            # Enable the UART THR empty IRQ
+            yield from self.lpc_io_write(self.dut, 0x3f9, 0x2)
+            for _ in range(8):
+                yield
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([10]))
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_serirq.vcd"):
+            sim.run()
+
+    def test_stats(self):
+        self.dut = LPC_AND_ROM(stats=True)
+        lpc_done = 0
+
+        def bench():
+            nonlocal lpc_done
+            while not lpc_done:
+                yield
+            yield from self.lpc_stats_snapshot(self.dut.bmc_wb, 0x3000>>2)
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            for cycletype, count in [(LPCCycletype.IORD, 2),
+                                     (LPCCycletype.IOWR, 1),
+                                     (LPCCycletype.FWRD, 0)]:
+                yield from self.wishbone_read(self.dut.bmc_wb,
+                                              (0x3000>>2) + STATS_CYCLETYPE + cycletype.value,
+                                              count, delay=2)
+                yield
+            yield from self.wishbone_read(self.dut.bmc_wb, (0x3000>>2) + STATS_ABORT,
+                                          0, delay=2)
+
+        def lbench():
+            nonlocal lpc_done
+            # Don't start a bogus cycle out of reset
+            yield self.dut.lframe.eq(1)
+            yield
+            yield self.dut.lreset.eq(1)
+            yield
+
+            yield from self.lpc_io_write(self.dut, 0x3f9, 0x1)
+            yield from self.lpc_io_read(self.dut, 0x3f9, 0x1)
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x60)
+            lpc_done = 1
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_stats.vcd"):
+            sim.run()
+
+    def test_trace(self):
+        self.dut = LPC_AND_ROM(trace_depth=16)
+        trace = 0x8000>>2
+        trace_buf = trace + 16 * 4
+        lpc_go = 0
+
+        def bench():
+            nonlocal lpc_go
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.bmc_wb, trace, 0x1, delay=2)
+            lpc_go = 1
+            while lpc_go:
+                yield
+            yield from self.wishbone_write(self.dut.bmc_wb, trace, 0x0, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.bmc_wb, trace + 2, 2, delay=2)
+            yield
+
+            # IO write of 0x01 to 0x3f9, IO read of 0x60 from 0x3fd
+            for entry, (addr, data, info) in enumerate([
+                    (0x3f9, 0x01, LPCCycletype.IOWR.value << 24),
+                    (0x3fd, 0x60, LPCCycletype.IORD.value << 24)]):
+                yield from self.wishbone_read(self.dut.bmc_wb, trace_buf + entry * 4 + 1,
+                                              addr)
+                yield
+                yield from self.wishbone_read(self.dut.bmc_wb, trace_buf + entry * 4 + 2,
+                                              data)
+                yield
+                # Ignore the number of waits
+                yield from self.wishbone_read(self.dut.bmc_wb, trace_buf + entry * 4 + 3,
+                                              None)
+                self.assertEqual((yield self.dut.bmc_wb.dat_r) & 0xffff0000, info)
+                yield
+
+        def lbench():
+            nonlocal lpc_go
+            yield self.dut.lframe.eq(1)
+            yield
+            yield self.dut.lreset.eq(1)
+            yield
+
+            while not lpc_go:
+                yield
+            for _ in range(4):
+                yield
+            yield from self.lpc_io_write(self.dut, 0x3f9, 0x1)
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x60)
+            lpc_go = 0
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_clock(3e-8, domain="lclkrst")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+
+        with sim.write_vcd("test_lpc_trace.vcd"):
+            sim.run()
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,20 +1,28 @@
 import unittest
 import random
 
-from nmigen.sim import Simulator
+from nmigen import Elaboratable, Module
+from nmigen.sim import Simulator, Passive, Settle
+from nmigen_soc.wishbone import CycleType, BurstTypeExt
 
 from lpcperipheral.lpc2wb import lpc2wb
 
-from .helpers import Helpers
+from .helpers import Helpers, SYNC_SHORT_WAIT, SYNC_LONG_WAIT
 
 LPC_IO_TESTS = 16
 LPC_FW_TESTS = 128
+LPC_FW_MULTI_TESTS = 8
+LPC_MEM_TESTS = 32
 
 addr = 0
 data = 0
 size = 0
 
 class TestSum(unittest.TestCase, Helpers):
+    # Partial transactions are aborted before the command goes to the
+    # back end, so they don't show up on the wishbone
+    partial_cycles = 8
+
     def setUp(self):
         self.dut = lpc2wb()
 
@@ -110,7 +118,7 @@ class TestSum(unittest.TestCase, Helpers):
 
             # Do a bunch of partial transactions at the start to see
             # if it locks up the bus for later transactions
-            for i in range(8):
+            for i in range(self.partial_cycles):
                 yield from self.lpc_io_read_partial(self.dut, i)
 
             for i in range(LPC_FW_TESTS):
@@ -152,6 +160,767 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("lpc2wb_lbench.vcd"):
             sim.run()
 
+    def test_fw_multi_read(self):
+        # 16 and 128 byte FW reads are split into one wishbone read
+        # per word
+        def fw_bench():
+            global addr
+            global data
+            global size
+            for i in range(LPC_FW_MULTI_TESTS):
+                while (yield self.dut.fw_wb.cyc) == 0:
+                    yield
+                for beat in range(size // 4):
+                    while (yield self.dut.fw_wb.cyc) == 0:
+                        yield
+                    yield
+                    self.assertEqual((yield self.dut.fw_wb.we), 0)
+                    self.assertEqual((yield self.dut.fw_wb.sel), 0b1111)
+                    self.assertEqual((yield self.dut.fw_wb.adr), (addr >> 2) + beat)
+                    yield self.dut.fw_wb.dat_r.eq((data >> (32 * beat)) & 0xffffffff)
+                    yield self.dut.fw_wb.ack.eq(1)
+                    yield
+                    yield self.dut.fw_wb.ack.eq(0)
+                    yield
+
+        def lpc_bench():
+            global addr
+            global data
+            global size
+
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            for i in range(LPC_FW_MULTI_TESTS):
+                size = random.choice([16, 128])
+                addr = random.randrange(0x10000000) & ~(size - 1)
+                data = random.randrange(2**(size * 8))
+                yield from self.lpc_fw_read(self.dut, addr, data, size)
+                yield
+                yield
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_fw_multi_read.vcd"):
+            sim.run()
+
+    def test_fw_multi_write(self):
+        # 16 and 128 byte FW writes are split into one wishbone write
+        # per word
+        def fw_bench():
+            global addr
+            global data
+            global size
+            for i in range(LPC_FW_MULTI_TESTS):
+                while (yield self.dut.fw_wb.cyc) == 0:
+                    yield
+                for beat in range(size // 4):
+                    while (yield self.dut.fw_wb.cyc) == 0:
+                        yield
+                    yield
+                    self.assertEqual((yield self.dut.fw_wb.we), 1)
+                    self.assertEqual((yield self.dut.fw_wb.sel), 0b1111)
+                    self.assertEqual((yield self.dut.fw_wb.adr), (addr >> 2) + beat)
+                    self.assertEqual((yield self.dut.fw_wb.dat_w),
+                                     (data >> (32 * beat)) & 0xffffffff)
+                    yield self.dut.fw_wb.ack.eq(1)
+                    yield
+                    yield self.dut.fw_wb.ack.eq(0)
+                    yield
+
+        def lpc_bench():
+            global addr
+            global data
+            global size
+
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            for i in range(LPC_FW_MULTI_TESTS):
+                size = random.choice([16, 128])
+                addr = random.randrange(0x10000000) & ~(size - 1)
+                data = random.randrange(2**(size * 8))
+                yield from self.lpc_fw_write(self.dut, addr, data, size)
+                yield
+                yield
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_fw_multi_write.vcd"):
+            sim.run()
+
+    def test_mem(self):
+        # MEM cycles are single byte FW wishbone cycles with a 32 bit address
+        def fw_bench():
+            global addr
+            global data
+            for i in range(LPC_MEM_TESTS):
+                while (yield self.dut.fw_wb.cyc) == 0:
+                    yield
+                yield
+                self.assertEqual((yield self.dut.fw_wb.adr), addr >> 2)
+                self.assertEqual((yield self.dut.fw_wb.sel), 1 << (addr & 3))
+                if (yield self.dut.fw_wb.we) == 1:
+                    wb = yield self.dut.fw_wb.dat_w
+                    self.assertEqual((wb >> (8 * (addr & 0x3))) & 0xff, data)
+                else:
+                    yield self.dut.fw_wb.dat_r.eq(data << (8 * (addr & 0x3)))
+                yield self.dut.fw_wb.ack.eq(1)
+                yield
+                yield self.dut.fw_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            global addr
+            global data
+
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            for i in range(LPC_MEM_TESTS):
+                addr = random.randrange(0x100000000)
+                data = random.randrange(0x100)
+                if random.randrange(2):
+                    yield from self.lpc_mem_write(self.dut, addr, data)
+                else:
+                    yield from self.lpc_mem_read(self.dut, addr, data)
+                yield
+                yield
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_mem.vcd"):
+            sim.run()
+
+    def test_sync_timeout(self):
+        # The back end doesn't respond to the first read, so the SYNC
+        # should time out and the next read should still work
+        timeouts = []
+
+        def io_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.sync_timeout_err):
+                    timeouts.append(1)
+                if (yield self.dut.io_wb.cyc) and (yield self.dut.io_wb.adr) == 0x81:
+                    yield self.dut.io_wb.dat_r.eq(0x5a)
+                    yield self.dut.io_wb.ack.eq(1)
+                    yield
+                    yield self.dut.io_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.sync_timeout.eq(16)
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            syncs = yield from self.lpc_io_read_error(self.dut, 0x80)
+            self.assertEqual(len(syncs), 16)
+            yield
+            yield from self.lpc_io_read(self.dut, 0x81, 0x5a)
+            self.assertEqual(timeouts, [1])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_sync_timeout.vcd"):
+            sim.run()
+
+    def test_fw_err(self):
+        # The FW wishbone errors word 0x42. A FW cycle touching it ends
+        # in a SYNC ERROR, the words after it aren't touched and the
+        # next cycle still works.
+        written = []
+
+        def fw_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.fw_wb.cyc) and (yield self.dut.fw_wb.stb):
+                    adr = yield self.dut.fw_wb.adr
+                    if (yield self.dut.fw_wb.we):
+                        written.append(adr)
+                    yield self.dut.fw_wb.dat_r.eq(adr)
+                    if adr == 0x42:
+                        yield self.dut.fw_wb.err.eq(1)
+                    else:
+                        yield self.dut.fw_wb.ack.eq(1)
+                    yield
+                    yield self.dut.fw_wb.ack.eq(0)
+                    yield self.dut.fw_wb.err.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            yield from self.lpc_fw_read(self.dut, 0x100, 0, 16, error=True)
+            yield from self.lpc_fw_read(self.dut, 0x104, 0x41, 4)
+            # Posted writes can't fail the LPC cycle
+            yield from self.lpc_fw_write(self.dut, 0x100, 0, 16,
+                                         error=not self.dut.posted_writes)
+            yield from self.lpc_fw_write(self.dut, 0x200, 0, 4)
+            yield from self.lpc_fw_read(self.dut, 0x104, 0x41, 4)
+            self.assertEqual(written, [0x40, 0x41, 0x42, 0x80])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_fw_err.vcd"):
+            sim.run()
+
+    def test_abort(self):
+        # The host gives up on a read just as the back end acks it.
+        # That response mustn't be taken as the answer to the next read.
+        acking = 0
+        stale = []
+
+        def io_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.io_wb.cyc):
+                    if (yield self.dut.io_wb.adr) == 0x81:
+                        yield self.dut.io_wb.dat_r.eq(0x5a)
+                        yield self.dut.io_wb.ack.eq(1)
+                        yield
+                        yield self.dut.io_wb.ack.eq(0)
+                    elif acking:
+                        stale.append(1)
+                        yield self.dut.io_wb.dat_r.eq(0xde)
+                        yield self.dut.io_wb.ack.eq(1)
+                        yield
+                        yield self.dut.io_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            nonlocal acking
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            # Read of 0x0000 aborted in the SYNC
+            yield from self.lpc_io_read_partial(self.dut, 12)
+            self.assertEqual((yield self.dut.lad_out), SYNC_LONG_WAIT)
+            acking = 1
+            yield
+            waits = yield from self.lpc_io_read(self.dut, 0x81, 0x5a)
+            self.assertEqual(stale, [1])
+            self.assertLess(waits, 8)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_abort.vcd"):
+            sim.run()
+
+
+class TestSumEarlyDispatch(TestSum):
+    # Run all the same tests with reads sent to the back end early. The
+    # command goes at the end of the address, so partial transactions
+    # need to stop before that.
+    partial_cycles = 5
+
+    def setUp(self):
+        self.dut = lpc2wb(early_dispatch=True)
+
+
+class TestSumPostedWrites(TestSum):
+    # Run all the same tests with writes acked as soon as they are sent
+    # to the back end
+    def setUp(self):
+        self.dut = lpc2wb(posted_writes=True)
+
+    def test_posted_err(self):
+        # A posted IO write that errors still gets a SYNC READY, the
+        # error is reported on posted_err instead
+        errors = []
+
+        def io_bench():
+            while (yield self.dut.io_wb.cyc) == 0:
+                yield
+            self.assertEqual((yield self.dut.io_wb.we), 1)
+            yield self.dut.io_wb.err.eq(1)
+            yield
+            yield self.dut.io_wb.err.eq(0)
+            yield
+
+        def err_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.posted_err):
+                    errors.append((yield self.dut.posted_err_addr))
+                yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            yield from self.lpc_io_write(self.dut, 0x3f9, 0x5a)
+            for _ in range(16):
+                yield
+            self.assertEqual(errors, [0x3f9])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        sim.add_sync_process(err_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_posted_err.vcd"):
+            sim.run()
+
+
+class TestSumFifoDepth(TestSum):
+    # Run all the same tests with deeper fifos
+    def setUp(self):
+        self.dut = lpc2wb(fifo_depth=4)
+
+    def test_posted_queue(self):
+        # Posted writes queue up behind a slow wishbone without holding
+        # up the host. A read after them waits for them all to finish.
+        self.dut = lpc2wb(posted_writes=True, fifo_depth=4)
+        done = []
+
+        def io_bench():
+            for i in range(4):
+                while (yield self.dut.io_wb.cyc) == 0:
+                    yield
+                for _ in range(200):
+                    yield
+                done.append((yield self.dut.io_wb.adr))
+                yield self.dut.io_wb.dat_r.eq(0x5a)
+                yield self.dut.io_wb.ack.eq(1)
+                yield
+                yield self.dut.io_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            for i in range(3):
+                waits = yield from self.lpc_io_write(self.dut, 0x80 + i, i)
+                self.assertEqual(waits, 0)
+            self.assertEqual(done, [])
+            yield from self.lpc_io_read(self.dut, 0x3f8, 0x5a)
+            self.assertEqual(done, [0x80, 0x81, 0x82, 0x3f8])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_posted_queue.vcd"):
+            sim.run()
+
+
+class TestSumRegistered(TestSum):
+    # Run all the same tests with register stages on the wishbones
+    def setUp(self):
+        self.dut = lpc2wb(registered_wb=True)
+
+
+class ClassicSlaves(Elaboratable):
+    # Pipelined lpc2wb talking to the classic test slaves, each request
+    # is stalled until it's acked
+    def __init__(self, dut):
+        self.dut = dut
+
+    def __getattr__(self, name):
+        return getattr(self.dut, name)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.dut = self.dut
+        m.d.comb += [
+            self.dut.io_wb.stall.eq(~(self.dut.io_wb.ack | self.dut.io_wb.err)),
+            self.dut.fw_wb.stall.eq(~(self.dut.fw_wb.ack | self.dut.fw_wb.err)),
+        ]
+        return m
+
+
+class TestSumPipelined(TestSum):
+    # Run all the same tests with pipelined wishbones
+    def setUp(self):
+        self.dut = ClassicSlaves(lpc2wb(pipelined=True))
+
+
+class TestPipelined(unittest.TestCase, Helpers):
+    def test_fw_read(self):
+        # The words of a multi word FW read go out back to back, ahead
+        # of the acks
+        dut = lpc2wb(pipelined=True, fifo_depth=4)
+        base = 0x1000
+        data = random.randrange(2**(128 * 8))
+        max_inflight = 0
+
+        def fw_bench():
+            nonlocal max_inflight
+            yield Passive()
+            inflight = []
+            clock = 0
+            yield dut.fw_wb.stall.eq(0)
+            while True:
+                # Slave with 3 clocks latency, outputs change on the
+                # clock edge
+                ack = bool(inflight) and inflight[0][0] <= clock
+                if ack:
+                    _, adr = inflight.pop(0)
+                    word = adr - (base >> 2)
+                    yield dut.fw_wb.dat_r.eq((data >> (32 * word)) & 0xffffffff)
+                yield dut.fw_wb.ack.eq(ack)
+                yield Settle()
+                if (yield dut.fw_wb.cyc) and (yield dut.fw_wb.stb):
+                    self.assertEqual((yield dut.fw_wb.we), 0)
+                    inflight.append((clock + 3, (yield dut.fw_wb.adr)))
+                    max_inflight = max(max_inflight, len(inflight))
+                yield
+                clock += 1
+
+        def lpc_bench():
+            yield dut.lframe.eq(1)
+            yield dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            yield from self.lpc_fw_read(dut, base, data, 128)
+            yield from self.lpc_fw_read(dut, base, data & 0xffffffff, 4)
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_pipelined_fw_read.vcd"):
+            sim.run()
+        self.assertGreater(max_inflight, 1)
+
+    def test_fw_read_err(self):
+        # A word errors with more issued behind it. Those are dropped
+        # and the next read gets the right data.
+        dut = lpc2wb(pipelined=True, fifo_depth=4)
+        base = 0x1000
+        dropped = 0
+
+        def fw_bench():
+            nonlocal dropped
+            yield Passive()
+            inflight = []
+            clock = 0
+            yield dut.fw_wb.stall.eq(0)
+            while True:
+                resp = bool(inflight) and inflight[0][0] <= clock
+                if resp:
+                    _, adr = inflight.pop(0)
+                    yield dut.fw_wb.dat_r.eq(adr)
+                yield dut.fw_wb.ack.eq(resp and adr != (base >> 2) + 5)
+                yield dut.fw_wb.err.eq(resp and adr == (base >> 2) + 5)
+                yield Settle()
+                if not (yield dut.fw_wb.cyc):
+                    dropped += len(inflight)
+                    inflight = []
+                elif (yield dut.fw_wb.stb):
+                    inflight.append((clock + 3, (yield dut.fw_wb.adr)))
+                yield
+                clock += 1
+
+        def lpc_bench():
+            yield dut.lframe.eq(1)
+            yield dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            yield from self.lpc_fw_read(dut, base, 0, 128, error=True)
+            yield from self.lpc_fw_read(dut, base + 4, (base >> 2) + 1, 4)
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_pipelined_fw_read_err.vcd"):
+            sim.run()
+        self.assertGreater(dropped, 0)
+
+
+class TestBurst(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = lpc2wb(burst=True)
+
+    def test_fw_burst(self):
+        # Multi word FW cycles are incrementing bursts with cyc held
+        # throughout, single words are classic
+        beats = []
+        cyc_drops = 0
+
+        def fw_bench():
+            nonlocal cyc_drops
+            yield Passive()
+            mem = {}
+            in_burst = False
+            while True:
+                yield self.dut.fw_wb.ack.eq(0)
+                cyc = yield self.dut.fw_wb.cyc
+                if in_burst and not cyc:
+                    cyc_drops += 1
+                if cyc and (yield self.dut.fw_wb.stb):
+                    adr = yield self.dut.fw_wb.adr
+                    cti = yield self.dut.fw_wb.cti
+                    beats.append((adr, cti, (yield self.dut.fw_wb.bte)))
+                    if (yield self.dut.fw_wb.we):
+                        mem[adr] = yield self.dut.fw_wb.dat_w
+                    yield self.dut.fw_wb.dat_r.eq(mem.get(adr, 0))
+                    yield self.dut.fw_wb.ack.eq(1)
+                    in_burst = cti == CycleType.INCR_BURST.value
+                    yield
+                    yield self.dut.fw_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            data = random.randrange(2**(16 * 8))
+            yield from self.lpc_fw_write(self.dut, 0x100, data, 16)
+            yield from self.lpc_fw_read(self.dut, 0x100, data, 16)
+            yield from self.lpc_fw_read(self.dut, 0x104, (data >> 32) & 0xffffffff, 4)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_fw_burst.vcd"):
+            sim.run()
+
+        incr = CycleType.INCR_BURST.value
+        linear = BurstTypeExt.LINEAR.value
+        burst = [(0x40, incr, linear), (0x41, incr, linear), (0x42, incr, linear),
+                 (0x43, CycleType.END_OF_BURST.value, linear)]
+        self.assertEqual(beats, burst + burst + [(0x41, CycleType.CLASSIC.value, linear)])
+        self.assertEqual(cyc_drops, 0)
+
+
+class TestBurstRegistered(TestBurst):
+    # The register stage keeps the burst together
+    def setUp(self):
+        self.dut = lpc2wb(burst=True, registered_wb=True)
+
+
+class TestSumShortWaits(TestSum):
+    # Run all the same tests with SHORT_WAIT SYNCs first
+    def setUp(self):
+        self.dut = lpc2wb(short_waits=4)
+
+    def test_short_waits(self):
+        def lpc_bench():
+            yield self.dut.sync_timeout.eq(12)
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            # Nothing on the IO bus, so this will time out
+            syncs = yield from self.lpc_io_read_error(self.dut, 0x80)
+            self.assertEqual(syncs, [SYNC_SHORT_WAIT] * 4 + [SYNC_LONG_WAIT] * 8)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        with sim.write_vcd("lpc2wb_short_waits.vcd"):
+            sim.run()
+
+
+class TestShadow(unittest.TestCase, Helpers):
+    def test_shadow(self):
+        # Reads of shadowed addresses are answered without touching the
+        # IO wishbone
+        self.dut = lpc2wb(shadow_addrs=(0x3fd, 0xe4))
+
+        def io_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.io_wb.cyc):
+                    self.assertEqual((yield self.dut.io_wb.adr), 0x3fc)
+                    yield self.dut.io_wb.dat_r.eq(0x12)
+                    yield self.dut.io_wb.ack.eq(1)
+                    yield
+                    yield self.dut.io_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.shadow_data[0].eq(0x60)
+            yield self.dut.shadow_data[1].eq(0x04)
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            waits = yield from self.lpc_io_read(self.dut, 0x3fd, 0x60)
+            self.assertEqual(waits, 0)
+            waits = yield from self.lpc_io_read(self.dut, 0xe4, 0x04)
+            self.assertEqual(waits, 0)
+            yield from self.lpc_io_read(self.dut, 0x3fc, 0x12)
+
+            yield self.dut.shadow_data[0].eq(0x61)
+            for _ in range(2):
+                yield
+            yield from self.lpc_io_read(self.dut, 0x3fd, 0x61)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_shadow.vcd"):
+            sim.run()
+
+    def test_shadow_posted(self):
+        # A shadowed read straight after a posted write has to wait for
+        # the write to land, as the write may change the status
+        self.dut = lpc2wb(posted_writes=True, shadow_addrs=(0xe4,))
+
+        def io_bench():
+            while (yield self.dut.io_wb.cyc) == 0:
+                yield
+            self.assertEqual((yield self.dut.io_wb.we), 1)
+            for _ in range(20):
+                yield
+            yield self.dut.shadow_data[0].eq((yield self.dut.io_wb.dat_w))
+            yield self.dut.io_wb.ack.eq(1)
+            yield
+            yield self.dut.io_wb.ack.eq(0)
+            yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            waits = yield from self.lpc_io_write(self.dut, 0xe4, 0x04)
+            self.assertEqual(waits, 0)
+            waits = yield from self.lpc_io_read(self.dut, 0xe4, 0x04)
+            self.assertGreater(waits, 0)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)  # 100 MHz systemclock
+        sim.add_clock(3e-8, domain="lclk")  # 30 MHz LPC clock
+        sim.add_clock(3e-8, domain="lclkrst")  # 30 MHz LPC clock
+        sim.add_sync_process(lpc_bench, domain="lclk")
+        sim.add_sync_process(io_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_shadow_posted.vcd"):
+            sim.run()
+
+
+
+class TestSingleClock(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = lpc2wb(single_clock=True)
+
+    def test_single_clock(self):
+        # Everything in one clock domain, there is no clock crossing to
+        # wait for so the back end answers within a SYNC or two
+        def io_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.io_wb.cyc) & ~(yield self.dut.io_wb.ack):
+                    if (yield self.dut.io_wb.we):
+                        self.assertEqual((yield self.dut.io_wb.dat_w), 0x12)
+                    yield self.dut.io_wb.dat_r.eq((yield self.dut.io_wb.adr) & 0xff)
+                    yield self.dut.io_wb.ack.eq(1)
+                else:
+                    yield self.dut.io_wb.ack.eq(0)
+                yield
+
+        def fw_bench():
+            yield Passive()
+            while True:
+                if (yield self.dut.fw_wb.cyc) & ~(yield self.dut.fw_wb.ack):
+                    if (yield self.dut.fw_wb.we):
+                        self.assertEqual((yield self.dut.fw_wb.dat_w),
+                                         (yield self.dut.fw_wb.adr))
+                    yield self.dut.fw_wb.dat_r.eq((yield self.dut.fw_wb.adr))
+                    yield self.dut.fw_wb.ack.eq(1)
+                else:
+                    yield self.dut.fw_wb.ack.eq(0)
+                yield
+
+        def lpc_bench():
+            yield self.dut.lframe.eq(1)
+            yield self.dut.lreset.eq(1)
+            for _ in range(4):
+                yield
+
+            waits = yield from self.lpc_io_read(self.dut, 0x3f8, 0xf8)
+            self.assertLessEqual(waits, 2)
+            waits = yield from self.lpc_io_write(self.dut, 0x3f8, 0x12)
+            self.assertLessEqual(waits, 2)
+            waits = yield from self.lpc_fw_read(self.dut, 0x100, 0x40, 4)
+            self.assertLessEqual(waits, 2)
+            waits = yield from self.lpc_fw_write(self.dut, 0x100, 0x40, 4)
+            self.assertLessEqual(waits, 2)
+            data = sum((0x40 + i) << (32 * i) for i in range(4))
+            yield from self.lpc_fw_read(self.dut, 0x100, data, 16)
+            yield from self.lpc_fw_write(self.dut, 0x100, data, 16)
+
+            # Aborted read, the next one still gets the right answer
+            yield from self.lpc_io_read_partial(self.dut, 12)
+            yield from self.lpc_io_read(self.dut, 0x3f9, 0xf9)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(3e-8)  # 30 MHz LPC clock as the system clock
+        sim.add_sync_process(lpc_bench, domain="sync")
+        sim.add_sync_process(io_bench, domain="sync")
+        sim.add_sync_process(fw_bench, domain="sync")
+        with sim.write_vcd("lpc2wb_single_clock.vcd"):
+            sim.run()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,8 @@
 import unittest
 
-from nmigen import Elaboratable, Module
-from nmigen_soc.wishbone import Interface as WishboneInterface
-from nmigen.sim import Simulator
+from nmigen import Elaboratable, Module, Signal
+from nmigen_soc.wishbone import Interface as WishboneInterface, CycleType, BurstTypeExt
+from nmigen.sim import Simulator, Passive, Settle
 
 from lpcperipheral.lpc_ctrl import LPC_Ctrl
 
@@ -11,25 +11,38 @@ from .helpers import Helpers
 
 
 class LPC_AND_ROM(Elaboratable):
-    def __init__(self):
-        self.io_wb = WishboneInterface(data_width=32, addr_width=2, granularity=8)
-        self.lpc_wb = WishboneInterface(data_width=32, addr_width=26, granularity=8)
+    def __init__(self, registered=False):
+        self.registered = registered
+        self.io_wb = WishboneInterface(data_width=32, addr_width=6, granularity=8)
+        self.lpc_wb = WishboneInterface(data_width=32, addr_width=30, granularity=8)
+        self.posted_err = Signal()
+        self.posted_err_addr = Signal(32)
+        self.sync_timeout = Signal(16)
+        self.sync_timeout_err = Signal()
+        self.serirq_cfg = Signal(32)
+        self.irq = Signal()
 
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.ctrl = ctrl = LPC_Ctrl()
+        m.submodules.ctrl = ctrl = LPC_Ctrl(registered=self.registered)
 
         m.d.comb += [
             self.io_wb.connect(ctrl.io_wb),
             self.lpc_wb.connect(ctrl.lpc_wb),
+            ctrl.posted_err.eq(self.posted_err),
+            ctrl.posted_err_addr.eq(self.posted_err_addr),
+            self.sync_timeout.eq(ctrl.sync_timeout),
+            ctrl.sync_timeout_err.eq(self.sync_timeout_err),
+            self.serirq_cfg.eq(ctrl.serirq_cfg),
+            self.irq.eq(ctrl.irq),
         ]
 
         # Initialize ROM with the offset so we can easily determine if we are
         # reading from the right address
         data = range(128)
         m.submodules.rom = rom = ROM(data=data)
-        m.d.comb += ctrl.dma_wb.connect(rom)
+        m.d.comb += ctrl.dma_wb.connect(rom, exclude={"err"})
 
         return m
 
@@ -88,6 +101,632 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("test_lpc_ctrl_base_offset.vcd"):
             sim.run()
 
+    def test_registered(self):
+        # Same translation with a register stage on the DMA wishbone,
+        # for two more cycles of latency
+        self.dut = LPC_AND_ROM(registered=True)
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            for i in range(32):
+                yield from self.wishbone_read(self.dut.lpc_wb, i, ((i % 0x10) + base), delay=3)
+                yield
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_registered.vcd"):
+            sim.run()
+
+    def test_posted_err(self):
+        def bench():
+            yield
+
+            # status register, offset 4
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0, delay=2)
+            yield
+            self.assertEqual((yield self.dut.irq), 0)
+
+            # Only the first error address is kept
+            for addr in [0x3f9, 0xe5]:
+                yield self.dut.posted_err.eq(1)
+                yield self.dut.posted_err_addr.eq(addr)
+                yield
+                yield self.dut.posted_err.eq(0)
+                yield
+            yield from self.wishbone_read(self.dut.io_wb, 4, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 6, 0x3f9, delay=2)
+            self.assertEqual((yield self.dut.irq), 0)
+
+            # irq enable register, offset 5
+            yield from self.wishbone_write(self.dut.io_wb, 5, 1, delay=2)
+            yield
+            self.assertEqual((yield self.dut.irq), 1)
+
+            # write 1 to clear
+            yield from self.wishbone_write(self.dut.io_wb, 4, 1, delay=2)
+            yield
+            self.assertEqual((yield self.dut.irq), 0)
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_posted_err.vcd"):
+            sim.run()
+
+    def test_sync_timeout(self):
+        def bench():
+            yield
+
+            # sync timeout register, offset 7
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.io_wb, 7, 100, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 7, 100, delay=2)
+            self.assertEqual((yield self.dut.sync_timeout), 100)
+
+            # Timeouts show up in bit 1 of status
+            yield self.dut.sync_timeout_err.eq(1)
+            yield
+            yield self.dut.sync_timeout_err.eq(0)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0b10, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_sync_timeout.vcd"):
+            sim.run()
+
+    def test_serirq_cfg(self):
+        def bench():
+            yield
+
+            # SERIRQ config register, offset 8
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.io_wb, 8, 0x8b84, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 8, 0x8b84, delay=2)
+            self.assertEqual((yield self.dut.serirq_cfg), 0x8b84)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_serirq_cfg.vcd"):
+            sim.run()
+
+
+class TestDMAErr(unittest.TestCase, Helpers):
+    def test_dma_err(self):
+        # DMA errors go back to the LPC side, and are flagged in status,
+        # counted and the address kept
+        self.dut = LPC_Ctrl()
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            for adr in [0x12, 0x13]:
+                yield self.dut.lpc_wb.adr.eq(adr)
+                yield self.dut.lpc_wb.cyc.eq(1)
+                yield self.dut.lpc_wb.stb.eq(1)
+                yield self.dut.dma_wb.err.eq(1)
+                yield Settle()
+                self.assertEqual((yield self.dut.lpc_wb.err), 1)
+                yield
+                yield self.dut.lpc_wb.cyc.eq(0)
+                yield self.dut.lpc_wb.stb.eq(0)
+                yield self.dut.dma_wb.err.eq(0)
+                yield
+
+            # status register bit 2, DMA error count at 9, address at 10
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0b100, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 9, 2, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 10, (base + 3) * 4, delay=2)
+            yield
+            self.assertEqual((yield self.dut.irq), 0)
+            yield from self.wishbone_write(self.dut.io_wb, 5, 0b100, delay=2)
+            yield
+            self.assertEqual((yield self.dut.irq), 1)
+
+            # Write to clear the count
+            yield from self.wishbone_write(self.dut.io_wb, 9, 0, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 9, 0, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_dma_err.vcd"):
+            sim.run()
+
+
+class TestWriteCombine(unittest.TestCase, Helpers):
+    def test_write_combine(self):
+        # Byte writes to the same word are merged into one DMA write,
+        # after the translation. The BMC can see and flush the buffer.
+        self.dut = LPC_Ctrl(write_combine=64)
+        writes = []
+
+        def dma_bench():
+            yield Passive()
+            dma = self.dut.dma_wb
+            while True:
+                yield dma.ack.eq(0)
+                if (yield dma.cyc) and (yield dma.stb):
+                    adr = yield dma.adr
+                    writes.append((adr, (yield dma.dat_w), (yield dma.sel)))
+                    # Fail writes to the top of the system window
+                    if adr == 0x70 + 0xf:
+                        yield dma.err.eq(1)
+                    else:
+                        yield dma.ack.eq(1)
+                    yield
+                    yield dma.err.eq(0)
+                yield
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            yield from self.wishbone_write(self.dut.lpc_wb, 0x13, 0x12, sel=0x1)
+            yield
+            yield from self.wishbone_write(self.dut.lpc_wb, 0x13, 0x3400, sel=0x2)
+            yield
+            self.assertEqual(writes, [])
+
+            # write combine register, offset 11
+            yield from self.wishbone_read(self.dut.io_wb, 11, 1, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 11, 1, delay=2)
+            for _ in range(4):
+                yield
+            self.assertEqual(writes, [(base + 3, 0x3412, 0x3)])
+            yield from self.wishbone_read(self.dut.io_wb, 11, 0, delay=2)
+            yield
+
+            # Moving the window waits for the buffered write to go out
+            # through the old one
+            yield from self.wishbone_write(self.dut.lpc_wb, 0x1f, 0x56, sel=0x1)
+            yield
+            io = self.dut.io_wb
+            yield io.adr.eq(0)
+            yield io.dat_w.eq(0x70 * 4)
+            yield io.we.eq(1)
+            yield io.cyc.eq(1)
+            yield io.stb.eq(1)
+            yield io.sel.eq(0xf)
+            for _ in range(10):
+                yield
+                if (yield io.ack):
+                    break
+            self.assertEqual((yield io.ack), 1)
+            yield io.we.eq(0)
+            yield io.cyc.eq(0)
+            yield io.stb.eq(0)
+            yield
+            self.assertEqual(writes[1:], [(base + 0xf, 0x56, 0x1)])
+            yield from self.wishbone_read(self.dut.io_wb, 0, 0x70 * 4, delay=2)
+            yield
+
+            # A buffered write that fails is flagged like a posted write,
+            # with its LPC address
+            yield from self.wishbone_write(self.dut.lpc_wb, 0x2f, 0x78, sel=0x1)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 11, 1, delay=2)
+            for _ in range(4):
+                yield
+            self.assertEqual(writes[2:], [(0x70 + 0xf, 0x78, 0x1)])
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0b101, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 6, 0x2f * 4, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(dma_bench)
+        with sim.write_vcd("test_lpc_ctrl_write_combine.vcd"):
+            sim.run()
+
+
+class TestCache(unittest.TestCase, Helpers):
+    def test_cache(self):
+        # FW reads are cached by LPC address, so changing the window
+        # or writing the cache register throws the lines away. Hits and
+        # misses are counted.
+        self.dut = LPC_Ctrl(cache_lines=4, cache_line_words=4)
+        reads = []
+
+        def dma_bench():
+            yield Passive()
+            dma = self.dut.dma_wb
+            while True:
+                yield dma.ack.eq(0)
+                yield Settle()
+                if (yield dma.cyc) and (yield dma.stb):
+                    reads.append((yield dma.adr))
+                    yield dma.dat_r.eq(0x1000 + (yield dma.adr))
+                    yield dma.ack.eq(1)
+                yield
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x13, 0x1000 + base + 3, delay=5)
+            yield
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x12, 0x1000 + base + 2, delay=1)
+            yield
+            self.assertEqual(reads, [base, base + 1, base + 2, base + 3])
+
+            # A new base reads through the new window
+            base = 64
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x12, 0x1000 + base + 2, delay=5)
+            yield
+
+            # cache register, offset 12
+            yield from self.wishbone_write(self.dut.io_wb, 12, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x12, 0x1000 + base + 2, delay=5)
+            yield
+            self.assertEqual(len(reads), 12)
+
+            # hits at 13, misses at 14, write to clear
+            yield from self.wishbone_read(self.dut.io_wb, 13, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 14, 3, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 14, 0, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 14, 0, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(dma_bench)
+        with sim.write_vcd("test_lpc_ctrl_cache.vcd"):
+            sim.run()
+
+
+class TestPrefetch(unittest.TestCase, Helpers):
+    def test_prefetch(self):
+        # Sequential FW reads are fetched ahead through the window, as
+        # set in the prefetch register. Used and wasted words are
+        # counted.
+        self.dut = LPC_Ctrl(prefetch=4)
+        reads = []
+
+        def dma_bench():
+            yield Passive()
+            dma = self.dut.dma_wb
+            while True:
+                yield dma.ack.eq(0)
+                yield Settle()
+                if (yield dma.cyc) and (yield dma.stb):
+                    reads.append((yield dma.adr))
+                    yield dma.dat_r.eq(0x1000 + (yield dma.adr))
+                    yield dma.ack.eq(1)
+                yield
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            # prefetch register, offset 15. The depth is limited to 4.
+            yield from self.wishbone_write(self.dut.io_wb, 15, 0x801, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 15, 0x401, delay=2)
+            yield
+
+            for adr in (0x10, 0x11):
+                yield from self.wishbone_read(self.dut.lpc_wb, adr, 0x1000 + base + adr - 0x10,
+                                              delay=0)
+                yield
+            for _ in range(8):
+                yield
+            self.assertEqual(reads, [base + i for i in range(6)])
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x12, 0x1000 + base + 2, delay=1)
+            yield
+
+            # Moving the window throws the buffer away
+            yield from self.wishbone_write(self.dut.io_wb, 0, 0, delay=2)
+            yield
+
+            # used at 16, wasted at 17
+            yield from self.wishbone_read(self.dut.io_wb, 16, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 17, 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 17, 0, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 17, 0, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(dma_bench)
+        with sim.write_vcd("test_lpc_ctrl_prefetch.vcd"):
+            sim.run()
+
+
+class TestShadow(unittest.TestCase, Helpers):
+    def test_shadow(self):
+        # The BMC loads the shadow copy through the address and data
+        # registers, then FW reads of it don't go to the DMA wishbone
+        self.dut = LPC_Ctrl(shadow_words=16, shadow_base=0x100)
+        reads = []
+
+        def dma_bench():
+            yield Passive()
+            dma = self.dut.dma_wb
+            while True:
+                yield dma.ack.eq(0)
+                yield Settle()
+                if (yield dma.cyc) and (yield dma.stb):
+                    reads.append((yield dma.adr))
+                    yield dma.dat_r.eq(0x1000 + (yield dma.adr))
+                    yield dma.ack.eq(1)
+                yield
+
+        def bench():
+            yield
+
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xfff, delay=2)
+            yield
+
+            # shadow register at 18, address at 19, data at 20
+            yield from self.wishbone_write(self.dut.io_wb, 19, 2, delay=2)
+            yield
+            for i in range(4):
+                yield from self.wishbone_write(self.dut.io_wb, 20, 0x5000 + i, delay=2)
+                yield
+            yield from self.wishbone_read(self.dut.io_wb, 19, 6, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 19, 3, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 20, 0x5001, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 20, 0x5002, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 18, 1, delay=2)
+            yield
+
+            # 0x108 is the third word of the shadow
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x108 >> 2, 0x5000, delay=1)
+            yield
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x10c >> 2, 0x5001, delay=1)
+            yield
+            self.assertEqual(reads, [])
+            yield from self.wishbone_read(self.dut.lpc_wb, 0x140 >> 2, 0x1000 + 0x50, delay=0)
+            self.assertEqual(reads, [0x50])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(dma_bench)
+        with sim.write_vcd("test_lpc_ctrl_shadow.vcd"):
+            sim.run()
+
+
+class TestWindows(unittest.TestCase, Helpers):
+    def test_windows(self):
+        # A read only and a read/write window mapped at once, and the
+        # base/mask window for everything else
+        self.dut = LPC_Ctrl(windows=2)
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            # Windows at 32 up: LPC base, LPC mask, system base, control
+            for i, (lpc_base, sys_base, ctrl) in enumerate([(0x1000, 0x80000, 0b01),
+                                                            (0x2000, 0x90000, 0b11)]):
+                for j, data in enumerate([lpc_base, 0xfff, sys_base, ctrl]):
+                    yield from self.wishbone_write(self.dut.io_wb, 32 + 4 * i + j, data,
+                                                   delay=2)
+                    yield
+            yield from self.wishbone_read(self.dut.io_wb, 32 + 4 + 2, 0x90000, delay=2)
+            yield
+
+            lpc = self.dut.lpc_wb
+            dma = self.dut.dma_wb
+            for lpc_adr, we, dma_adr in [(0x1010, 0, 0x80010), (0x2ffc, 0, 0x90ffc),
+                                         (0x2008, 1, 0x90008), (0x3004, 0, base * 4 + 4)]:
+                yield lpc.adr.eq(lpc_adr >> 2)
+                yield lpc.we.eq(we)
+                yield lpc.cyc.eq(1)
+                yield lpc.stb.eq(1)
+                yield Settle()
+                self.assertEqual((yield dma.adr), dma_adr >> 2)
+                self.assertEqual((yield dma.stb), 1)
+                yield dma.ack.eq(1)
+                yield Settle()
+                self.assertEqual((yield lpc.ack), 1)
+                yield
+                yield dma.ack.eq(0)
+                yield lpc.cyc.eq(0)
+                yield lpc.stb.eq(0)
+                yield
+            self.assertEqual((yield self.dut.irq), 0)
+
+            # Writes to the read only window fail without going to the
+            # DMA wishbone, and are flagged in status bit 3
+            yield lpc.adr.eq(0x1010 >> 2)
+            yield lpc.we.eq(1)
+            yield lpc.cyc.eq(1)
+            yield lpc.stb.eq(1)
+            yield Settle()
+            self.assertEqual((yield dma.stb), 0)
+            self.assertEqual((yield lpc.err), 0)
+            yield
+            yield Settle()
+            self.assertEqual((yield dma.stb), 0)
+            self.assertEqual((yield lpc.err), 1)
+            yield
+            yield lpc.cyc.eq(0)
+            yield lpc.stb.eq(0)
+            yield lpc.we.eq(0)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0b1000, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_windows.vcd"):
+            sim.run()
+
+
+class TestPageTable(unittest.TestCase, Helpers):
+    def test_page_table(self):
+        # Outside the window, FW accesses are translated a page at a
+        # time. Unmapped pages fail.
+        self.check_page_table(registered=False)
+
+    def test_page_table_registered(self):
+        # The same with the register stage ahead of the translation
+        self.check_page_table(registered=True)
+
+    def check_page_table(self, registered):
+        self.dut = LPC_Ctrl(registered=registered, windows=1, pages=16, page_size=4096)
+
+        def bench():
+            yield
+
+            # Window 0 at LPC 0x10000, read/write
+            for j, data in enumerate([0x10000, 0xffff, 0x200000, 0b11]):
+                yield from self.wishbone_write(self.dut.io_wb, 32 + j, data, delay=2)
+                yield
+
+            # page table register at 21, address at 22, data at 23
+            yield from self.wishbone_write(self.dut.io_wb, 22, 0, delay=2)
+            yield
+            for entry in [0x43000 | 1, 0x51000 | 1, 0]:
+                yield from self.wishbone_write(self.dut.io_wb, 23, entry, delay=2)
+                yield
+            yield from self.wishbone_write(self.dut.io_wb, 22, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.io_wb, 23, 0x51001, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 21, 1, delay=2)
+            yield
+
+            lpc = self.dut.lpc_wb
+            dma = self.dut.dma_wb
+            for lpc_adr, dma_adr in [(0x0008, 0x43008), (0x1ffc, 0x51ffc),
+                                     (0x10020, 0x200020), (0x0010, 0x43010)]:
+                yield lpc.adr.eq(lpc_adr >> 2)
+                yield lpc.cyc.eq(1)
+                yield lpc.stb.eq(1)
+                for _ in range(6):
+                    yield Settle()
+                    if (yield dma.stb):
+                        break
+                    yield
+                self.assertEqual((yield dma.adr), dma_adr >> 2)
+                yield dma.ack.eq(1)
+                yield
+                yield dma.ack.eq(0)
+                yield lpc.cyc.eq(0)
+                yield lpc.stb.eq(0)
+                yield
+
+            # Page 2 isn't mapped, and the table only covers 16 pages
+            for lpc_adr in (0x2000, 0x20000):
+                yield lpc.adr.eq(lpc_adr >> 2)
+                yield lpc.cyc.eq(1)
+                yield lpc.stb.eq(1)
+                for _ in range(6):
+                    yield Settle()
+                    self.assertEqual((yield dma.stb), 0)
+                    if (yield lpc.err):
+                        break
+                    yield
+                self.assertEqual((yield lpc.err), 1)
+                yield
+                yield lpc.cyc.eq(0)
+                yield lpc.stb.eq(0)
+                yield
+            yield from self.wishbone_read(self.dut.io_wb, 4, 0b1000, delay=2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_page_table%s.vcd" % ("_registered" if registered else "")):
+            sim.run()
+
+
+class TestBurst(unittest.TestCase, Helpers):
+    def test_window_wrap(self):
+        # Burst tags go straight through, except an incrementing burst
+        # is ended at the top of the window
+        self.dut = LPC_Ctrl(burst=True)
+
+        def bench():
+            yield
+
+            base = 32  # In wishbone units
+            yield from self.wishbone_write(self.dut.io_wb, 0, base * 4, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.io_wb, 0x2, 0xf * 4, delay=2)
+            yield
+
+            yield self.dut.lpc_wb.bte.eq(BurstTypeExt.LINEAR)
+            for adr, cti, dma_adr, dma_cti in [
+                    (0x0e, CycleType.INCR_BURST, base + 0xe, CycleType.INCR_BURST),
+                    (0x0f, CycleType.INCR_BURST, base + 0xf, CycleType.END_OF_BURST),
+                    (0x10, CycleType.INCR_BURST, base, CycleType.INCR_BURST),
+                    (0x13, CycleType.END_OF_BURST, base + 3, CycleType.END_OF_BURST),
+                    (0x1f, CycleType.CLASSIC, base + 0xf, CycleType.CLASSIC)]:
+                yield self.dut.lpc_wb.adr.eq(adr)
+                yield self.dut.lpc_wb.cti.eq(cti)
+                yield Settle()
+                self.assertEqual((yield self.dut.dma_wb.adr), dma_adr)
+                self.assertEqual((yield self.dut.dma_wb.cti), dma_cti.value)
+                self.assertEqual((yield self.dut.dma_wb.bte), BurstTypeExt.LINEAR.value)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_lpc_ctrl_burst.vcd"):
+            sim.run()
+
 
 if __name__ == '__main__':
     unittest.main()
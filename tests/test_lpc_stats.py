@@ -0,0 +1,187 @@
+import unittest
+
+from nmigen.sim import Simulator
+
+from lpcperipheral.lpcfront import LPCStates, LPCCycletype, LPCSyncType
+from lpcperipheral.lpc_stats import (LPCStats, STATS_STATE,
+                                     STATS_CYCLETYPE, STATS_SHORT_WAIT,
+                                     STATS_LONG_WAIT, STATS_ABORT, STATS_ERROR,
+                                     STATS_HIST, STATS_HIST_BINS, LPCHistType)
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = LPCStats()
+
+    def lpc_cycles(self, state, n=1, lad_out=None):
+        yield self.dut.state.eq(state)
+        yield self.dut.lad_en.eq(lad_out is not None)
+        if lad_out is not None:
+            yield self.dut.lad_out.eq(lad_out)
+        for _ in range(n):
+            yield
+
+    def test_stats(self):
+        lpc_done = 0
+
+        def bench():
+            nonlocal lpc_done
+            while not lpc_done:
+                yield
+            yield from self.lpc_stats_snapshot(self.dut.wb)
+
+            for state, count in [(LPCStates.CYCLETYPE, 2),
+                                 (LPCStates.IOADDR, 5),
+                                 (LPCStates.RDTAR1, 4),
+                                 (LPCStates.RDSYNC, 6),
+                                 (LPCStates.RDDATA, 2),
+                                 (LPCStates.WRDATA, 2),
+                                 (LPCStates.WRTAR1, 2),
+                                 (LPCStates.WRSYNC, 1),
+                                 (LPCStates.TAR2, 4)]:
+                yield from self.wishbone_read(self.dut.wb, STATS_STATE + state.value,
+                                              count, delay=2)
+                yield
+            for cycletype, count in [(LPCCycletype.IORD, 1),
+                                     (LPCCycletype.IOWR, 1),
+                                     (LPCCycletype.FWRD, 0)]:
+                yield from self.wishbone_read(self.dut.wb, STATS_CYCLETYPE + cycletype.value,
+                                              count, delay=2)
+                yield
+            yield from self.wishbone_read(self.dut.wb, STATS_SHORT_WAIT, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATS_LONG_WAIT, 2, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATS_ABORT, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATS_ERROR, 1, delay=2)
+            yield
+
+            # Counters were cleared by the snapshot
+            yield from self.lpc_stats_snapshot(self.dut.wb)
+            yield from self.wishbone_read(self.dut.wb, STATS_STATE + LPCStates.RDSYNC.value,
+                                          0, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATS_CYCLETYPE + LPCCycletype.IORD.value,
+                                          0, delay=2)
+
+        def lbench():
+            nonlocal lpc_done
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            # IO read with a SHORT_WAIT and a LONG_WAIT
+            yield self.dut.cycletype.eq(LPCCycletype.IORD)
+            yield from self.lpc_cycles(LPCStates.CYCLETYPE)
+            yield from self.lpc_cycles(LPCStates.IOADDR, 4)
+            yield from self.lpc_cycles(LPCStates.RDTAR1, 2)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.SHORT_WAIT)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.LONG_WAIT)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.READY)
+            yield from self.lpc_cycles(LPCStates.RDDATA, 2, 0)
+            yield from self.lpc_cycles(LPCStates.TAR2, 2, 0xf)
+            yield from self.lpc_cycles(LPCStates.START)
+
+            # IO write
+            yield self.dut.cycletype.eq(LPCCycletype.IOWR)
+            yield from self.lpc_cycles(LPCStates.CYCLETYPE)
+            yield from self.lpc_cycles(LPCStates.IOADDR, 1)
+            yield from self.lpc_cycles(LPCStates.WRDATA, 2)
+            yield from self.lpc_cycles(LPCStates.WRTAR1, 2)
+            yield from self.lpc_cycles(LPCStates.WRSYNC, 1, LPCSyncType.READY)
+            yield from self.lpc_cycles(LPCStates.TAR2, 2, 0xf)
+            yield from self.lpc_cycles(LPCStates.START)
+
+            # FW read aborted by LFRAME#
+            yield self.dut.cycletype.eq(LPCCycletype.FWRD)
+            yield from self.lpc_cycles(LPCStates.RDTAR1, 2)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.LONG_WAIT)
+            yield self.dut.lframe.eq(0)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1)
+            yield self.dut.lframe.eq(1)
+            yield from self.lpc_cycles(LPCStates.START)
+
+            # IO read that ERRORs
+            yield self.dut.cycletype.eq(LPCCycletype.IORD)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.ERROR)
+            yield from self.lpc_cycles(LPCStates.START)
+            lpc_done = 1
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+        with sim.write_vcd("test_lpc_stats.vcd"):
+            sim.run()
+
+    def test_hist(self):
+        lpc_done = 0
+
+        def bench():
+            nonlocal lpc_done
+            while not lpc_done:
+                yield
+            yield from self.lpc_stats_snapshot(self.dut.wb)
+
+            expected = {(LPCHistType.IORD, 0): 1,
+                        (LPCHistType.IORD, 2): 1,
+                        (LPCHistType.IOWR, 1): 1,
+                        (LPCHistType.FWRD, 3): 2,
+                        (LPCHistType.FWWR, 2): 1,
+                        (LPCHistType.FWWR, STATS_HIST_BINS - 1): 1}
+            for histtype in LPCHistType:
+                for b in range(STATS_HIST_BINS):
+                    yield from self.wishbone_read(self.dut.wb,
+                                                  STATS_HIST + histtype.value * STATS_HIST_BINS + b,
+                                                  expected.get((histtype, b), 0), delay=2)
+                    yield
+
+        def lbench():
+            nonlocal lpc_done
+            yield self.dut.lreset.eq(1)
+            yield self.dut.lframe.eq(1)
+            yield
+
+            for cycletype, waits, end in [(LPCCycletype.IORD, 0, LPCSyncType.READY),
+                                          (LPCCycletype.IORD, 3, LPCSyncType.ERROR),
+                                          (LPCCycletype.IOWR, 1, LPCSyncType.READY),
+                                          (LPCCycletype.FWRD, 4, LPCSyncType.READY),
+                                          (LPCCycletype.MEMRD, 7, LPCSyncType.READY),
+                                          (LPCCycletype.MEMWR, 2, LPCSyncType.READY),
+                                          (LPCCycletype.FWWR, 5000, LPCSyncType.READY)]:
+                yield self.dut.cycletype.eq(cycletype)
+                if cycletype in (LPCCycletype.IOWR, LPCCycletype.FWWR, LPCCycletype.MEMWR):
+                    tar1, sync = LPCStates.WRTAR1, LPCStates.WRSYNC
+                else:
+                    tar1, sync = LPCStates.RDTAR1, LPCStates.RDSYNC
+                yield from self.lpc_cycles(tar1, 2)
+                # SHORT_WAITs don't count
+                yield from self.lpc_cycles(sync, 2, LPCSyncType.SHORT_WAIT)
+                yield from self.lpc_cycles(sync, waits, LPCSyncType.LONG_WAIT)
+                yield from self.lpc_cycles(sync, 1, end)
+                yield from self.lpc_cycles(LPCStates.START)
+
+            # Aborted in the SYNC, so not binned
+            yield from self.lpc_cycles(LPCStates.RDTAR1, 2)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1, LPCSyncType.LONG_WAIT)
+            yield self.dut.lframe.eq(0)
+            yield from self.lpc_cycles(LPCStates.RDSYNC, 1)
+            yield self.dut.lframe.eq(1)
+            yield from self.lpc_cycles(LPCStates.START)
+            lpc_done = 1
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+        with sim.write_vcd("test_lpc_stats_hist.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
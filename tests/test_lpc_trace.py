@@ -0,0 +1,139 @@
+import unittest
+
+from nmigen.sim import Simulator
+
+from lpcperipheral.lpcfront import LPCStates, LPCCycletype, LPCSyncType
+from lpcperipheral.lpc_trace import LPCTrace
+
+from .helpers import Helpers
+
+TRACE_DEPTH = 4
+TRACE_BUF = TRACE_DEPTH * 4
+
+CTRL = 0
+STATUS = 1
+WRPTR = 2
+TRIG_ADDR = 3
+TRIG_MASK = 4
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = LPCTrace(depth=TRACE_DEPTH)
+
+    def lpc_cycle(self, cycletype, addr, data, waits=0, end=LPCSyncType.READY):
+        yield self.dut.cycletype.eq(cycletype)
+        yield self.dut.addr.eq(addr)
+        yield self.dut.size.eq(0)
+        write = cycletype in (LPCCycletype.IOWR, LPCCycletype.FWWR, LPCCycletype.MEMWR)
+        if write:
+            yield self.dut.data.eq(data)
+        yield self.dut.state.eq(LPCStates.WRSYNC if write else LPCStates.RDSYNC)
+        yield self.dut.lad_en.eq(1)
+        for i in range(waits):
+            yield self.dut.synccount.eq(i)
+            yield self.dut.lad_out.eq(LPCSyncType.LONG_WAIT)
+            yield
+        yield self.dut.synccount.eq(waits)
+        yield self.dut.lad_out.eq(end)
+        yield
+        # Read data turns up in the next cycle
+        yield self.dut.state.eq(LPCStates.TAR2 if write else LPCStates.RDDATA)
+        if not write:
+            yield self.dut.data.eq(data)
+        yield
+        yield self.dut.state.eq(LPCStates.START)
+        yield self.dut.lad_en.eq(0)
+        yield
+
+    def trace_read(self, entry):
+        words = []
+        for word in range(4):
+            yield from self.wishbone_read(self.dut.wb, TRACE_BUF + entry * 4 + word,
+                                          None, sel=0xf)
+            words.append((yield self.dut.wb.dat_r))
+            yield
+        return words
+
+    def test_trace(self):
+        lpc_go = 0
+
+        def bench():
+            nonlocal lpc_go
+            # Note CSRs have an extra cycle before ack, hence delay=2
+            yield from self.wishbone_write(self.dut.wb, CTRL, 0x1, delay=2)
+            lpc_go = 1
+            while lpc_go:
+                yield
+            yield from self.wishbone_write(self.dut.wb, CTRL, 0x0, delay=2)
+            for _ in range(10):
+                yield
+
+            yield from self.wishbone_read(self.dut.wb, WRPTR, 3, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATUS, 0b01, delay=2)
+            yield
+            timestamp = -1
+            for entry, (addr, data, info) in enumerate([
+                    (0x3f8, 0x41, (0 << 24) | 2),
+                    (0x80, 0x12, (1 << 24) | 0),
+                    (0x1000, 0, (4 << 24) | (1 << 31) | 1)]):
+                words = yield from self.trace_read(entry)
+                self.assertGreater(words[0], timestamp)
+                timestamp = words[0]
+                self.assertEqual(words[1:], [addr, data, info])
+
+            # Trigger on port 0x80 writes, check we wrap
+            yield from self.wishbone_write(self.dut.wb, TRIG_ADDR, 0x80, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.wb, TRIG_MASK, 0xffff, delay=2)
+            yield
+            yield from self.wishbone_write(self.dut.wb, CTRL, 0x3, delay=2)
+            lpc_go = 1
+            while lpc_go:
+                yield
+            yield from self.wishbone_write(self.dut.wb, CTRL, 0x0, delay=2)
+            for _ in range(10):
+                yield
+
+            yield from self.wishbone_read(self.dut.wb, WRPTR, 1, delay=2)
+            yield
+            yield from self.wishbone_read(self.dut.wb, STATUS, 0b11, delay=2)
+            yield
+            # Oldest entry first
+            for entry, data in [(1, 0x2), (2, 0x3), (3, 0x4), (0, 0x5)]:
+                words = yield from self.trace_read(entry)
+                self.assertEqual(words[2], data)
+
+        def lbench():
+            nonlocal lpc_go
+            while not lpc_go:
+                yield
+            for _ in range(4):
+                yield
+            yield from self.lpc_cycle(LPCCycletype.IORD, 0x3f8, 0x41, waits=2)
+            yield from self.lpc_cycle(LPCCycletype.IOWR, 0x80, 0x12)
+            yield from self.lpc_cycle(LPCCycletype.MEMRD, 0x1000, 0, waits=1,
+                                      end=LPCSyncType.ERROR)
+            lpc_go = 0
+
+            while not lpc_go:
+                yield
+            for _ in range(4):
+                yield
+            yield from self.lpc_cycle(LPCCycletype.IORD, 0x3f8, 0x0)
+            for i in range(1, 6):
+                yield from self.lpc_cycle(LPCCycletype.IOWR, 0x80, i)
+            lpc_go = 0
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-8)
+        sim.add_clock(3e-8, domain="lclk")
+        sim.add_sync_process(lbench, domain="lclk")
+        sim.add_sync_process(bench, domain="sync")
+        with sim.write_vcd("test_lpc_trace.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from nmigen.sim import Simulator
+
+from lpcperipheral.postcode import PostCode, RegEnum, BMCRegEnum
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = PostCode(depth=4)
+
+    def test_postcode(self):
+        def bench():
+            yield
+
+            # Empty
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.CODE, 0)
+
+            yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE, 0x12)
+            yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE_EXT, 0x34)
+            yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE, 0x56)
+            yield
+
+            # Target reads back the last code
+            yield from self.wishbone_read(self.dut.target_wb, RegEnum.POSTCODE, 0x56)
+            yield from self.wishbone_read(self.dut.target_wb, RegEnum.POSTCODE_EXT, 0x34)
+
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.STATUS, 3)
+
+            timestamp = 0
+            for code in [0x12, 0x134, 0x56]:
+                yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.CODE,
+                                              (1 << 31) | code)
+                yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.TIMESTAMP_HI, 0)
+                yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.TIMESTAMP_LO, None)
+                self.assertGreater((yield self.dut.bmc_wb.dat_r), timestamp)
+                timestamp = yield self.dut.bmc_wb.dat_r
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.CODE, 0)
+
+            # Interrupt at the threshold
+            yield from self.wishbone_write(self.dut.bmc_wb, BMCRegEnum.THRESHOLD, 2)
+            yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE, 0x1)
+            yield
+            self.assertEqual((yield self.dut.bmc_irq), 0)
+            yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE, 0x2)
+            yield
+            self.assertEqual((yield self.dut.bmc_irq), 1)
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.CODE, (1 << 31) | 0x1)
+            yield
+            self.assertEqual((yield self.dut.bmc_irq), 0)
+
+            # Overflow drops codes, still acks the host
+            for code in range(0x3, 0x8):
+                yield from self.wishbone_write(self.dut.target_wb, RegEnum.POSTCODE, code)
+            yield
+            self.assertEqual((yield self.dut.bmc_irq), 1)
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.STATUS, (1 << 16) | 4)
+            for code in range(0x2, 0x6):
+                yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.CODE,
+                                              (1 << 31) | code)
+            yield from self.wishbone_write(self.dut.bmc_wb, BMCRegEnum.STATUS, 1 << 16)
+            yield from self.wishbone_read(self.dut.bmc_wb, BMCRegEnum.STATUS, 0)
+            self.assertEqual((yield self.dut.bmc_irq), 0)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_postcode.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
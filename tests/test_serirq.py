@@ -0,0 +1,125 @@
+import unittest
+
+from nmigen.sim import Simulator
+
+from lpcperipheral.serirq import SerIRQ
+
+from .helpers import Helpers, SERIRQ_START_CYCLES
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = SerIRQ(nirqs=2)
+
+    def configure(self, slots, enables, active_low=0):
+        for slot, s in zip(self.dut.slots, slots):
+            yield slot.eq(s)
+        yield self.dut.enables.eq(enables)
+        yield self.dut.active_low.eq(active_low)
+        # Let the synchronisers catch up
+        for _ in range(3):
+            yield from self.serirq_cycle(self.dut)
+
+    def test_continuous(self):
+        def bench():
+            yield self.dut.lreset.eq(1)
+            yield from self.configure([4, 11], 0b11)
+
+            # IRQ 0 high, IRQ 1 low so slot 11 gets driven low
+            yield self.dut.irqs.eq(0b01)
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([11]))
+
+            yield self.dut.irqs.eq(0b10)
+            for _ in range(3):
+                yield from self.serirq_cycle(self.dut)
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([4]))
+
+            # Disabled IRQs are never driven
+            yield from self.configure([4, 11], 0b10)
+            yield self.dut.irqs.eq(0b00)
+            samples = yield from self.serirq_frame(self.dut, stop=3, start=8)
+            self.assertEqual(samples, self.serirq_expected([11]))
+
+            # We never start frames in continuous mode
+            for _ in range(20):
+                self.assertEqual((yield from self.serirq_cycle(self.dut)), 1)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_serirq_continuous.vcd"):
+            sim.run()
+
+    def test_quiet(self):
+        def bench():
+            yield self.dut.lreset.eq(1)
+            yield from self.configure([1, 9], 0b11)
+
+            # A short stop frame puts us in quiet mode
+            yield self.dut.irqs.eq(0b11)
+            samples = yield from self.serirq_frame(self.dut, stop=2)
+            self.assertEqual(samples, self.serirq_expected([]))
+
+            # Nothing has changed so we stay quiet
+            for _ in range(20):
+                self.assertEqual((yield from self.serirq_cycle(self.dut)), 1)
+
+            # IRQ 1 drops, so we should start a frame
+            yield self.dut.irqs.eq(0b01)
+            for _ in range(20):
+                if (yield from self.serirq_cycle(self.dut)) == 0:
+                    break
+            else:
+                self.fail("No SERIRQ start frame")
+
+            # The host finishes off the start frame
+            samples = yield from self.serirq_frame(self.dut, stop=2,
+                                                   start=SERIRQ_START_CYCLES - 1)
+            self.assertEqual(samples, self.serirq_expected([9]))
+
+            # Everything has been sent
+            for _ in range(20):
+                self.assertEqual((yield from self.serirq_cycle(self.dut)), 1)
+
+            # Back to continuous mode on LPC reset
+            yield self.dut.irqs.eq(0b00)
+            yield self.dut.lreset.eq(0)
+            yield from self.serirq_cycle(self.dut)
+            yield self.dut.lreset.eq(1)
+            for _ in range(20):
+                self.assertEqual((yield from self.serirq_cycle(self.dut)), 1)
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([1, 9]))
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_serirq_quiet.vcd"):
+            sim.run()
+
+    def test_active_low(self):
+        def bench():
+            yield self.dut.lreset.eq(1)
+            yield from self.configure([0, 31], 0b11, active_low=0b10)
+
+            yield self.dut.irqs.eq(0b10)
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([0, 31]))
+
+            yield self.dut.irqs.eq(0b01)
+            for _ in range(3):
+                yield from self.serirq_cycle(self.dut)
+            samples = yield from self.serirq_frame(self.dut, stop=3)
+            self.assertEqual(samples, self.serirq_expected([]))
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_serirq_active_low.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
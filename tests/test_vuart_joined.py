@@ -57,6 +57,30 @@ class TestSum(unittest.TestCase, Helpers):
         with sim.write_vcd("vuart_joined.vcd"):
             sim.run()
 
+    def test_pipelined(self):
+        self.dut = VUartJoined(depth=8, pipelined=True)
+
+        def bench():
+            yield
+
+            # Back to back writes and reads, one per clock
+            data = [0x10, 0x21, 0x32, 0x43]
+            results, clocks = yield from self.wishbone_pipelined(
+                self.dut.wb_a, [(RegEnum.RXTX_DLL, d) for d in data])
+            self.assertEqual(clocks, len(data) + 1)
+            yield
+
+            ops = [(RegEnum.LSR, None)] + [(RegEnum.RXTX_DLL, None)] * 5 + [(RegEnum.LSR, None)]
+            results, clocks = yield from self.wishbone_pipelined(self.dut.wb_b, ops)
+            self.assertEqual(results, [0x61] + data + [0, 0x60])
+            self.assertEqual(clocks, len(ops) + 1)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        with sim.write_vcd("vuart_joined_pipelined.vcd"):
+            sim.run()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,228 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+from nmigen_soc.wishbone import CycleType
+
+from lpcperipheral.wb_cache import WishboneReadCache
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneReadCache(addr_width=8, data_width=32, granularity=8,
+                                     features=["err"], lines=4, line_words=4, ways=2)
+
+    def test_cache(self):
+        reads = []
+        mem = {}
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield sub.err.eq(0)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    if (yield sub.we):
+                        mem[adr] = yield sub.dat_w
+                        yield sub.ack.eq(1)
+                    elif adr == 0xf3:
+                        yield sub.err.eq(1)
+                    else:
+                        reads.append(adr)
+                        yield sub.dat_r.eq(mem.get(adr, 0x1000 + adr))
+                        yield sub.ack.eq(1)
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # A miss reads the whole line in
+            yield from self.wishbone_read(bus, 0x12, 0x1012, delay=5)
+            self.assertEqual(reads, [0x10, 0x11, 0x12, 0x13])
+            yield
+
+            # and the rest of the line hits without going to the
+            # subordinate
+            for adr in (0x10, 0x13, 0x12):
+                yield from self.wishbone_read(bus, adr, 0x1000 + adr, delay=1)
+                yield
+            self.assertEqual(len(reads), 4)
+
+            # Two ways, so a second line in the same set doesn't throw
+            # out the first. A third one does, round robin.
+            yield from self.wishbone_read(bus, 0x30, 0x1030, delay=5)
+            yield
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=1)
+            yield
+            yield from self.wishbone_read(bus, 0x50, 0x1050, delay=5)
+            yield
+            yield from self.wishbone_read(bus, 0x31, 0x1031, delay=1)
+            yield
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=5)
+            yield
+            self.assertEqual(len(reads), 16)
+
+            # A write goes through and throws out the line
+            yield from self.wishbone_write(bus, 0x12, 0xabcd, delay=2)
+            yield
+            yield from self.wishbone_read(bus, 0x12, 0xabcd, delay=5)
+            yield
+            self.assertEqual(len(reads), 20)
+
+            # Invalidate
+            yield self.dut.invalidate.eq(1)
+            yield
+            yield self.dut.invalidate.eq(0)
+            yield from self.wishbone_read(bus, 0x13, 0x1013, delay=5)
+            yield
+            self.assertEqual(len(reads), 24)
+
+            # An error reading the line goes back on the request, and
+            # the line isn't kept
+            for _ in range(2):
+                yield bus.adr.eq(0xf1)
+                yield bus.cyc.eq(1)
+                yield bus.stb.eq(1)
+                for _ in range(6):
+                    yield
+                self.assertEqual((yield bus.err), 1)
+                self.assertEqual((yield bus.ack), 0)
+                yield bus.cyc.eq(0)
+                yield bus.stb.eq(0)
+                yield
+            self.assertEqual(reads[24:], [0xf0, 0xf1, 0xf2] * 2)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_cache.vcd"):
+            sim.run()
+
+
+class TestRefillErr(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneReadCache(addr_width=8, data_width=32, granularity=8,
+                                     features=["err"], lines=4, line_words=4, ways=1)
+
+    def test_refill_err(self):
+        reads = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield sub.err.eq(0)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    reads.append(adr)
+                    if adr == 0x42:
+                        yield sub.err.eq(1)
+                    else:
+                        yield sub.dat_r.eq(0x1000 + adr)
+                        yield sub.ack.eq(1)
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=5)
+            yield
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=1)
+            yield
+            self.assertEqual(reads, [0x10, 0x11, 0x12, 0x13])
+
+            # Replacing the line fails part way through, after some of
+            # it has been overwritten
+            yield bus.adr.eq(0x41)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            for _ in range(8):
+                yield
+                if (yield bus.err):
+                    break
+            self.assertEqual((yield bus.err), 1)
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+            self.assertEqual(reads[4:], [0x40, 0x41, 0x42])
+
+            # so the old line is gone too, and is read in again
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=5)
+            self.assertEqual(reads[7:], [0x10, 0x11, 0x12, 0x13])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_cache_refill_err.vcd"):
+            sim.run()
+
+
+class TestPipelined(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneReadCache(addr_width=8, data_width=32, granularity=8,
+                                     features=["stall", "cti", "bte"], lines=4,
+                                     line_words=4, ways=1)
+
+    def test_pipelined(self):
+        requests = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            mem = {}
+            inflight = []
+            clock = 0
+            yield sub.stall.eq(0)
+            while True:
+                ack = bool(inflight) and inflight[0][0] <= clock
+                if ack:
+                    _, adr = inflight.pop(0)
+                    yield sub.dat_r.eq(mem.get(adr, 0x1000 + adr))
+                yield sub.ack.eq(ack)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    if (yield sub.we):
+                        mem[adr] = yield sub.dat_w
+                    requests.append((adr, (yield sub.we), (yield sub.cti)))
+                    inflight.append((clock + 2, adr))
+                if not (yield sub.cyc):
+                    inflight = []
+                yield
+                clock += 1
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # The line is read as a burst, then the rest hit
+            ops = [(0x21, None), (0x22, None), (0x20, 0x55), (0x20, None), (0x23, None)]
+            results, clocks = yield from self.wishbone_pipelined(bus, ops)
+            self.assertEqual(results, [0x1021, 0x1022, None, 0x55, 0x1023])
+            incr = CycleType.INCR_BURST.value
+            end = CycleType.END_OF_BURST.value
+            self.assertEqual(requests, [
+                (0x20, 0, incr), (0x21, 0, incr), (0x22, 0, incr), (0x23, 0, end),
+                (0x20, 1, CycleType.CLASSIC.value),
+                (0x20, 0, incr), (0x21, 0, incr), (0x22, 0, incr), (0x23, 0, end)])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_cache_pipelined.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+from nmigen_soc.memory import MemoryMap
+from nmigen_soc.wishbone import Interface as WishboneInterface
+
+from lpcperipheral.wb_decoder import WishbonePipelinedDecoder
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishbonePipelinedDecoder(addr_width=8, data_width=32, granularity=8,
+                                            features=["stall"])
+        # Two pipelined subordinates with different latencies and a
+        # classic one
+        self.subs = []
+        for addr, features in ((0x00, ["stall"]), (0x40, ["stall"]), (0x80, [])):
+            sub = WishboneInterface(addr_width=4, data_width=32, granularity=8,
+                                    features=features)
+            sub.memory_map = MemoryMap(addr_width=6, data_width=8)
+            self.dut.add(sub, addr=addr)
+            self.subs.append(sub)
+
+    def test_decoder(self):
+        # Each subordinate returns its base plus the address, and
+        # remembers writes
+        def pipelined_bench(sub, base, latency):
+            def bench():
+                yield Passive()
+                mem = {}
+                inflight = []
+                clock = 0
+                yield sub.stall.eq(0)
+                while True:
+                    # Outputs change on the clock edge
+                    ack = bool(inflight) and inflight[0][0] <= clock
+                    if ack:
+                        _, adr = inflight.pop(0)
+                        yield sub.dat_r.eq(mem.get(adr, base + adr))
+                    yield sub.ack.eq(ack)
+                    yield Settle()
+                    if (yield sub.cyc) and (yield sub.stb):
+                        adr = yield sub.adr
+                        if (yield sub.we):
+                            mem[adr] = yield sub.dat_w
+                        inflight.append((clock + latency, adr))
+                    if not (yield sub.cyc):
+                        inflight = []
+                    yield
+                    clock += 1
+            return bench
+
+        def classic_bench(sub, base):
+            def bench():
+                yield Passive()
+                while True:
+                    yield sub.ack.eq(0)
+                    if (yield sub.cyc) and (yield sub.stb):
+                        yield sub.dat_r.eq(base + (yield sub.adr))
+                        yield sub.ack.eq(1)
+                        yield
+                        yield sub.ack.eq(0)
+                    yield
+            return bench
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # Back to back to one subordinate
+            ops = [(i, None) for i in range(4)]
+            results, clocks = yield from self.wishbone_pipelined(bus, ops)
+            self.assertEqual(results, [0x100 + i for i in range(4)])
+            self.assertEqual(clocks, 4 + 1)
+
+            # Switching subordinates waits for the responses to come
+            # back, so they stay in order
+            ops = [(0x10, None), (0x00, None), (0x10, 0x55), (0x11, None),
+                   (0x20, None), (0x10, None), (0x01, None)]
+            results, clocks = yield from self.wishbone_pipelined(bus, ops)
+            self.assertEqual(results, [0x200, 0x100, None, 0x201, 0x300, 0x55, 0x101])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(pipelined_bench(self.subs[0], 0x100, 1))
+        sim.add_sync_process(pipelined_bench(self.subs[1], 0x200, 3))
+        sim.add_sync_process(classic_bench(self.subs[2], 0x300))
+        sim.add_sync_process(bench)
+        with sim.write_vcd("test_wb_decoder.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+
+from lpcperipheral.wb_page_table import WishbonePageTable
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        # 16 word pages
+        self.dut = WishbonePageTable(addr_width=8, data_width=32, granularity=8,
+                                     features=["err"], pages=8, page_size=64)
+
+    def test_page_table(self):
+        requests = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    requests.append((yield sub.adr))
+                    yield sub.dat_r.eq(0x1000 + (yield sub.adr))
+                    yield sub.ack.eq(1)
+                yield
+
+        def load(page, entry):
+            yield self.dut.load_adr.eq(page)
+            yield self.dut.load_dat_w.eq(entry)
+            yield self.dut.load_we.eq(1)
+            yield
+            yield self.dut.load_we.eq(0)
+
+        def unmapped(adr):
+            bus = self.dut.bus
+            yield bus.adr.eq(adr)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            for _ in range(3):
+                yield
+            yield Settle()
+            self.assertEqual((yield self.dut.unmapped), 1)
+            self.assertEqual((yield self.dut.sub.stb), 0)
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # Page 0 at 0x300, page 1 at 0x100, page 2 unmapped
+            yield from load(0, 0x301)
+            yield from load(1, 0x101)
+            yield from load(2, 0x300)
+            yield
+
+            # The first access to a page waits for the entry, then it's
+            # kept
+            yield from self.wishbone_read(bus, 0x01, 0x10c1, delay=2)
+            yield
+            yield from self.wishbone_read(bus, 0x0f, 0x10cf, delay=0)
+            yield
+            yield from self.wishbone_read(bus, 0x12, 0x1042, delay=2)
+            yield
+            yield from self.wishbone_read(bus, 0x03, 0x10c3, delay=0)
+            yield
+            self.assertEqual(requests, [0xc1, 0xcf, 0x42, 0xc3])
+
+            yield from unmapped(0x25)
+            yield from unmapped(0x80)
+
+            # Changing the table throws away the kept translations
+            yield from load(0, 0x201)
+            yield
+            yield from self.wishbone_read(bus, 0x01, 0x1081, delay=2)
+            yield
+
+            # Untranslated with bypass
+            yield self.dut.bypass.eq(1)
+            yield from self.wishbone_read(bus, 0x25, 0x1025, delay=0)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_page_table.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+
+from lpcperipheral.wb_prefetch import WishbonePrefetcher
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishbonePrefetcher(addr_width=8, data_width=32, granularity=8,
+                                      features=["err"], depth=4)
+
+    def test_prefetch(self):
+        reads = []
+        counts = {"used": 0, "wasted": 0}
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    if not (yield sub.we):
+                        reads.append((yield sub.adr))
+                    yield sub.dat_r.eq(0x1000 + (yield sub.adr))
+                    yield sub.ack.eq(1)
+                yield Settle()
+                counts["used"] += yield self.dut.used
+                counts["wasted"] += yield self.dut.wasted
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield self.dut.enable.eq(1)
+            yield self.dut.depth.eq(2)
+            yield
+
+            # Two reads in a row to ascending words start prefetching
+            yield from self.wishbone_read(bus, 0x10, 0x1010, delay=0)
+            yield
+            yield from self.wishbone_read(bus, 0x11, 0x1011, delay=0)
+            for _ in range(4):
+                yield
+            self.assertEqual(reads, [0x10, 0x11, 0x12, 0x13])
+
+            # The next reads come from the buffer, which is topped up
+            for adr in (0x12, 0x13, 0x14):
+                yield from self.wishbone_read(bus, adr, 0x1000 + adr, delay=1)
+                yield
+            for _ in range(4):
+                yield
+            self.assertEqual(reads[4:], [0x14, 0x15, 0x16])
+            self.assertEqual(counts, {"used": 3, "wasted": 0})
+
+            # Anything else throws the buffer away and stops prefetching
+            yield from self.wishbone_read(bus, 0x40, 0x1040, delay=0)
+            for _ in range(4):
+                yield
+            self.assertEqual(reads[7:], [0x40])
+            self.assertEqual(counts, {"used": 3, "wasted": 2})
+
+            # A write does too
+            yield from self.wishbone_read(bus, 0x41, 0x1041, delay=0)
+            for _ in range(4):
+                yield
+            yield from self.wishbone_write(bus, 0x43, 0x55, delay=0)
+            yield
+            self.assertEqual(reads[8:], [0x41, 0x42, 0x43])
+            self.assertEqual(counts, {"used": 3, "wasted": 4})
+
+            # Nothing is fetched ahead when disabled
+            yield self.dut.enable.eq(0)
+            yield from self.wishbone_read(bus, 0x50, 0x1050, delay=0)
+            yield
+            yield from self.wishbone_read(bus, 0x51, 0x1051, delay=0)
+            for _ in range(4):
+                yield
+            self.assertEqual(reads[11:], [0x50, 0x51])
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_prefetch.vcd"):
+            sim.run()
+
+
+class TestPipelined(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishbonePrefetcher(addr_width=8, data_width=32, granularity=8,
+                                      features=["stall"], depth=4)
+
+    def test_pipelined(self):
+        reads = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            inflight = []
+            clock = 0
+            yield sub.stall.eq(0)
+            while True:
+                ack = bool(inflight) and inflight[0][0] <= clock
+                if ack:
+                    _, adr = inflight.pop(0)
+                    yield sub.dat_r.eq(0x1000 + adr)
+                yield sub.ack.eq(ack)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    reads.append(adr)
+                    inflight.append((clock + 3, adr))
+                if not (yield sub.cyc):
+                    inflight = []
+                yield
+                clock += 1
+
+        def bench():
+            bus = self.dut.bus
+            yield self.dut.enable.eq(1)
+            yield self.dut.depth.eq(4)
+            yield
+
+            # A sequential stream, a word at a time with gaps like the
+            # FW path
+            for adr in range(0x20, 0x28):
+                results, _ = yield from self.wishbone_pipelined(bus, [(adr, None)])
+                self.assertEqual(results, [0x1000 + adr])
+                for _ in range(4):
+                    yield
+            for _ in range(20):
+                yield
+            # Every word is only read once, and the buffer is kept full
+            self.assertEqual(reads, list(range(0x20, 0x2c)))
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_prefetch_pipelined.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
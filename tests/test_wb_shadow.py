@@ -0,0 +1,162 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+
+from lpcperipheral.wb_shadow import WishboneShadow
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneShadow(addr_width=8, data_width=32, granularity=8,
+                                  features=["err"], base=0x20, words=16)
+
+    def test_shadow(self):
+        requests = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield sub.err.eq(0)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    requests.append(((yield sub.adr), (yield sub.we)))
+                    yield sub.dat_r.eq(0x1000 + (yield sub.adr))
+                    if (yield sub.adr) == 0x23:
+                        yield sub.err.eq(1)
+                    else:
+                        yield sub.ack.eq(1)
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # Load the copy
+            for i in range(16):
+                yield self.dut.load_adr.eq(i)
+                yield self.dut.load_dat_w.eq(0x20000000 + i)
+                yield self.dut.load_we.eq(1)
+                yield
+            yield self.dut.load_we.eq(0)
+            yield self.dut.load_adr.eq(3)
+            yield
+            yield
+            self.assertEqual((yield self.dut.load_dat_r), 0x20000003)
+
+            # Reads go to the subordinate until it's enabled
+            yield from self.wishbone_read(bus, 0x21, 0x1021, delay=0)
+            yield
+            yield self.dut.enable.eq(1)
+            for adr in (0x20, 0x21, 0x2f):
+                yield from self.wishbone_read(bus, adr, 0x20000000 + adr - 0x20, delay=1)
+                yield
+            self.assertEqual(requests, [(0x21, 0)])
+
+            # Outside the range goes through
+            for adr in (0x1f, 0x30):
+                yield from self.wishbone_read(bus, adr, 0x1000 + adr, delay=0)
+                yield
+            self.assertEqual(requests[1:], [(0x1f, 0), (0x30, 0)])
+
+            # Writes to the range go through and update the copy
+            yield from self.wishbone_write(bus, 0x22, 0xaabbccdd, sel=0x3, delay=0)
+            yield
+            self.assertEqual(requests[3:], [(0x22, 1)])
+            yield from self.wishbone_read(bus, 0x22, 0x2000ccdd, delay=1)
+            yield
+
+            # unless the subordinate fails them
+            yield bus.adr.eq(0x23)
+            yield bus.dat_w.eq(0xaabbccdd)
+            yield bus.sel.eq(0xf)
+            yield bus.we.eq(1)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            yield
+            self.assertEqual((yield bus.err), 1)
+            yield bus.we.eq(0)
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+            yield from self.wishbone_read(bus, 0x23, 0x20000003, delay=1)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_shadow.vcd"):
+            sim.run()
+
+
+class TestPipelined(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneShadow(addr_width=8, data_width=32, granularity=8,
+                                  features=["err", "stall"], base=0x20, words=16)
+
+    def test_pipelined(self):
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            inflight = []
+            clock = 0
+            yield sub.stall.eq(0)
+            while True:
+                resp = bool(inflight) and inflight[0][0] <= clock
+                adr = None
+                if resp:
+                    _, adr = inflight.pop(0)
+                # Writes to 0x23 fail
+                yield sub.ack.eq(resp and adr != 0x23)
+                yield sub.err.eq(resp and adr == 0x23)
+                yield Settle()
+                if (yield sub.cyc) and (yield sub.stb):
+                    inflight.append((clock + 2, (yield sub.adr)))
+                if not (yield sub.cyc):
+                    inflight = []
+                yield
+                clock += 1
+
+        def bench():
+            bus = self.dut.bus
+            yield self.dut.enable.eq(1)
+            yield
+
+            # Writes update the copy when they're acked, not when
+            # they're taken, and not at all if they fail
+            yield from self.wishbone_pipelined(bus, [(0x22, 0x1234)], sel=0xf)
+            yield
+            yield bus.adr.eq(0x23)
+            yield bus.dat_w.eq(0x5678)
+            yield bus.sel.eq(0xf)
+            yield bus.we.eq(1)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            yield
+            yield bus.stb.eq(0)
+            for _ in range(4):
+                yield
+                if (yield bus.err):
+                    break
+            self.assertEqual((yield bus.err), 1)
+            yield bus.we.eq(0)
+            yield bus.cyc.eq(0)
+            yield
+            for adr, data in [(0x22, 0x1234), (0x23, 0)]:
+                results, _ = yield from self.wishbone_pipelined(bus, [(adr, None)], sel=0xf)
+                self.assertEqual(results, [data])
+                yield
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_shadow_pipelined.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive
+
+from lpcperipheral.wb_slice import WishboneRegSlice
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneRegSlice(addr_width=8, data_width=32, granularity=8,
+                                    features=["err"])
+
+    def test_slice(self):
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            while True:
+                yield sub.ack.eq(0)
+                yield sub.err.eq(0)
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    # Slow to answer 0x10
+                    if adr == 0x10:
+                        for _ in range(8):
+                            yield
+                    if adr == 0xff:
+                        yield sub.err.eq(1)
+                    else:
+                        if (yield sub.we):
+                            self.assertEqual((yield sub.dat_w), adr + 1)
+                            self.assertEqual((yield sub.sel), 0xf)
+                        yield sub.dat_r.eq(adr)
+                        yield sub.ack.eq(1)
+                    yield
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+            yield from self.wishbone_read(bus, 0x12, 0x12, delay=3)
+            yield from self.wishbone_write(bus, 0x34, 0x35, sel=0xf, delay=3)
+            yield
+
+            # Errors are passed back
+            yield bus.adr.eq(0xff)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            for _ in range(4):
+                yield
+            self.assertEqual((yield bus.err), 1)
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+
+            # Give up on a slow read, its late ack mustn't turn up
+            yield bus.adr.eq(0x10)
+            yield bus.cyc.eq(1)
+            yield bus.stb.eq(1)
+            for _ in range(4):
+                yield
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+            yield
+            for _ in range(12):
+                self.assertEqual((yield bus.ack), 0)
+                self.assertEqual((yield self.dut.sub.cyc), 0)
+                yield
+            yield from self.wishbone_read(bus, 0x56, 0x56, delay=3)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        with sim.write_vcd("test_wb_slice.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+
+from nmigen.sim import Simulator, Passive, Settle
+
+from lpcperipheral.wb_write_combine import WishboneWriteCombiner
+
+from .helpers import Helpers
+
+
+class TestSum(unittest.TestCase, Helpers):
+    def setUp(self):
+        self.dut = WishboneWriteCombiner(addr_width=8, data_width=32, granularity=8,
+                                         features=["err"], timeout=8)
+
+    def test_write_combine(self):
+        writes = []
+        errs = []
+
+        def sub_bench():
+            yield Passive()
+            sub = self.dut.sub
+            mem = {}
+            while True:
+                yield sub.ack.eq(0)
+                if (yield sub.cyc) and (yield sub.stb):
+                    adr = yield sub.adr
+                    if (yield sub.we):
+                        sel = yield sub.sel
+                        dat = yield sub.dat_w
+                        writes.append((adr, dat, sel))
+                        mask = sum(0xff << (8 * i) for i in range(4) if sel & (1 << i))
+                        mem[adr] = (mem.get(adr, 0) & ~mask) | (dat & mask)
+                    yield sub.dat_r.eq(mem.get(adr, 0))
+                    if adr == 0x60:
+                        yield sub.err.eq(1)
+                    else:
+                        yield sub.ack.eq(1)
+                    yield
+                    yield sub.err.eq(0)
+                yield
+
+        def err_bench():
+            yield Passive()
+            while True:
+                yield Settle()
+                if (yield self.dut.err):
+                    errs.append((yield self.dut.err_adr))
+                yield
+
+        def bench():
+            bus = self.dut.bus
+            yield
+
+            # Bytes of one word go out as one write once it's full
+            for i in range(4):
+                yield from self.wishbone_write(bus, 0x10, (0x11 * (i + 1)) << (8 * i),
+                                               sel=1 << i)
+                yield
+            for _ in range(4):
+                yield
+            self.assertEqual(writes, [(0x10, 0x44332211, 0xf)])
+            self.assertEqual((yield self.dut.valid), 0)
+
+            # Moving to another word writes out the last one
+            yield from self.wishbone_write(bus, 0x20, 0xaa, sel=0x1)
+            yield
+            yield from self.wishbone_write(bus, 0x21, 0xbb00, sel=0x2, delay=4)
+            yield
+            self.assertEqual(writes[1:], [(0x20, 0xaa, 0x1)])
+
+            # A read waits for the buffer to be written out
+            yield from self.wishbone_write(bus, 0x21, 0xcc, sel=0x1)
+            yield
+            yield from self.wishbone_read(bus, 0x21, 0xbbcc, delay=3)
+            self.assertEqual(writes[2:], [(0x21, 0xbbcc, 0x3)])
+            yield
+
+            # Timeout
+            yield from self.wishbone_write(bus, 0x30, 0x1234, sel=0x3)
+            for _ in range(12):
+                yield
+            self.assertEqual(writes[3:], [(0x30, 0x1234, 0x3)])
+
+            # Flush
+            yield from self.wishbone_write(bus, 0x40, 0x55, sel=0x1)
+            yield
+            yield self.dut.flush.eq(1)
+            yield
+            yield self.dut.flush.eq(0)
+            for _ in range(3):
+                yield
+            self.assertEqual(writes[4:], [(0x40, 0x55, 0x1)])
+
+            # Full words go straight through
+            yield from self.wishbone_write(bus, 0x50, 0x12345678, sel=0xf, delay=1)
+            self.assertEqual(writes[5:], [(0x50, 0x12345678, 0xf)])
+            yield
+
+            # An error writing the buffer out is passed on with its
+            # address
+            yield from self.wishbone_write(bus, 0x60, 0x66, sel=0x1)
+            yield
+            yield self.dut.flush.eq(1)
+            yield
+            yield self.dut.flush.eq(0)
+            for _ in range(4):
+                yield
+            self.assertEqual(writes[6:], [(0x60, 0x66, 0x1)])
+            self.assertEqual(errs, [0x60])
+            self.assertEqual((yield self.dut.valid), 0)
+
+        sim = Simulator(self.dut)
+        sim.add_clock(1e-6)  # 1 MHz
+        sim.add_sync_process(bench)
+        sim.add_sync_process(sub_bench)
+        sim.add_sync_process(err_bench)
+        with sim.write_vcd("test_wb_write_combine.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()